@@ -0,0 +1,256 @@
+"""
+Controle de admissão: limites de concorrência por classe de rota e
+token buckets por usuário/IP, aplicados antes da rota ocupar uma thread.
+
+Sem isso, quando o threadpool do AnyIO satura (bcrypt no login, LIKE
+lento na busca), toda requisição espera invisível até estourar o timeout,
+inclusive as baratas. Aqui cada classe tem seu limite de execuções
+simultâneas e uma fila curta; fila cheia ou espera longa demais viram 503
+com Retry-After na hora, e as classes baratas continuam com vaga.
+"""
+import asyncio
+import json
+import time
+from collections import OrderedDict, deque
+
+from config import (
+    ADMISSAO_ATIVA,
+    ADMISSAO_FILA_MAX,
+    ADMISSAO_ESPERA_MAX_MS,
+    ADMISSAO_LIMITE_AUTH,
+    ADMISSAO_LIMITE_BUSCA,
+    ADMISSAO_LIMITE_GENIUS,
+    ADMISSAO_LIMITE_EXPORTACAO,
+    ADMISSAO_LIMITE_ESCRITA,
+    ADMISSAO_LIMITE_LEITURA,
+    TAXA_AUTH_POR_S,
+    TAXA_AUTH_RAJADA,
+    TAXA_ESCRITA_POR_S,
+    TAXA_ESCRITA_RAJADA,
+    TAXA_GENIUS_POR_S,
+    TAXA_GENIUS_RAJADA,
+    JWT_CLIENT_SECRET,
+)
+from auth import ALGORITHM
+
+_MAX_BALDES = 100000
+
+def classificar(metodo: str, caminho: str, query: bytes) -> str | None:
+    """Classe de admissão da requisição; None = não controlada (health, docs)."""
+    if caminho.startswith(("/health", "/docs", "/openapi", "/redoc")):
+        return None
+    if caminho.startswith("/api/v1/search-genius"):
+        return "genius"
+    if caminho.endswith("/exportar") or caminho.startswith("/admin/exportar"):
+        return "exportacao"
+    if metodo == "POST" and caminho in ("/login", "/usuarios"):
+        # bcrypt: caro de propósito
+        return "auth"
+    if metodo in ("POST", "PUT", "PATCH", "DELETE"):
+        return "escrita"
+    if (
+        caminho in ("/usuarios/busca", "/musicas/autocomplete", "/api/v1/search-hybrid")
+        or (caminho == "/musicas" and (query.startswith(b"q=") or b"&q=" in query))
+    ):
+        return "busca"
+    return "leitura"
+
+class ClasseAdmissao:
+    """Semáforo com fila limitada e espera máxima, medido."""
+
+    def __init__(self, nome: str, limite: int, fila_max: int, espera_max_s: float):
+        self.nome = nome
+        self.limite = limite
+        self.fila_max = fila_max
+        self.espera_max_s = espera_max_s
+        self.ativos = 0
+        self._fila = deque()
+        self.admitidos = 0
+        self.rejeitados_fila = 0
+        self.rejeitados_espera = 0
+        self.rejeitados_taxa = 0
+        self._enfileirados = 0
+        self._espera_total = 0.0
+        self._espera_max = 0.0
+
+    async def entrar(self) -> bool:
+        """True se admitida; False se deve ser descartada (503)."""
+        if self.ativos < self.limite and not self._fila:
+            self.ativos += 1
+            self.admitidos += 1
+            return True
+        if len(self._fila) >= self.fila_max:
+            self.rejeitados_fila += 1
+            return False
+
+        inicio = time.perf_counter()
+        vez = asyncio.get_running_loop().create_future()
+        self._fila.append(vez)
+        try:
+            await asyncio.wait((vez,), timeout=self.espera_max_s)
+        except asyncio.CancelledError:
+            # Cliente desistiu: devolve a vaga se ela já tinha sido passada
+            if vez.done() and not vez.cancelled():
+                self.sair()
+            raise
+        finally:
+            # Tudo roda no mesmo event loop: entre o wait e esta checagem
+            # ninguém mais mexe na fila
+            if not vez.done():
+                vez.cancel()
+                self._fila.remove(vez)
+        if vez.cancelled():
+            self.rejeitados_espera += 1
+            return False
+
+        espera = time.perf_counter() - inicio
+        self._enfileirados += 1
+        self._espera_total += espera
+        self._espera_max = max(self._espera_max, espera)
+        self.admitidos += 1
+        return True
+
+    def sair(self):
+        # Passa a vaga direto para o próximo da fila (ativos não muda)
+        while self._fila:
+            proximo = self._fila.popleft()
+            if not proximo.done():
+                proximo.set_result(True)
+                return
+        self.ativos -= 1
+
+    def retry_after(self) -> int:
+        return max(1, int(self.espera_max_s) + 1)
+
+    def estatisticas(self) -> dict:
+        return {
+            "limite": self.limite,
+            "ativos": self.ativos,
+            "fila": len(self._fila),
+            "fila_max": self.fila_max,
+            "admitidos": self.admitidos,
+            "rejeitados_fila": self.rejeitados_fila,
+            "rejeitados_espera": self.rejeitados_espera,
+            "rejeitados_taxa": self.rejeitados_taxa,
+            "admitidos_apos_fila": self._enfileirados,
+            "espera_media_ms": self._espera_total / max(1, self._enfileirados) * 1000,
+            "espera_max_ms": self._espera_max * 1000,
+        }
+
+class LimitadorTaxa:
+    """Token bucket por chave (usuário ou IP), com as chaves mais antigas descartadas."""
+
+    def __init__(self, por_segundo: float, rajada: float):
+        self.por_segundo = por_segundo
+        self.rajada = rajada
+        self._baldes = OrderedDict()
+
+    def consumir(self, chave: str) -> float:
+        """0 se liberado; senão, segundos até haver uma ficha."""
+        agora = time.monotonic()
+        fichas, visto = self._baldes.pop(chave, (self.rajada, agora))
+        fichas = min(self.rajada, fichas + (agora - visto) * self.por_segundo)
+        if fichas >= 1:
+            fichas -= 1
+            espera = 0.0
+        else:
+            espera = (1 - fichas) / self.por_segundo
+        self._baldes[chave] = (fichas, agora)
+        if len(self._baldes) > _MAX_BALDES:
+            self._baldes.popitem(last=False)
+        return espera
+
+def _usuario_do_token(scope) -> str | None:
+    """`sub` do JWT do header Authorization, só se a assinatura e a validade conferem."""
+    for nome, valor in scope["headers"]:
+        if nome == b"authorization" and valor[:7].lower() == b"bearer ":
+            from jose import jwt, JWTError  # import tardio, como em auth.py
+            try:
+                payload = jwt.decode(valor[7:].decode("latin-1"), JWT_CLIENT_SECRET, algorithms=[ALGORITHM])
+            except JWTError:
+                return None
+            return payload.get("sub")
+    return None
+
+def _chave_cliente(scope, classe: str) -> str:
+    """
+    Usuário do token verificado ou, sem token válido, o IP. Um token que
+    não valida não pode virar chave: cada valor inventado ganharia um balde
+    cheio. Login/cadastro são sempre por IP (quem tenta senhas não tem token).
+    """
+    if classe != "auth":
+        usuario = _usuario_do_token(scope)
+        if usuario is not None:
+            return f"u:{usuario}"
+    cliente = scope.get("client")
+    return "ip:" + (cliente[0] if cliente else "?")
+
+class ControleAdmissao:
+    def __init__(self):
+        espera = ADMISSAO_ESPERA_MAX_MS / 1000
+        self.classes = {
+            nome: ClasseAdmissao(nome, limite, ADMISSAO_FILA_MAX, espera)
+            for nome, limite in (
+                ("auth", ADMISSAO_LIMITE_AUTH),
+                ("busca", ADMISSAO_LIMITE_BUSCA),
+                ("genius", ADMISSAO_LIMITE_GENIUS),
+                ("exportacao", ADMISSAO_LIMITE_EXPORTACAO),
+                ("escrita", ADMISSAO_LIMITE_ESCRITA),
+                ("leitura", ADMISSAO_LIMITE_LEITURA),
+            )
+        }
+        self.taxas = {
+            "auth": LimitadorTaxa(TAXA_AUTH_POR_S, TAXA_AUTH_RAJADA),
+            "escrita": LimitadorTaxa(TAXA_ESCRITA_POR_S, TAXA_ESCRITA_RAJADA),
+            "genius": LimitadorTaxa(TAXA_GENIUS_POR_S, TAXA_GENIUS_RAJADA),
+        }
+
+    def estatisticas(self) -> dict:
+        return {"ativa": ADMISSAO_ATIVA, "classes": {n: c.estatisticas() for n, c in self.classes.items()}}
+
+controle = ControleAdmissao()
+
+async def _recusar(send, status: int, retry_after: float, detalhe: str):
+    corpo = json.dumps({"detail": detalhe}).encode()
+    await send({
+        "type": "http.response.start",
+        "status": status,
+        "headers": [
+            (b"content-type", b"application/json"),
+            (b"content-length", str(len(corpo)).encode()),
+            (b"retry-after", str(max(1, int(retry_after + 0.999))).encode()),
+        ],
+    })
+    await send({"type": "http.response.body", "body": corpo})
+
+class AdmissaoMiddleware:
+    """Middleware ASGI: aplica `controle` antes da rota (e do threadpool)."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not ADMISSAO_ATIVA:
+            await self.app(scope, receive, send)
+            return
+        nome = classificar(scope["method"], scope["path"], scope.get("query_string", b""))
+        if nome is None:
+            await self.app(scope, receive, send)
+            return
+        classe = controle.classes[nome]
+
+        taxa = controle.taxas.get(nome)
+        if taxa is not None:
+            espera = taxa.consumir(_chave_cliente(scope, nome))
+            if espera > 0:
+                classe.rejeitados_taxa += 1
+                await _recusar(send, 429, espera, "Muitas requisições, tente novamente em instantes.")
+                return
+
+        if not await classe.entrar():
+            await _recusar(send, 503, classe.retry_after(), "Servidor sobrecarregado, tente novamente em instantes.")
+            return
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            classe.sair()
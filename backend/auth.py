@@ -1,11 +1,11 @@
 # auth.py
 from datetime import datetime, timedelta
 from typing import Optional
-from jose import jwt, JWTError
-from fastapi import Depends, HTTPException, status
+import hmac
+from fastapi import Depends, Header, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
 from crud.crud_usuario import obter_usuario_por_email
-from config import JWT_CLIENT_SECRET
+from config import JWT_CLIENT_SECRET, ADMIN_TOKEN
 
 # CONFIGURAÇÕES
 # Definições para criação e validação do token JWT
@@ -13,6 +13,7 @@ ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 60
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="login")
+oauth2_scheme_opcional = OAuth2PasswordBearer(tokenUrl="login", auto_error=False)
 
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     """Gera um JWT com data de expiração."""
@@ -23,6 +24,7 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
         expire = datetime.utcnow() + timedelta(minutes=15)
     
     to_encode.update({"exp": expire})
+    from jose import jwt  # import tardio: jose/cryptography pesam no boot do worker
     encoded_jwt = jwt.encode(to_encode, JWT_CLIENT_SECRET, algorithm=ALGORITHM)
     return encoded_jwt
 
@@ -32,6 +34,8 @@ async def get_current_user(token: str = Depends(oauth2_scheme)):
     Se o token for válido, retorna os dados do usuário (tupla do BD).
     Se não, lança erro 401.
     """
+    from jose import jwt, JWTError
+
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Não foi possível validar as credenciais",
@@ -50,4 +54,26 @@ async def get_current_user(token: str = Depends(oauth2_scheme)):
     if user is None:
         raise credentials_exception
         
-    return user
\ No newline at end of file
+    return user
+
+async def get_current_user_optional(token: Optional[str] = Depends(oauth2_scheme_opcional)):
+    """
+    Versão opcional de `get_current_user` para rotas públicas que só
+    enriquecem a resposta quando há token. Sem token (ou inválido) retorna None.
+    """
+    if not token:
+        return None
+    try:
+        return await get_current_user(token)
+    except HTTPException:
+        return None
+
+def exigir_admin(x_admin_token: Optional[str] = Header(None)):
+    """
+    Dependência das rotas de administração: exige o header X-Admin-Token
+    igual a ADMIN_TOKEN. Sem ADMIN_TOKEN configurado as rotas não existem.
+    """
+    if not ADMIN_TOKEN:
+        raise HTTPException(status_code=404, detail="Not Found")
+    if not x_admin_token or not hmac.compare_digest(x_admin_token, ADMIN_TOKEN):
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Token de administração inválido")
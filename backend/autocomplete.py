@@ -0,0 +1,309 @@
+import bisect
+import threading
+import time
+import unicodedata
+
+from bd import get_connection, get_read_connection
+from config import AUTOCOMPLETE_PREFIXO_MAX, AUTOCOMPLETE_PREFIXO_TTL_S
+
+# Só os trigramas mais raros da consulta vão ao índice, cada um limitado
+# a um número de postings: o custo não cresce com o tamanho do catálogo
+_MAX_TRIGRAMAS_CONSULTA = 6
+_MAX_POSTINGS = 5000
+_MAX_CANDIDATOS = 40
+
+# ------------------ NORMALIZAÇÃO ------------------
+
+def normalizar(texto: str | None) -> str:
+    """Minúsculas, sem acentos, só letras/dígitos separados por um espaço."""
+    if not texto:
+        return ""
+    sem_acento = unicodedata.normalize("NFKD", texto)
+    sem_acento = "".join(c for c in sem_acento if not unicodedata.combining(c))
+    limpo = "".join(c if c.isalnum() else " " for c in sem_acento.lower())
+    return " ".join(limpo.split())
+
+def trigramas(texto: str) -> set:
+    """Trigramas por palavra, com preenchimento (estilo pg_trgm): "abc" -> "  a", " ab", "abc", "bc "."""
+    resultado = set()
+    for palavra in normalizar(texto).split():
+        p = f"  {palavra} "
+        for i in range(len(p) - 2):
+            resultado.add(p[i:i + 3])
+    return resultado
+
+def distancia_prefixo(consulta: str, texto: str, limite: int) -> int:
+    """
+    Menor distância de edição entre `consulta` e um trecho de `texto` que
+    começa numa fronteira de palavra (o final é livre, pois o usuário ainda
+    está digitando). "beyonse" x "beyonce knowles" = 1.
+    Para de calcular quando passa de `limite` (retorna limite + 1).
+    """
+    n = len(texto)
+    infinito = len(consulta) + n + 1
+    # Linha 0: só dá para começar no início de uma palavra
+    anterior = [0 if j == 0 or texto[j - 1] == " " else infinito for j in range(n + 1)]
+    for i, cq in enumerate(consulta, 1):
+        atual = [i]
+        esquerda = i
+        for j in range(1, n + 1):
+            valor = anterior[j - 1] + (cq != texto[j - 1])
+            if anterior[j] + 1 < valor:
+                valor = anterior[j] + 1
+            if esquerda + 1 < valor:
+                valor = esquerda + 1
+            atual.append(valor)
+            esquerda = valor
+        if min(atual) > limite:
+            return limite + 1
+        anterior = atual
+    return min(anterior)
+
+# ------------------ ÍNDICE DE TRIGRAMAS (SQLite) ------------------
+
+def criarTabelaTrigrama():
+    with get_connection() as conexao:
+        cur = conexao.cursor()
+        cur.execute("SELECT name FROM sqlite_master WHERE type='table' AND name='MusicaTrigrama'")
+        existia = cur.fetchone() is not None
+        cur.execute("""
+            CREATE TABLE IF NOT EXISTS MusicaTrigrama(
+                trigrama TEXT NOT NULL,
+                musica_id INTEGER NOT NULL,
+                PRIMARY KEY(trigrama, musica_id)
+            ) WITHOUT ROWID
+        """)
+        cur.execute("CREATE INDEX IF NOT EXISTS idx_trigrama_musica ON MusicaTrigrama(musica_id)")
+        # Frequência de cada trigrama: a busca começa pelos mais seletivos
+        cur.execute("""
+            CREATE TABLE IF NOT EXISTS TrigramaFrequencia(
+                trigrama TEXT PRIMARY KEY,
+                qtde INTEGER NOT NULL
+            ) WITHOUT ROWID
+        """)
+        if not existia:
+            reindexar_tudo(conexao)
+
+def indexar_musica(conexao, musica_id, nome, artista, album):
+    """Atualiza os trigramas de uma música na transação de escrita corrente."""
+    remover_musica(conexao, musica_id)
+    novos = trigramas(f"{nome} {artista} {album}")
+    conexao.executemany(
+        "INSERT OR IGNORE INTO MusicaTrigrama(trigrama, musica_id) VALUES(?, ?)",
+        [(t, musica_id) for t in novos]
+    )
+    conexao.executemany(
+        """
+        INSERT INTO TrigramaFrequencia(trigrama, qtde) VALUES(?, 1)
+        ON CONFLICT(trigrama) DO UPDATE SET qtde = qtde + 1
+        """,
+        [(t,) for t in novos]
+    )
+
+def remover_musica(conexao, musica_id):
+    cur = conexao.cursor()
+    cur.execute("SELECT trigrama FROM MusicaTrigrama WHERE musica_id = ?", (musica_id,))
+    antigos = [(linha[0],) for linha in cur.fetchall()]
+    if not antigos:
+        return
+    cur.executemany("UPDATE TrigramaFrequencia SET qtde = qtde - 1 WHERE trigrama = ?", antigos)
+    cur.execute("DELETE FROM MusicaTrigrama WHERE musica_id = ?", (musica_id,))
+
+def reindexar_tudo(conexao):
+    """Reconstrói o índice inteiro a partir de Musica (migração/comando de manutenção)."""
+    cur = conexao.cursor()
+    cur.execute("DELETE FROM MusicaTrigrama")
+    cur.execute("DELETE FROM TrigramaFrequencia")
+    leitura = conexao.cursor()
+    leitura.execute("SELECT id, nome, artista, album FROM Musica")
+    total = 0
+    while True:
+        linhas = leitura.fetchmany(1000)
+        if not linhas:
+            break
+        for musica_id, nome, artista, album in linhas:
+            indexar_musica(conexao, musica_id, nome, artista, album)
+        total += len(linhas)
+    return total
+
+def _candidatos_trigrama(cur, consulta: str) -> dict:
+    """{musica_id: trigramas em comum}, usando só os trigramas mais raros da consulta."""
+    tris = list(trigramas(consulta))
+    if not tris:
+        return {}
+    marcadores = ",".join("?" * len(tris))
+    cur.execute(
+        f"SELECT trigrama FROM TrigramaFrequencia WHERE trigrama IN ({marcadores}) AND qtde > 0 ORDER BY qtde",
+        tris
+    )
+    escolhidos = [linha[0] for linha in cur.fetchall()][:_MAX_TRIGRAMAS_CONSULTA]
+    if not escolhidos:
+        return {}
+    uniao = " UNION ALL ".join(
+        "SELECT * FROM (SELECT musica_id FROM MusicaTrigrama WHERE trigrama = ? LIMIT ?)"
+        for _ in escolhidos
+    )
+    params = []
+    for t in escolhidos:
+        params += [t, _MAX_POSTINGS]
+    # Exige uma fração dos trigramas escolhidos para cortar ruído
+    minimo = max(1, len(escolhidos) // 3)
+    cur.execute(
+        f"""
+        SELECT musica_id, COUNT(*) AS c FROM ({uniao})
+        GROUP BY musica_id HAVING c >= ?
+        ORDER BY c DESC LIMIT ?
+        """,
+        (*params, minimo, _MAX_CANDIDATOS)
+    )
+    return dict(cur.fetchall())
+
+# ------------------ ESTRUTURA DE PREFIXOS (memória) ------------------
+
+class IndicePrefixo:
+    """
+    Lista ordenada de (chave normalizada, musica_id) com nome e artista das
+    músicas mais populares; busca de prefixo por bisect, sem ir ao banco.
+    Reconstruída em segundo plano a cada `ttl` segundos; inserções feitas
+    por este worker entram na hora. Só sugere ids: `sugerir` confere cada
+    um em Musica antes de responder.
+    """
+
+    def __init__(self, max_musicas: int, ttl: float):
+        self._max = max_musicas
+        self._ttl = ttl
+        self._chaves = []
+        self._musicas = {}
+        self._construido_em = None
+        self._lock = threading.Lock()
+        self._reconstruindo = False
+
+    def _carregar(self):
+        with get_read_connection() as conexao:
+            cur = conexao.cursor()
+            cur.execute("""
+                SELECT m.id, m.nome, m.artista, m.album
+                FROM Musica m
+                LEFT JOIN (SELECT musica_nome, COUNT(*) AS n FROM Curtida GROUP BY musica_nome) c
+                       ON c.musica_nome = m.nome
+                ORDER BY COALESCE(c.n, 0) DESC, m.id DESC
+                LIMIT ?
+            """, (self._max,))
+            linhas = cur.fetchall()
+        chaves = []
+        musicas = {}
+        for musica_id, nome, artista, album in linhas:
+            musicas[musica_id] = (nome, artista, album)
+            for campo in (nome, artista):
+                chave = normalizar(campo)
+                if chave:
+                    chaves.append((chave, musica_id))
+        chaves.sort()
+        with self._lock:
+            self._chaves, self._musicas = chaves, musicas
+            self._construido_em = time.monotonic()
+            self._reconstruindo = False
+
+    def _garantir(self):
+        if self._construido_em is None:
+            self._carregar()
+            return
+        if time.monotonic() - self._construido_em < self._ttl:
+            return
+        with self._lock:
+            if self._reconstruindo:
+                return
+            self._reconstruindo = True
+
+        def _rodar():
+            try:
+                self._carregar()
+            except Exception as e:
+                print(f"Erro ao reconstruir índice de prefixos: {e}")
+                with self._lock:
+                    self._reconstruindo = False
+
+        threading.Thread(target=_rodar, daemon=True).start()
+
+    def buscar(self, prefixo: str, limite: int) -> dict:
+        self._garantir()
+        with self._lock:
+            chaves, musicas = self._chaves, self._musicas
+        encontrados = {}
+        i = bisect.bisect_left(chaves, (prefixo,))
+        while i < len(chaves) and len(encontrados) < limite and chaves[i][0].startswith(prefixo):
+            musica_id = chaves[i][1]
+            if musica_id in musicas:
+                encontrados[musica_id] = musicas[musica_id]
+            i += 1
+        return encontrados
+
+    def registrar(self, musica_id, nome, artista, album):
+        """Inclui/atualiza uma música escrita por este worker."""
+        if self._construido_em is None:
+            return
+        with self._lock:
+            chaves = [c for c in self._chaves if c[1] != musica_id]
+            for campo in (nome, artista):
+                chave = normalizar(campo)
+                if chave:
+                    bisect.insort(chaves, (chave, musica_id))
+            musicas = dict(self._musicas)
+            musicas[musica_id] = (nome, artista, album)
+            self._chaves, self._musicas = chaves, musicas
+
+    def remover(self, musica_id):
+        if self._construido_em is None:
+            return
+        with self._lock:
+            self._chaves = [c for c in self._chaves if c[1] != musica_id]
+            musicas = dict(self._musicas)
+            musicas.pop(musica_id, None)
+            self._musicas = musicas
+
+indice_prefixo = IndicePrefixo(AUTOCOMPLETE_PREFIXO_MAX, AUTOCOMPLETE_PREFIXO_TTL_S)
+
+# ------------------ BUSCA ------------------
+
+def sugerir(q: str, limite: int = 10) -> list:
+    """
+    Sugestões para a caixa de busca: candidatos por prefixo (memória) e por
+    trigramas (tolerante a erros), relidos de Musica numa consulta só e
+    reordenados por distância de edição. Retorna [(id, nome, artista, album)].
+    """
+    consulta = normalizar(q)
+    if not consulta:
+        return []
+
+    do_prefixo = indice_prefixo.buscar(consulta, _MAX_CANDIDATOS)
+    comuns = {}
+    candidatos = {}
+    with get_read_connection() as conexao:
+        cur = conexao.cursor()
+        if len(consulta) >= 3:
+            comuns = _candidatos_trigrama(cur, consulta)
+        # O índice de prefixos é de até `ttl` atrás (e não vê escritas de outros
+        # workers): os ids dele também passam por Musica, que descarta os apagados
+        # e traz nome/artista atuais para o ranking abaixo
+        ids = list(do_prefixo.keys() | comuns.keys())
+        if ids:
+            marcadores = ",".join("?" * len(ids))
+            cur.execute(f"SELECT id, nome, artista, album FROM Musica WHERE id IN ({marcadores})", ids)
+            for musica_id, nome, artista, album in cur.fetchall():
+                candidatos[musica_id] = (nome, artista, album)
+
+    # Distância grande demais para o tamanho da consulta é ruído
+    tolerancia = max(1, len(consulta) // 3)
+    ranqueados = []
+    for musica_id, (nome, artista, album) in candidatos.items():
+        campos = (normalizar(nome), normalizar(artista))
+        if any(campo.startswith(consulta) for campo in campos):
+            distancia, prefixo = 0, True
+        else:
+            distancia = min(distancia_prefixo(consulta, campo, tolerancia) for campo in campos)
+            prefixo = False
+        if distancia <= tolerancia:
+            ranqueados.append(((distancia, not prefixo, -comuns.get(musica_id, 0), musica_id), musica_id, nome, artista, album))
+
+    ranqueados.sort()
+    return [r[1:] for r in ranqueados[:limite]]
@@ -0,0 +1,202 @@
+import fcntl
+import glob
+import os
+import sqlite3 as lite
+import threading
+import time
+from datetime import datetime
+
+from bd import get_read_connection
+from config import (
+    BACKUP_DIR,
+    BACKUP_INTERVALO_MIN,
+    BACKUP_RETENCAO,
+    BACKUP_PAGINAS_POR_PASSO,
+    BACKUP_PAUSA_MS,
+)
+
+_PREFIXO = "hitnote-"
+
+class BackupEmAndamento(Exception):
+    """Outro backup (deste ou de outro worker) está rodando."""
+
+class ErroBackup(Exception):
+    """O snapshot gerado não passou na verificação de integridade."""
+
+def listar_backups(pasta: str = BACKUP_DIR) -> list:
+    """Snapshots existentes, do mais recente para o mais antigo."""
+    resultado = []
+    for caminho in glob.glob(os.path.join(pasta, f"{_PREFIXO}*.db")):
+        st = os.stat(caminho)
+        resultado.append({"arquivo": os.path.basename(caminho), "bytes": st.st_size, "criado_em": st.st_mtime})
+    resultado.sort(key=lambda b: b["arquivo"], reverse=True)
+    return resultado
+
+def _aplicar_retencao(pasta: str, manter: int) -> list:
+    removidos = []
+    for backup in listar_backups(pasta)[manter:]:
+        os.remove(os.path.join(pasta, backup["arquivo"]))
+        removidos.append(backup["arquivo"])
+    return removidos
+
+def fazer_backup(pasta: str = BACKUP_DIR, manter: int = BACKUP_RETENCAO,
+                 paginas_por_passo: int = BACKUP_PAGINAS_POR_PASSO, pausa_ms: float = BACKUP_PAUSA_MS) -> dict:
+    """
+    Snapshot consistente do banco com a API de backup online do SQLite.
+
+    A cópia anda `paginas_por_passo` páginas por vez, com uma pausa entre os
+    passos, sempre dentro de uma transação de leitura aberta na origem: em
+    WAL isso fixa o snapshot (a cópia não recomeça a cada escrita) sem
+    bloquear o escritor. O arquivo só ganha o nome final depois do
+    `PRAGMA integrity_check`. Um lock de arquivo garante um backup por vez
+    entre todos os workers. Retorna o relatório (duração, vazão, páginas).
+    """
+    os.makedirs(pasta, exist_ok=True)
+    with open(os.path.join(pasta, ".lock"), "w") as trava:
+        try:
+            fcntl.flock(trava, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            raise BackupEmAndamento("Já existe um backup em andamento")
+        try:
+            return _copiar(pasta, manter, paginas_por_passo, pausa_ms)
+        finally:
+            fcntl.flock(trava, fcntl.LOCK_UN)
+
+def _copiar(pasta, manter, paginas_por_passo, pausa_ms) -> dict:
+    nome = f"{_PREFIXO}{datetime.now().strftime('%Y%m%d-%H%M%S')}.db"
+    final = os.path.join(pasta, nome)
+    temporario = final + ".tmp"
+    passos = 0
+    total_paginas = 0
+
+    def _progresso(status, restantes, total):
+        nonlocal passos, total_paginas
+        passos += 1
+        total_paginas = total
+
+    inicio = time.perf_counter()
+    origem = get_read_connection()
+    origem.isolation_level = None
+    destino = lite.connect(temporario)
+    try:
+        # Transação de leitura aberta = snapshot fixo durante toda a cópia
+        origem.execute("BEGIN")
+        origem.execute("SELECT COUNT(*) FROM sqlite_master").fetchone()
+        origem.backup(destino, pages=paginas_por_passo, progress=_progresso, sleep=pausa_ms / 1000)
+        origem.execute("COMMIT")
+        copia_s = time.perf_counter() - inicio
+
+        # O snapshot é um arquivo só, sem -wal ao lado
+        destino.execute("PRAGMA journal_mode=DELETE")
+        integridade = destino.execute("PRAGMA integrity_check").fetchone()[0]
+        tamanho_pagina = destino.execute("PRAGMA page_size").fetchone()[0]
+    except BaseException:
+        destino.close()
+        if os.path.exists(temporario):
+            os.remove(temporario)
+        raise
+    finally:
+        origem.close()
+    destino.close()
+
+    if integridade != "ok":
+        os.remove(temporario)
+        raise ErroBackup(f"Snapshot corrompido: {integridade}")
+    os.replace(temporario, final)
+    duracao_s = time.perf_counter() - inicio
+    tamanho = os.path.getsize(final)
+
+    return {
+        "arquivo": nome,
+        "bytes": tamanho,
+        "paginas": total_paginas,
+        "tamanho_pagina": tamanho_pagina,
+        "passos": passos,
+        "copia_s": round(copia_s, 3),
+        "duracao_s": round(duracao_s, 3),
+        "mb_por_s": round(tamanho / 1e6 / copia_s, 1) if copia_s > 0 else None,
+        "integridade": integridade,
+        "removidos": _aplicar_retencao(pasta, manter),
+    }
+
+class AgendadorBackup:
+    """
+    Thread que faz um backup a cada `intervalo_min` minutos. Todo worker
+    roda uma, mas o intervalo é medido pelo snapshot mais recente em disco
+    e o lock de arquivo impede cópias simultâneas, então sai um backup por
+    intervalo. Também atende os disparos manuais da rota de admin.
+    """
+
+    def __init__(self, intervalo_min: float):
+        self._intervalo = intervalo_min * 60
+        self._thread = None
+        self._lock = threading.Lock()
+        self.em_andamento = False
+        self.ultimo_relatorio = None
+        self.ultimo_erro = None
+
+    def iniciar(self):
+        with self._lock:
+            if self._intervalo <= 0 or (self._thread is not None and self._thread.is_alive()):
+                return
+            self._thread = threading.Thread(target=self._loop, name="agendador-backup", daemon=True)
+            self._thread.start()
+
+    def _vencido(self) -> bool:
+        backups = listar_backups()
+        return not backups or time.time() - backups[0]["criado_em"] >= self._intervalo
+
+    def executar(self) -> dict:
+        with self._lock:
+            if self.em_andamento:
+                raise BackupEmAndamento("Já existe um backup em andamento")
+            self.em_andamento = True
+        try:
+            relatorio = fazer_backup()
+            self.ultimo_relatorio, self.ultimo_erro = relatorio, None
+            print(f"Backup {relatorio['arquivo']}: {relatorio['bytes']} bytes em {relatorio['duracao_s']}s ({relatorio['mb_por_s']} MB/s)")
+            return relatorio
+        except BackupEmAndamento:
+            raise
+        except Exception as e:
+            self.ultimo_erro = str(e)
+            raise
+        finally:
+            with self._lock:
+                self.em_andamento = False
+
+    def disparar(self):
+        """Backup manual em segundo plano (rota de admin)."""
+        if self.em_andamento:
+            raise BackupEmAndamento("Já existe um backup em andamento")
+
+        def _rodar():
+            try:
+                self.executar()
+            except Exception as e:
+                print(f"Erro no backup manual: {e}")
+
+        threading.Thread(target=_rodar, name="backup-manual", daemon=True).start()
+
+    def _loop(self):
+        while True:
+            # Confere a cada minuto (ou menos, para intervalos curtos)
+            time.sleep(min(60.0, self._intervalo))
+            try:
+                if self._vencido():
+                    self.executar()
+            except BackupEmAndamento:
+                pass
+            except Exception as e:
+                print(f"Erro no backup agendado: {e}")
+
+    def estado(self) -> dict:
+        return {
+            "intervalo_min": self._intervalo / 60,
+            "em_andamento": self.em_andamento,
+            "ultimo_relatorio": self.ultimo_relatorio,
+            "ultimo_erro": self.ultimo_erro,
+            "backups": listar_backups(),
+        }
+
+agendador_backup = AgendadorBackup(BACKUP_INTERVALO_MIN)
@@ -1,8 +1,289 @@
 import os
+import queue
+import threading
+import time
 import sqlite3 as lite
+from concurrent.futures import Future, TimeoutError as FuturoExpirado
+from contextlib import contextmanager
+
+from config import DB_WRITE_QUEUE_SIZE, DB_WRITE_TIMEOUT, DB_WRITE_RESULT_TIMEOUT, DB_GROUP_COMMIT_MS, DB_GROUP_COMMIT_MAX
 
 DB_PATH = "bd_hitnote.db"
 
+# Ganchos do perfilador (perfilador.py). Ficam None, e custam só este
+# teste, a não ser enquanto alguma requisição está sendo perfilada.
+gancho_conexao = None  # () -> fábrica de conexão que mede o SQL, ou None
+gancho_escrita = None  # (executar, funcao, args, agrupar) -> resultado
+
+def _conectar(alvo, **kwargs):
+    if gancho_conexao is not None:
+        fabrica = gancho_conexao()
+        if fabrica is not None:
+            kwargs["factory"] = fabrica
+    return lite.connect(alvo, check_same_thread=False, **kwargs)
+
 def get_connection():
     # Uma conexão nova por chamada; segura entre threads
-    return lite.connect(DB_PATH, check_same_thread=False)
+    return _conectar(DB_PATH)
+
+def get_read_connection():
+    """
+    Conexão somente leitura (URI com mode=ro), usada pelas rotas GET.
+    Nunca abre transação de escrita, então não disputa o lock do SQLite.
+    """
+    uri = f"file:{os.path.abspath(DB_PATH)}?mode=ro"
+    return _conectar(uri, uri=True)
+
+@contextmanager
+def leitura(conexao=None):
+    """
+    Reusa `conexao` se vier (várias consultas de uma mesma resposta);
+    senão abre uma conexão somente leitura só para este bloco.
+    """
+    if conexao is not None:
+        yield conexao
+        return
+    nova = get_read_connection()
+    try:
+        yield nova
+    finally:
+        nova.close()
+
+@contextmanager
+def snapshot_leitura():
+    """
+    Uma conexão somente leitura com transação aberta: todas as consultas
+    do bloco veem o mesmo estado do banco (snapshot do WAL), mesmo com
+    escritas acontecendo no meio.
+    """
+    conexao = get_read_connection()
+    try:
+        conexao.execute("BEGIN")
+        yield conexao
+    finally:
+        conexao.rollback()
+        conexao.close()
+
+# ----------------------------- Escritor único -----------------------------
+
+class FilaEscritaCheia(Exception):
+    """A fila do escritor atingiu o limite; a requisição deve ser recusada."""
+
+class EscritaExpirada(Exception):
+    """O escritor não devolveu o resultado no prazo (travado ou morto); a requisição deve ser recusada."""
+
+class EscritorSerial:
+    """
+    Thread dedicada que executa todas as escritas em uma única conexão.
+    As rotas enfileiram funções `fn(conexao, *args)` numa fila limitada e
+    esperam o resultado; assim a disputa por escrita vira fila mensurável
+    em vez de `database is locked`.
+
+    Escritas marcadas com `agrupar=True` que chegam dentro de `janela_ms`
+    são executadas numa única transação (group commit), cada uma em seu
+    próprio SAVEPOINT, e cada chamador recebe o seu resultado.
+    """
+
+    def __init__(self, tamanho_fila: int, janela_ms: float = 0.0, lote_max: int = 1,
+                 timeout_resultado: float = None):
+        self._fila = queue.Queue(maxsize=tamanho_fila)
+        self._janela = janela_ms / 1000
+        self._lote_max = max(1, lote_max)
+        # Prazo (s) de quem espera o resultado; None espera sem limite
+        self.timeout_resultado = timeout_resultado
+        self._adiado = None
+        self._thread = None
+        self._conexao = None
+        self._lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        self._total = 0
+        self._erros = 0
+        self._espera_total = 0.0
+        self._espera_max = 0.0
+        self._execucao_total = 0.0
+        self._lotes = 0
+        self._itens_em_lote = 0
+        self._expiradas = 0
+        self._reinicios = 0
+
+    def iniciar(self):
+        """Sobe a thread do escritor; se ela morreu, sobe outra (os itens na fila são preservados)."""
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                if self._thread is not None:
+                    print("Escritor SQLite parado; reiniciando.")
+                    self._reinicios += 1
+                self._thread = threading.Thread(target=self._loop, name="escritor-sqlite", daemon=True)
+                self._thread.start()
+
+    def executar(self, funcao, *args, agrupar: bool = False, timeout: float = DB_WRITE_TIMEOUT):
+        # Chamadas feitas de dentro do próprio escritor rodam direto
+        if threading.current_thread() is self._thread:
+            return funcao(self._conexao, *args)
+
+        self.iniciar()
+        futuro = Future()
+        try:
+            self._fila.put((funcao, args, futuro, time.perf_counter(), agrupar), timeout=timeout)
+        except queue.Full:
+            raise FilaEscritaCheia("Fila de escrita cheia, tente novamente.")
+        try:
+            return futuro.result(timeout=self.timeout_resultado)
+        except FuturoExpirado:
+            # Ainda na fila: cancelada, o escritor pula. Já em execução: pode
+            # terminar e gravar depois, mas o chamador não fica preso nela.
+            futuro.cancel()
+            with self._stats_lock:
+                self._expiradas += 1
+            self.iniciar()
+            raise EscritaExpirada("Escritor não respondeu a tempo, tente novamente.")
+
+    def _loop(self):
+        try:
+            self._conexao = get_connection()
+            self._conexao.execute("PRAGMA journal_mode=WAL")
+            self._conexao.execute("PRAGMA synchronous=NORMAL")
+            # Só as escritas passam por aqui: é onde ON DELETE CASCADE e as
+            # chaves estrangeiras precisam valer (vale por conexão, fora de transação)
+            self._conexao.execute("PRAGMA foreign_keys=ON")
+
+            while True:
+                if self._adiado is not None:
+                    item, self._adiado = self._adiado, None
+                else:
+                    item = self._fila.get()
+
+                if item[4] and self._lote_max > 1:
+                    self._executar_lote(self._coletar_lote(item))
+                    continue
+
+                funcao, args, futuro, enfileirado_em, _ = item
+                # Cancelada por quem desistiu de esperar
+                if not futuro.set_running_or_notify_cancel():
+                    continue
+                inicio = time.perf_counter()
+                try:
+                    resultado = funcao(self._conexao, *args)
+                    self._conexao.commit()
+                    futuro.set_result(resultado)
+                except BaseException as e:
+                    futuro.set_exception(e)
+                    with self._stats_lock:
+                        self._erros += 1
+                    self._conexao.rollback()
+                finally:
+                    fim = time.perf_counter()
+                    self._registrar(inicio - enfileirado_em, fim - inicio)
+        finally:
+            # Só chega aqui se a conexão quebrou: a thread morre e a próxima
+            # escrita (ou quem expirou esperando) chama iniciar() e sobe outra
+            if self._conexao is not None:
+                try:
+                    self._conexao.close()
+                except lite.Error:
+                    pass
+
+    def _coletar_lote(self, primeiro) -> list:
+        """Junta as escritas agrupáveis que chegarem dentro da janela."""
+        lote = [primeiro]
+        # A janela conta a partir do enfileiramento: sob carga o primeiro item
+        # já esperou o commit anterior, então só drenamos o que está na fila
+        prazo = primeiro[3] + self._janela
+        while len(lote) < self._lote_max:
+            restante = prazo - time.perf_counter()
+            try:
+                if restante > 0:
+                    item = self._fila.get(timeout=restante)
+                else:
+                    item = self._fila.get_nowait()
+            except queue.Empty:
+                break
+            if not item[4]:
+                # Escrita comum: fica para depois do commit do lote
+                self._adiado = item
+                break
+            lote.append(item)
+        return lote
+
+    def _executar_lote(self, lote: list):
+        lote = [item for item in lote if item[2].set_running_or_notify_cancel()]
+        if not lote:
+            return
+        conexao = self._conexao
+        inicio = time.perf_counter()
+        resultados = []
+        try:
+            conexao.execute("BEGIN")
+            for funcao, args, futuro, _, _ in lote:
+                conexao.execute("SAVEPOINT escrita")
+                try:
+                    resultados.append((futuro, funcao(conexao, *args), None))
+                    conexao.execute("RELEASE escrita")
+                except Exception as e:
+                    # Falha isolada: desfaz só esta escrita e segue com o lote
+                    conexao.execute("ROLLBACK TO escrita")
+                    conexao.execute("RELEASE escrita")
+                    resultados.append((futuro, None, e))
+            conexao.commit()
+        except BaseException as e:
+            conexao.rollback()
+            resultados = [(item[2], None, e) for item in lote]
+
+        fim = time.perf_counter()
+        # Resultados só são entregues depois do commit do lote inteiro
+        for futuro, resultado, erro in resultados:
+            if erro is None:
+                futuro.set_result(resultado)
+            else:
+                futuro.set_exception(erro)
+
+        with self._stats_lock:
+            self._lotes += 1
+            self._itens_em_lote += len(lote)
+            self._erros += sum(1 for _, _, erro in resultados if erro is not None)
+        for item in lote:
+            self._registrar(inicio - item[3], fim - inicio)
+
+    def _registrar(self, espera: float, execucao: float):
+        with self._stats_lock:
+            self._total += 1
+            self._espera_total += espera
+            self._espera_max = max(self._espera_max, espera)
+            self._execucao_total += execucao
+
+    def estatisticas(self) -> dict:
+        with self._stats_lock:
+            total = self._total
+            return {
+                "fila_atual": self._fila.qsize(),
+                "fila_max": self._fila.maxsize,
+                "escritas": total,
+                "erros": self._erros,
+                "espera_media_ms": (self._espera_total / total * 1000) if total else 0.0,
+                "espera_max_ms": self._espera_max * 1000,
+                "execucao_media_ms": (self._execucao_total / total * 1000) if total else 0.0,
+                "lotes": self._lotes,
+                "media_por_lote": (self._itens_em_lote / self._lotes) if self._lotes else 0.0,
+                "expiradas": self._expiradas,
+                "reinicios": self._reinicios,
+                "vivo": self._thread is not None and self._thread.is_alive(),
+            }
+
+escritor = EscritorSerial(DB_WRITE_QUEUE_SIZE, DB_GROUP_COMMIT_MS, DB_GROUP_COMMIT_MAX, DB_WRITE_RESULT_TIMEOUT)
+
+def executar_escrita(funcao, *args, agrupar: bool = False):
+    """
+    Executa `funcao(conexao, *args)` no escritor único e devolve o resultado.
+    Com `agrupar=True` a escrita pode dividir o commit com outras (group commit).
+    """
+    if gancho_escrita is not None:
+        return gancho_escrita(escritor.executar, funcao, args, agrupar)
+    return escritor.executar(funcao, *args, agrupar=agrupar)
+
+def adicionar_coluna(cur, tabela: str, coluna: str, definicao: str) -> bool:
+    """ALTER TABLE ... ADD COLUMN só se a coluna ainda não existir. Retorna True se criou."""
+    colunas = {linha[1] for linha in cur.execute(f"PRAGMA table_info({tabela})")}
+    if coluna in colunas:
+        return False
+    cur.execute(f"ALTER TABLE {tabela} ADD COLUMN {coluna} {definicao}")
+    return True
@@ -0,0 +1,116 @@
+import threading
+import time
+
+from starlette.concurrency import run_in_threadpool
+
+import genius
+from autocomplete import normalizar
+from config import BUSCA_HIBRIDA_MIN_LOCAL
+from crud.crud_musica import listar_busca
+
+class EstatisticasBusca:
+    """
+    Quantas buscas foram respondidas só pelo catálogo local e quanto tempo
+    isso poupou, estimado pela latência média (EWMA) das chamadas ao Genius.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._buscas = 0
+        self._so_local = 0
+        self._chamadas_genius = 0
+        self._falhas_genius = 0
+        self._latencia_genius_ms = None
+        self._economizado_ms = 0.0
+
+    def registrar_local(self):
+        with self._lock:
+            self._buscas += 1
+            self._so_local += 1
+            if self._latencia_genius_ms is not None:
+                self._economizado_ms += self._latencia_genius_ms
+
+    def registrar_genius(self, duracao_ms: float, ok: bool):
+        with self._lock:
+            self._buscas += 1
+            self._chamadas_genius += 1
+            if not ok:
+                self._falhas_genius += 1
+                return
+            if self._latencia_genius_ms is None:
+                self._latencia_genius_ms = duracao_ms
+            else:
+                self._latencia_genius_ms = 0.9 * self._latencia_genius_ms + 0.1 * duracao_ms
+
+    def estatisticas(self) -> dict:
+        with self._lock:
+            return {
+                "buscas": self._buscas,
+                "so_local": self._so_local,
+                "taxa_local": self._so_local / self._buscas if self._buscas else 0.0,
+                "chamadas_genius": self._chamadas_genius,
+                "falhas_genius": self._falhas_genius,
+                "latencia_genius_ms": self._latencia_genius_ms,
+                "economizado_ms": self._economizado_ms,
+            }
+
+estatisticas = EstatisticasBusca()
+
+def _chave(nome, artista, album) -> tuple:
+    return (normalizar(nome), normalizar(artista), normalizar(album))
+
+def _confiavel(consulta: str, nome, artista) -> bool:
+    """Todas as palavras da consulta aparecem no nome/artista (não só no álbum)."""
+    palavras = f" {normalizar(nome)} {normalizar(artista)} "
+    return all(f" {p}" in palavras for p in consulta.split())
+
+def _local_para_resultado(linha) -> dict:
+    return {
+        "origem": "local",
+        "id": linha[0],
+        "genius_id": None,
+        "nome": linha[1],
+        "artista": linha[2],
+        "album": linha[3],
+        "data_lancamento": linha[4],
+        "url_imagem_capa": linha[5],
+    }
+
+async def buscar(query: str, limite: int = 10, min_local: int = BUSCA_HIBRIDA_MIN_LOCAL) -> dict:
+    """
+    Catálogo local primeiro; o Genius só é chamado quando há menos de
+    `min_local` resultados locais confiáveis. Os resultados do Genius que já
+    existem no catálogo (mesmo nome/artista/álbum normalizados) são
+    descartados. Se o Genius falhar, devolve o que houver localmente.
+    """
+    consulta = normalizar(query)
+    # Rota assíncrona: a leitura do SQLite vai para o threadpool
+    locais = await run_in_threadpool(listar_busca, query, "nome_asc", limite, 0)
+    confiaveis = [l for l in locais if _confiavel(consulta, l[1], l[2])]
+    # Confiáveis primeiro, o resto do LIKE (ex.: bateu só no álbum) depois
+    ordenados = confiaveis + [l for l in locais if l not in confiaveis]
+    resultados = [_local_para_resultado(l) for l in ordenados]
+
+    if len(confiaveis) >= min(min_local, limite):
+        estatisticas.registrar_local()
+        return {"resultados": resultados, "genius_consultado": False, "erro_genius": None}
+
+    inicio = time.perf_counter()
+    try:
+        externos = await genius.buscar(query)
+    except genius.ErroGenius as e:
+        estatisticas.registrar_genius((time.perf_counter() - inicio) * 1000, ok=False)
+        return {"resultados": resultados, "genius_consultado": True, "erro_genius": e.detalhe}
+    estatisticas.registrar_genius((time.perf_counter() - inicio) * 1000, ok=True)
+
+    vistos = {_chave(r["nome"], r["artista"], r["album"]) for r in resultados}
+    for externo in externos:
+        if len(resultados) >= limite:
+            break
+        chave = _chave(externo["nome"], externo["artista"], externo["album"])
+        if chave in vistos:
+            continue
+        vistos.add(chave)
+        resultados.append({"origem": "genius", "id": None, **externo})
+
+    return {"resultados": resultados, "genius_consultado": True, "erro_genius": None}
@@ -0,0 +1,169 @@
+import threading
+import time
+from collections import OrderedDict
+
+from bd import get_connection, get_read_connection
+from config import CACHE_MAX_ITENS, CACHE_POLL_MS
+
+# A cada N publicações o próprio escritor apara o histórico de invalidações
+_APARAR_A_CADA = 1000
+_MANTER_INVALIDACOES = 10000
+
+def criarTabelaInvalidacao():
+    with get_connection() as conexao:
+        cur = conexao.cursor()
+        cur.execute("""
+            CREATE TABLE IF NOT EXISTS Invalidacao(
+                versao INTEGER PRIMARY KEY AUTOINCREMENT,
+                chave TEXT NOT NULL,
+                criado_em REAL NOT NULL
+            )
+        """)
+
+class CacheLocal:
+    """
+    Cache LRU em memória do processo, coerente entre workers.
+
+    Os caminhos de escrita gravam as chaves afetadas em `Invalidacao` na
+    mesma transação (ver `publicar_invalidacao`). Cada worker, no máximo a
+    cada `intervalo_ms`, consulta `PRAGMA data_version` numa conexão própria
+    (custo de uma leitura do cabeçalho); só quando o banco mudou lê as
+    invalidações novas e descarta apenas essas chaves. A defasagem entre
+    processos fica limitada ao intervalo de polling.
+    """
+
+    def __init__(self, max_itens: int, intervalo_ms: float):
+        self._dados = OrderedDict()
+        self._max_itens = max_itens
+        self._intervalo = intervalo_ms / 1000
+        self._lock = threading.Lock()
+        self._lock_sync = threading.Lock()
+        self._conexao = None
+        self._data_version = None
+        self._versao = None
+        self._proximo_poll = 0.0
+        # Incrementa a cada invalidação aplicada; evita guardar um valor lido
+        # antes de uma invalidação que chegou durante o carregamento
+        self._geracao = 0
+        self._acertos = 0
+        self._faltas = 0
+        self._invalidacoes = 0
+        self._limpezas = 0
+
+    def obter(self, chave: str, carregar):
+        """Retorna o valor em cache ou chama `carregar()`. Valores vazios não são guardados."""
+        self._sincronizar()
+        with self._lock:
+            if chave in self._dados:
+                self._dados.move_to_end(chave)
+                self._acertos += 1
+                return self._dados[chave]
+            self._faltas += 1
+            geracao = self._geracao
+
+        valor = carregar()
+        if not valor:
+            return valor
+
+        with self._lock:
+            if geracao == self._geracao:
+                self._dados[chave] = valor
+                self._dados.move_to_end(chave)
+                while len(self._dados) > self._max_itens:
+                    self._dados.popitem(last=False)
+        return valor
+
+    def invalidar_local(self, chaves):
+        with self._lock:
+            self._geracao += 1
+            for chave in chaves:
+                if self._dados.pop(chave, None) is not None:
+                    self._invalidacoes += 1
+
+    def limpar(self):
+        with self._lock:
+            self._geracao += 1
+            self._dados.clear()
+            self._limpezas += 1
+
+    def _sincronizar(self):
+        agora = time.monotonic()
+        if agora < self._proximo_poll:
+            return
+        # Só uma thread faz o polling; as outras seguem com o que há em cache
+        if not self._lock_sync.acquire(blocking=False):
+            return
+        try:
+            self._proximo_poll = agora + self._intervalo
+            if self._conexao is None:
+                self._conexao = get_read_connection()
+            cur = self._conexao.cursor()
+            data_version = cur.execute("PRAGMA data_version").fetchone()[0]
+            if data_version == self._data_version:
+                return
+            self._data_version = data_version
+
+            if self._versao is None:
+                # Primeira sincronização: começa do fim do histórico
+                self._versao = cur.execute("SELECT COALESCE(MAX(versao), 0) FROM Invalidacao").fetchone()[0]
+                self.limpar()
+                return
+
+            menor = cur.execute("SELECT MIN(versao) FROM Invalidacao").fetchone()[0]
+            linhas = cur.execute(
+                "SELECT versao, chave FROM Invalidacao WHERE versao > ? ORDER BY versao",
+                (self._versao,)
+            ).fetchall()
+            if menor is not None and menor > self._versao + 1:
+                # O histórico foi aparado além do que já vimos: descarta tudo
+                self.limpar()
+            elif linhas:
+                self.invalidar_local({chave for _, chave in linhas})
+            if linhas:
+                self._versao = linhas[-1][0]
+        except Exception as e:
+            # Sem conseguir verificar, não dá para confiar no que está em memória
+            print(f"Erro ao sincronizar cache: {e}")
+            self.limpar()
+            self._conexao = None
+            self._data_version = None
+        finally:
+            self._lock_sync.release()
+
+    def estatisticas(self) -> dict:
+        with self._lock:
+            return {
+                "itens": len(self._dados),
+                "max_itens": self._max_itens,
+                "acertos": self._acertos,
+                "faltas": self._faltas,
+                "invalidacoes": self._invalidacoes,
+                "limpezas": self._limpezas,
+                "versao": self._versao,
+                "intervalo_poll_ms": self._intervalo * 1000,
+            }
+
+cache = CacheLocal(CACHE_MAX_ITENS, CACHE_POLL_MS)
+_publicacoes = 0
+
+def publicar_invalidacao(conexao, *chaves):
+    """
+    Registra as chaves alteradas na transação de escrita corrente (conexão
+    do escritor). Os workers as descartam no próximo polling; o chamador
+    descarta as deste processo com `cache.invalidar_local` depois que
+    `executar_escrita` retorna (já commitado). Antes do commit, um leitor
+    daqui poderia recolocar no cache a linha antiga.
+    """
+    global _publicacoes
+    agora = time.time()
+    conexao.executemany(
+        "INSERT INTO Invalidacao(chave, criado_em) VALUES(?, ?)",
+        [(chave, agora) for chave in chaves]
+    )
+
+    _publicacoes += 1
+    if _publicacoes % _APARAR_A_CADA == 0:
+        conexao.execute(
+            "DELETE FROM Invalidacao WHERE versao <= (SELECT MAX(versao) FROM Invalidacao) - ?",
+            (_MANTER_INVALIDACOES,)
+        )
@@ -0,0 +1,347 @@
+import hashlib
+import io
+import ipaddress
+import os
+import socket
+import threading
+from functools import lru_cache
+from urllib.parse import urljoin, urlparse
+
+from config import (
+    CAPAS_DIR,
+    CAPAS_MAX_BYTES,
+    CAPAS_MAX_DOWNLOAD,
+    CAPAS_TIMEOUT,
+    CAPAS_HOSTS_PERMITIDOS,
+)
+from tarefas import tarefa
+
+# Lados (px) das miniaturas geradas; qualquer outro tamanho é recusado
+TAMANHOS = (64, 160, 320, 640)
+
+# Redirecionamentos seguidos (cada salto passa pelas mesmas verificações)
+_MAX_REDIRECIONAMENTOS = 3
+
+class ErroCapa(Exception):
+    def __init__(self, status: int, detalhe: str):
+        super().__init__(detalhe)
+        self.status = status
+        self.detalhe = detalhe
+
+# ------------------ BUSCADORES (plugáveis) ------------------
+
+class BuscadorHttp:
+    """
+    Baixa a imagem da origem (CDN do Genius, url_imagem cadastrada).
+
+    A rota /capas aceita qualquer URL de quem chama, então cada URL (e
+    cada salto de redirecionamento, seguidos aqui e não pelo httpx) precisa
+    estar nos hosts permitidos e resolver só para endereços públicos:
+    nada de loopback, rede privada ou link-local (metadados da nuvem).
+    As falhas da origem saem todas com a mesma mensagem, para a rota não
+    servir de sonda de hosts e portas.
+    """
+
+    def __init__(self, timeout: float, max_bytes: int, hosts_permitidos: tuple = ()):
+        self._timeout = timeout
+        self._max_bytes = max_bytes
+        self._hosts = hosts_permitidos
+        self._cliente = None
+
+    def _obter_cliente(self):
+        if self._cliente is None:
+            import httpx
+            self._cliente = httpx.Client(timeout=self._timeout, follow_redirects=False)
+        return self._cliente
+
+    def _validar(self, url: str):
+        partes = urlparse(url)
+        if partes.scheme not in ("http", "https") or not partes.hostname:
+            raise ErroCapa(400, "URL de imagem inválida")
+        if self._hosts and partes.hostname not in self._hosts:
+            raise ErroCapa(400, "Host de imagem não permitido")
+        try:
+            porta = partes.port or (443 if partes.scheme == "https" else 80)
+            enderecos = {info[4][0] for info in socket.getaddrinfo(partes.hostname, porta, proto=socket.IPPROTO_TCP)}
+        except (OSError, ValueError):
+            raise ErroCapa(502, "Não foi possível obter a imagem")
+        for endereco in enderecos:
+            ip = ipaddress.ip_address(endereco.split("%", 1)[0])
+            if ip.version == 6 and ip.ipv4_mapped:
+                ip = ip.ipv4_mapped
+            if not ip.is_global or ip.is_multicast:
+                raise ErroCapa(400, "Host de imagem não permitido")
+
+    def obter(self, url: str) -> bytes:
+        import httpx
+        try:
+            for _ in range(_MAX_REDIRECIONAMENTOS + 1):
+                self._validar(url)
+                with self._obter_cliente().stream("GET", url) as resposta:
+                    if resposta.is_redirect:
+                        url = urljoin(url, resposta.headers["location"])
+                        continue
+                    if resposta.status_code != 200 or not resposta.headers.get("content-type", "").startswith("image/"):
+                        raise ErroCapa(502, "Não foi possível obter a imagem")
+                    partes_corpo = []
+                    total = 0
+                    for pedaco in resposta.iter_bytes():
+                        total += len(pedaco)
+                        if total > self._max_bytes:
+                            raise ErroCapa(502, "Imagem grande demais")
+                        partes_corpo.append(pedaco)
+                    return b"".join(partes_corpo)
+            raise ErroCapa(502, "Não foi possível obter a imagem")
+        except httpx.HTTPError:
+            raise ErroCapa(502, "Não foi possível obter a imagem")
+
+class BuscadorArquivo:
+    """Lê "URLs" como caminhos dentro de `raiz` (testes e importações offline)."""
+
+    def __init__(self, raiz: str):
+        self._raiz = os.path.realpath(raiz)
+
+    def obter(self, url: str) -> bytes:
+        caminho = url[len("file://"):] if url.startswith("file://") else url
+        caminho = os.path.realpath(os.path.join(self._raiz, caminho.lstrip("/")))
+        if not caminho.startswith(self._raiz + os.sep) or not os.path.isfile(caminho):
+            raise ErroCapa(404, "Imagem não encontrada")
+        with open(caminho, "rb") as f:
+            return f.read()
+
+# ------------------ MINIATURAS ------------------
+
+@lru_cache(maxsize=1)
+def _pillow():
+    """Pillow é opcional: sem ele as miniaturas caem na imagem original."""
+    try:
+        from PIL import Image
+        return Image
+    except ImportError:
+        print("Pillow não instalado: capas servidas sem redimensionar.")
+        return None
+
+def _miniatura(original: bytes, tamanho: int) -> bytes | None:
+    Image = _pillow()
+    if Image is None:
+        return None
+    try:
+        with Image.open(io.BytesIO(original)) as img:
+            # Para JPEG, decodifica já reduzido (bem mais barato que abrir em tamanho cheio)
+            img.draft("RGB", (tamanho, tamanho))
+            img = img.convert("RGB")
+            img.thumbnail((tamanho, tamanho))
+            saida = io.BytesIO()
+            img.save(saida, "JPEG", quality=85, optimize=True, progressive=True)
+            return saida.getvalue()
+    except (OSError, ValueError, SyntaxError, Image.DecompressionBombError):
+        # Veio como image/* mas não decodifica (corrompida, formato estranho)
+        # ou tem pixels demais: a origem mandou algo que não é uma capa
+        raise ErroCapa(502, "Imagem inválida")
+
+def _tipo_imagem(dados: bytes) -> str:
+    if dados.startswith(b"\x89PNG"):
+        return "image/png"
+    if dados[:4] == b"RIFF" and dados[8:12] == b"WEBP":
+        return "image/webp"
+    if dados[:3] == b"GIF":
+        return "image/gif"
+    return "image/jpeg"
+
+# ------------------ CACHE EM DISCO ------------------
+
+class CacheCapas:
+    """
+    Capas endereçadas pelo conteúdo (sha256 dos bytes) em disco:
+
+        {dir}/urls/<sha256 da url>        -> hash do conteúdo
+        {dir}/img/<hh>/<hash>             -> original
+        {dir}/img/<hh>/<hash>_<tamanho>   -> miniatura JPEG
+
+    Cada capa é baixada uma vez; as miniaturas são geradas no primeiro
+    pedido de cada tamanho. O mtime faz as vezes de "último acesso" e,
+    quando o total passa de `max_bytes`, os arquivos menos recentes são
+    apagados (LRU). A contagem é refeita varrendo o diretório, então vale
+    com vários workers dividindo a mesma pasta.
+    """
+
+    def __init__(self, pasta: str, max_bytes: int, buscador):
+        self.pasta = pasta
+        self.max_bytes = max_bytes
+        self.buscador = buscador
+        self._lock = threading.Lock()
+        self._travas = {}
+        self._total = None
+        self._acertos = 0
+        self._faltas = 0
+        self._removidos = 0
+
+    def _caminho_img(self, hash_conteudo: str, tamanho: int | None = None) -> str:
+        nome = hash_conteudo if tamanho is None else f"{hash_conteudo}_{tamanho}"
+        return os.path.join(self.pasta, "img", hash_conteudo[:2], nome)
+
+    def _caminho_url(self, url: str) -> str:
+        return os.path.join(self.pasta, "urls", hashlib.sha256(url.encode()).hexdigest())
+
+    def _gravar(self, caminho: str, dados: bytes):
+        """Escrita atômica: outro worker nunca lê um arquivo pela metade."""
+        os.makedirs(os.path.dirname(caminho), exist_ok=True)
+        temporario = f"{caminho}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(temporario, "wb") as f:
+            f.write(dados)
+        os.replace(temporario, caminho)
+        with self._lock:
+            if self._total is not None:
+                self._total += len(dados)
+            estourou = self._total is None or self._total > self.max_bytes
+        if estourou:
+            self._expulsar()
+
+    def _tocar(self, caminho: str) -> bool:
+        """Marca o acesso (mtime) e diz se o arquivo existe."""
+        try:
+            os.utime(caminho)
+            return True
+        except FileNotFoundError:
+            return False
+
+    def _trava(self, chave: str) -> threading.Lock:
+        # Pedidos simultâneos da mesma capa baixam/geram uma vez só
+        with self._lock:
+            if len(self._travas) > 10000:
+                self._travas.clear()
+            return self._travas.setdefault(chave, threading.Lock())
+
+    def _expulsar(self):
+        arquivos = []
+        for raiz, _, nomes in os.walk(os.path.join(self.pasta, "img")):
+            for nome in nomes:
+                caminho = os.path.join(raiz, nome)
+                try:
+                    st = os.stat(caminho)
+                except FileNotFoundError:
+                    continue
+                arquivos.append((st.st_mtime, st.st_size, caminho))
+        total = sum(a[1] for a in arquivos)
+        # Libera até 90% do limite para não varrer a cada gravação
+        alvo = self.max_bytes * 0.9
+        removidos = 0
+        if total > self.max_bytes:
+            arquivos.sort()
+            for _, tamanho, caminho in arquivos:
+                if total <= alvo:
+                    break
+                try:
+                    os.remove(caminho)
+                except FileNotFoundError:
+                    pass
+                total -= tamanho
+                removidos += 1
+        with self._lock:
+            self._total = total
+            self._removidos += removidos
+            self._travas.clear()
+
+    def _original(self, url: str) -> str:
+        """Hash do conteúdo da capa de `url`, baixando se preciso."""
+        caminho_url = self._caminho_url(url)
+        try:
+            with open(caminho_url) as f:
+                hash_conteudo = f.read().strip()
+            if self._tocar(self._caminho_img(hash_conteudo)):
+                return hash_conteudo
+        except FileNotFoundError:
+            pass
+
+        with self._trava(caminho_url):
+            # Outro pedido pode ter baixado enquanto esperávamos
+            try:
+                with open(caminho_url) as f:
+                    hash_conteudo = f.read().strip()
+                if self._tocar(self._caminho_img(hash_conteudo)):
+                    return hash_conteudo
+            except FileNotFoundError:
+                pass
+
+            dados = self.buscador.obter(url)
+            hash_conteudo = hashlib.sha256(dados).hexdigest()
+            with self._lock:
+                self._faltas += 1
+            if not self._tocar(self._caminho_img(hash_conteudo)):
+                self._gravar(self._caminho_img(hash_conteudo), dados)
+            self._gravar(caminho_url, hash_conteudo.encode())
+            return hash_conteudo
+
+    def resolver(self, url: str) -> str:
+        """Garante a capa de `url` em disco e devolve o hash do conteúdo."""
+        return self._original(url)
+
+    def arquivo(self, hash_conteudo: str, tamanho: int | None = None) -> tuple:
+        """
+        (caminho, content-type) do original ou da miniatura de um hash já
+        conhecido. Lança ErroCapa 404 se o original não está (mais) no cache.
+        """
+        if tamanho is not None and tamanho not in TAMANHOS:
+            raise ErroCapa(400, f"Tamanho deve ser um de {TAMANHOS}")
+        if len(hash_conteudo) != 64 or any(c not in "0123456789abcdef" for c in hash_conteudo):
+            raise ErroCapa(404, "Capa não encontrada")
+
+        original = self._caminho_img(hash_conteudo)
+        if tamanho is not None:
+            caminho = self._caminho_img(hash_conteudo, tamanho)
+            if self._tocar(caminho):
+                with self._lock:
+                    self._acertos += 1
+                return caminho, "image/jpeg"
+            with self._trava(caminho):
+                if not self._tocar(caminho):
+                    try:
+                        with open(original, "rb") as f:
+                            dados = f.read()
+                    except FileNotFoundError:
+                        raise ErroCapa(404, "Capa não encontrada")
+                    miniatura = _miniatura(dados, tamanho)
+                    if miniatura is None:
+                        # Sem Pillow: serve o original
+                        self._tocar(original)
+                        return original, _tipo_imagem(dados)
+                    self._gravar(caminho, miniatura)
+            return caminho, "image/jpeg"
+
+        if not self._tocar(original):
+            raise ErroCapa(404, "Capa não encontrada")
+        with self._lock:
+            self._acertos += 1
+        with open(original, "rb") as f:
+            cabecalho = f.read(16)
+        return original, _tipo_imagem(cabecalho)
+
+    def estatisticas(self) -> dict:
+        with self._lock:
+            return {
+                "acertos": self._acertos,
+                "downloads": self._faltas,
+                "removidos": self._removidos,
+                "bytes": self._total,
+                "max_bytes": self.max_bytes,
+                "pillow": _pillow() is not None,
+            }
+
+cache_capas = CacheCapas(
+    CAPAS_DIR,
+    CAPAS_MAX_BYTES,
+    BuscadorHttp(CAPAS_TIMEOUT, CAPAS_MAX_DOWNLOAD, CAPAS_HOSTS_PERMITIDOS),
+)
+
+@tarefa("capa.prefetch")
+def _prefetch_capa(payload: dict):
+    """Baixa a capa de uma música nova/editada para o cache antes do primeiro acesso."""
+    try:
+        cache_capas.resolver(payload["url"])
+    except ErroCapa as e:
+        if e.status < 500:
+            # URL recusada (host fora da lista, rede interna): não há o que
+            # adiantar, e a rota recusaria igual; não é falha para a fila morta
+            print(f"Prefetch de capa ignorado ({e.detalhe}): {payload['url']}")
+            return
+        raise
@@ -0,0 +1,146 @@
+import zlib
+from functools import lru_cache
+
+# Tipos que já vêm comprimidos: recomprimir só gasta CPU
+_JA_COMPRIMIDOS = ("image/", "video/", "audio/", "application/zip", "application/gzip")
+
+@lru_cache(maxsize=1)
+def _brotli():
+    """O pacote brotli é opcional; sem ele só há gzip."""
+    try:
+        import brotli
+        return brotli
+    except ImportError:
+        print("brotli não instalado: respostas comprimidas só com gzip.")
+        return None
+
+def _escolher_codificacao(aceita: str) -> str | None:
+    opcoes = {}
+    for item in aceita.split(","):
+        partes = [p.strip() for p in item.split(";")]
+        if not partes[0]:
+            continue
+        q = 1.0
+        for p in partes[1:]:
+            if p.startswith("q="):
+                try:
+                    q = float(p[2:])
+                except ValueError:
+                    q = 0.0
+        opcoes[partes[0].lower()] = q
+    if opcoes.get("br", 0) > 0 and _brotli() is not None:
+        return "br"
+    if opcoes.get("gzip", 0) > 0:
+        return "gzip"
+    return None
+
+class _Compressor:
+    def __init__(self, codificacao: str, nivel_gzip: int, nivel_brotli: int):
+        if codificacao == "br":
+            self._obj = _brotli().Compressor(quality=nivel_brotli)
+            self._processar, self._descarregar, self._finalizar = self._obj.process, self._obj.flush, self._obj.finish
+        else:
+            self._obj = zlib.compressobj(nivel_gzip, zlib.DEFLATED, 31)  # 31 = formato gzip
+            self._processar = self._obj.compress
+            self._descarregar = lambda: self._obj.flush(zlib.Z_SYNC_FLUSH)
+            self._finalizar = self._obj.flush
+
+    def pedaco(self, dados: bytes) -> bytes:
+        # Descarrega a cada pedaço: respostas em streaming continuam chegando aos poucos
+        return self._processar(dados) + self._descarregar()
+
+    def final(self, dados: bytes = b"") -> bytes:
+        return self._processar(dados) + self._finalizar()
+
+class CompressaoMiddleware:
+    """
+    Comprime respostas com brotli (se o pacote existir e o cliente aceitar)
+    ou gzip. Respostas menores que `minimo` bytes, já codificadas ou de
+    tipos já comprimidos (imagens) passam intactas. Respostas em streaming
+    são comprimidas pedaço a pedaço.
+    """
+
+    def __init__(self, app, minimo: int = 1024, nivel_gzip: int = 6, nivel_brotli: int = 4):
+        self.app = app
+        self.minimo = minimo
+        self.nivel_gzip = nivel_gzip
+        self.nivel_brotli = nivel_brotli
+        # Avisa na subida, não na primeira requisição, se br está desligado
+        _brotli()
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        aceita = ""
+        for nome, valor in scope["headers"]:
+            if nome == b"accept-encoding":
+                aceita = valor.decode("latin-1")
+                break
+        codificacao = _escolher_codificacao(aceita) if aceita else None
+        if codificacao is None:
+            await self.app(scope, receive, send)
+            return
+
+        inicio = None
+        compressor = None
+        intacto = False
+
+        async def enviar(mensagem):
+            nonlocal inicio, compressor, intacto
+            tipo = mensagem["type"]
+
+            if tipo == "http.response.start":
+                headers = {k.lower(): v for k, v in mensagem.get("headers", [])}
+                tipo_conteudo = headers.get(b"content-type", b"").decode("latin-1")
+                if b"content-encoding" in headers or tipo_conteudo.startswith(_JA_COMPRIMIDOS):
+                    intacto = True
+                    await send(mensagem)
+                else:
+                    # Só dá para decidir quando o primeiro pedaço do corpo chegar
+                    inicio = mensagem
+                return
+
+            if intacto or tipo != "http.response.body":
+                if inicio is not None:
+                    await send(inicio)
+                    inicio = None
+                await send(mensagem)
+                return
+
+            corpo = mensagem.get("body", b"")
+            mais = mensagem.get("more_body", False)
+
+            if inicio is not None:
+                if not mais and len(corpo) < self.minimo:
+                    intacto = True
+                    await send(inicio)
+                    inicio = None
+                    await send(mensagem)
+                    return
+                compressor = _Compressor(codificacao, self.nivel_gzip, self.nivel_brotli)
+                headers = []
+                vary = b"Accept-Encoding"
+                for k, v in inicio.get("headers", []):
+                    if k.lower() == b"vary":
+                        vary = v + b", Accept-Encoding"
+                    elif k.lower() != b"content-length":
+                        headers.append((k, v))
+                headers.append((b"content-encoding", codificacao.encode()))
+                headers.append((b"vary", vary))
+                if not mais:
+                    corpo = compressor.final(corpo)
+                    headers.append((b"content-length", str(len(corpo)).encode()))
+                    await send({**inicio, "headers": headers})
+                    inicio = None
+                    await send({"type": "http.response.body", "body": corpo})
+                    return
+                await send({**inicio, "headers": headers})
+                inicio = None
+
+            if mais:
+                await send({"type": "http.response.body", "body": compressor.pedaco(corpo), "more_body": True})
+            else:
+                await send({"type": "http.response.body", "body": compressor.final(corpo)})
+
+        await self.app(scope, receive, enviar)
@@ -8,3 +8,113 @@ GENIUS_API_URL = os.getenv("GENIUS_API_URL", "https://api.genius.com")
 JWT_DOMAIN = os.getenv("JWT_DOMAIN", "")
 JWT_CLIENT_ID = os.getenv("JWT_CLIENT_ID", "")
 JWT_CLIENT_SECRET = os.getenv("JWT_CLIENT_SECRET", "")
+
+# Escritor único do SQLite: tamanho da fila e tempo máximo de espera (s) para enfileirar
+DB_WRITE_QUEUE_SIZE = int(os.getenv("DB_WRITE_QUEUE_SIZE", "256"))
+DB_WRITE_TIMEOUT = float(os.getenv("DB_WRITE_TIMEOUT", "2.0"))
+# Quanto (s) uma requisição espera pelo resultado da escrita antes de desistir com 503
+DB_WRITE_RESULT_TIMEOUT = float(os.getenv("DB_WRITE_RESULT_TIMEOUT", "30"))
+# Group commit de toggles de curtir/seguir: janela extra (ms) para esperar parceiros
+# (0 = junta só o que já está na fila enquanto o commit anterior acontecia) e lote máximo
+DB_GROUP_COMMIT_MS = float(os.getenv("DB_GROUP_COMMIT_MS", "0"))
+DB_GROUP_COMMIT_MAX = int(os.getenv("DB_GROUP_COMMIT_MAX", "64"))
+
+# Cache em memória por worker: itens máximos e intervalo (ms) de verificação de invalidações
+CACHE_MAX_ITENS = int(os.getenv("CACHE_MAX_ITENS", "10000"))
+CACHE_POLL_MS = float(os.getenv("CACHE_POLL_MS", "100"))
+
+# Autocomplete: quantas músicas populares ficam na estrutura de prefixos em memória e a cada quantos segundos ela é refeita
+AUTOCOMPLETE_PREFIXO_MAX = int(os.getenv("AUTOCOMPLETE_PREFIXO_MAX", "50000"))
+AUTOCOMPLETE_PREFIXO_TTL_S = float(os.getenv("AUTOCOMPLETE_PREFIXO_TTL_S", "300"))
+
+# Cliente do Genius: timeout (s), consultas simultâneas, retentativas com backoff e disjuntor
+GENIUS_TIMEOUT = float(os.getenv("GENIUS_TIMEOUT", "10"))
+GENIUS_CONCORRENCIA = int(os.getenv("GENIUS_CONCORRENCIA", "8"))
+GENIUS_MAX_TENTATIVAS = int(os.getenv("GENIUS_MAX_TENTATIVAS", "3"))
+GENIUS_BACKOFF_BASE = float(os.getenv("GENIUS_BACKOFF_BASE", "0.5"))
+GENIUS_ESPERA_MAX = float(os.getenv("GENIUS_ESPERA_MAX", "10"))
+GENIUS_DISJUNTOR_FALHAS = int(os.getenv("GENIUS_DISJUNTOR_FALHAS", "5"))
+GENIUS_DISJUNTOR_ESPERA = float(os.getenv("GENIUS_DISJUNTOR_ESPERA", "30"))
+
+# Busca híbrida: com pelo menos esta quantidade de resultados locais confiáveis o Genius não é chamado
+BUSCA_HIBRIDA_MIN_LOCAL = int(os.getenv("BUSCA_HIBRIDA_MIN_LOCAL", "3"))
+
+# Cache de capas em disco: pasta, tamanho máximo (bytes), limite por download, timeout e hosts aceitos
+# (padrão: CDNs de imagem do Genius; vazio = qualquer host público — endereços internos são sempre recusados)
+CAPAS_DIR = os.getenv("CAPAS_DIR", "capas_cache")
+CAPAS_MAX_BYTES = int(os.getenv("CAPAS_MAX_BYTES", str(512 * 1024 * 1024)))
+CAPAS_MAX_DOWNLOAD = int(os.getenv("CAPAS_MAX_DOWNLOAD", str(10 * 1024 * 1024)))
+CAPAS_TIMEOUT = float(os.getenv("CAPAS_TIMEOUT", "10"))
+CAPAS_HOSTS_PERMITIDOS = tuple(h.strip() for h in os.getenv("CAPAS_HOSTS_PERMITIDOS", "images.genius.com,images.rapgenius.com,t2.genius.com,assets.genius.com").split(",") if h.strip())
+
+# Compressão de respostas: tamanho mínimo (bytes) e níveis do gzip (1-9) e do brotli (0-11)
+COMPRESSAO_MINIMO = int(os.getenv("COMPRESSAO_MINIMO", "1024"))
+COMPRESSAO_NIVEL_GZIP = int(os.getenv("COMPRESSAO_NIVEL_GZIP", "6"))
+COMPRESSAO_NIVEL_BROTLI = int(os.getenv("COMPRESSAO_NIVEL_BROTLI", "4"))
+
+# Backups online: pasta, intervalo do agendador (min; 0 desliga), quantos manter e ritmo da cópia (páginas por passo, pausa em ms)
+BACKUP_DIR = os.getenv("BACKUP_DIR", "backups")
+BACKUP_INTERVALO_MIN = float(os.getenv("BACKUP_INTERVALO_MIN", "1440"))
+BACKUP_RETENCAO = int(os.getenv("BACKUP_RETENCAO", "7"))
+BACKUP_PAGINAS_POR_PASSO = int(os.getenv("BACKUP_PAGINAS_POR_PASSO", "1024"))
+BACKUP_PAUSA_MS = float(os.getenv("BACKUP_PAUSA_MS", "5"))
+
+# Token das rotas /admin (header X-Admin-Token); vazio desliga essas rotas
+ADMIN_TOKEN = os.getenv("ADMIN_TOKEN", "")
+
+# Controle de admissão: execuções simultâneas por classe de rota, fila por classe e espera máxima (ms) antes do 503
+ADMISSAO_ATIVA = os.getenv("ADMISSAO_ATIVA", "1") == "1"
+ADMISSAO_FILA_MAX = int(os.getenv("ADMISSAO_FILA_MAX", "64"))
+ADMISSAO_ESPERA_MAX_MS = float(os.getenv("ADMISSAO_ESPERA_MAX_MS", "2000"))
+ADMISSAO_LIMITE_AUTH = int(os.getenv("ADMISSAO_LIMITE_AUTH", "4"))
+ADMISSAO_LIMITE_BUSCA = int(os.getenv("ADMISSAO_LIMITE_BUSCA", "8"))
+ADMISSAO_LIMITE_GENIUS = int(os.getenv("ADMISSAO_LIMITE_GENIUS", "8"))
+ADMISSAO_LIMITE_EXPORTACAO = int(os.getenv("ADMISSAO_LIMITE_EXPORTACAO", "2"))
+ADMISSAO_LIMITE_ESCRITA = int(os.getenv("ADMISSAO_LIMITE_ESCRITA", "8"))
+ADMISSAO_LIMITE_LEITURA = int(os.getenv("ADMISSAO_LIMITE_LEITURA", "16"))
+# Threads do AnyIO para rotas síncronas: acima da soma dos limites, as classes não disputam o pool
+ADMISSAO_THREADS = int(os.getenv("ADMISSAO_THREADS", "64"))
+# Token buckets por usuário (ou IP sem token): fichas por segundo e rajada
+TAXA_AUTH_POR_S = float(os.getenv("TAXA_AUTH_POR_S", "1"))
+TAXA_AUTH_RAJADA = float(os.getenv("TAXA_AUTH_RAJADA", "10"))
+TAXA_ESCRITA_POR_S = float(os.getenv("TAXA_ESCRITA_POR_S", "10"))
+TAXA_ESCRITA_RAJADA = float(os.getenv("TAXA_ESCRITA_RAJADA", "30"))
+TAXA_GENIUS_POR_S = float(os.getenv("TAXA_GENIUS_POR_S", "2"))
+TAXA_GENIUS_RAJADA = float(os.getenv("TAXA_GENIUS_RAJADA", "10"))
+
+# Timeline: autores com mais seguidores que isto não fazem fan-out (seguidores puxam na leitura) e entradas mantidas por usuário
+FEED_LIMITE_CELEBRIDADE = int(os.getenv("FEED_LIMITE_CELEBRIDADE", "5000"))
+FEED_MAX_ENTRADAS = int(os.getenv("FEED_MAX_ENTRADAS", "800"))
+
+# Fila de tarefas em segundo plano: threads trabalhadoras, tentativas, backoff (s), reserva antes de outra thread retomar (s) e retenção das concluídas (h)
+TAREFAS_THREADS = int(os.getenv("TAREFAS_THREADS", "2"))
+TAREFAS_MAX_TENTATIVAS = int(os.getenv("TAREFAS_MAX_TENTATIVAS", "5"))
+TAREFAS_BACKOFF_BASE = float(os.getenv("TAREFAS_BACKOFF_BASE", "2"))
+TAREFAS_BACKOFF_MAX = float(os.getenv("TAREFAS_BACKOFF_MAX", "600"))
+TAREFAS_RESERVA_S = float(os.getenv("TAREFAS_RESERVA_S", "300"))
+TAREFAS_RETENCAO_H = float(os.getenv("TAREFAS_RETENCAO_H", "24"))
+
+# Gravação de tráfego para replay (scripts/replay.py): arquivo JSONL (vazio = desligada) e fração das requisições gravadas
+GRAVACAO_ARQUIVO = os.getenv("GRAVACAO_ARQUIVO", "")
+GRAVACAO_AMOSTRA = float(os.getenv("GRAVACAO_AMOSTRA", "0.01"))
+
+# Perfilador por requisição (header X-Perfil: 1 com X-Admin-Token): liga o middleware, fração sorteada, perfis guardados e intervalo de amostragem (ms)
+PERFIL_ATIVO = os.getenv("PERFIL_ATIVO", "0") == "1"
+PERFIL_AMOSTRA = float(os.getenv("PERFIL_AMOSTRA", "0"))
+PERFIL_ANEL = int(os.getenv("PERFIL_ANEL", "50"))
+PERFIL_INTERVALO_MS = float(os.getenv("PERFIL_INTERVALO_MS", "5"))
+
+# Manutenção do banco: intervalo do agendador (min; 0 desliga), linhas analisadas por índice no ANALYZE,
+# tamanho do WAL (MB) acima do qual o checkpoint trunca o arquivo, espera máxima (ms) por leitores no checkpoint,
+# páginas liberadas por passo do incremental_vacuum, linhas por lote na limpeza de órfãos e pausa (ms) entre passos/lotes
+MANUTENCAO_INTERVALO_MIN = float(os.getenv("MANUTENCAO_INTERVALO_MIN", "60"))
+MANUTENCAO_ANALISE_LIMITE = int(os.getenv("MANUTENCAO_ANALISE_LIMITE", "1000"))
+MANUTENCAO_WAL_MAX_MB = float(os.getenv("MANUTENCAO_WAL_MAX_MB", "64"))
+MANUTENCAO_ESPERA_CHECKPOINT_MS = int(os.getenv("MANUTENCAO_ESPERA_CHECKPOINT_MS", "200"))
+MANUTENCAO_VACUUM_PAGINAS = int(os.getenv("MANUTENCAO_VACUUM_PAGINAS", "256"))
+MANUTENCAO_LOTE_ORFAOS = int(os.getenv("MANUTENCAO_LOTE_ORFAOS", "500"))
+MANUTENCAO_PAUSA_MS = float(os.getenv("MANUTENCAO_PAUSA_MS", "20"))
+
+# Diretório de artistas: intervalo (s) do recálculo das top faixas dos artistas marcados (0 desliga) e artistas por rodada
+ARTISTAS_TOP_INTERVALO_S = float(os.getenv("ARTISTAS_TOP_INTERVALO_S", "5"))
+ARTISTAS_TOP_LOTE = int(os.getenv("ARTISTAS_TOP_LOTE", "100"))
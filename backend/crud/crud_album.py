@@ -1,58 +1,234 @@
 import sqlite3 as lite
-from bd import get_connection
+from bd import get_connection, get_read_connection, adicionar_coluna
+
+# ------------------ TABELA ------------------
+
+# Recalcula contagem e nota de um álbum a partir das faixas dele
+# (idx_musica_album + idx_review_musica); usado só quando uma faixa muda
+# de álbum ou é apagada, nunca na leitura. Cada review conta uma vez por
+# álbum, mesmo com duas faixas de mesmo nome, como nos triggers de Review
+_RECALCULAR = """
+    UPDATE Album SET
+        qtdeMusicas = (SELECT COUNT(*) FROM Musica m WHERE m.album_id = Album.id),
+        soma_notas = (SELECT COALESCE(SUM(r.nota), 0) FROM Review r WHERE r.musica IN (SELECT m.nome FROM Musica m WHERE m.album_id = Album.id)),
+        qtd_reviews = (SELECT COUNT(*) FROM Review r WHERE r.musica IN (SELECT m.nome FROM Musica m WHERE m.album_id = Album.id))
+    WHERE id IN ({ids});
+    UPDATE Album SET notaMedia = CASE WHEN qtd_reviews > 0 THEN soma_notas * 1.0 / qtd_reviews END
+    WHERE id IN ({ids});
+    DELETE FROM Album WHERE id IN ({ids}) AND qtdeMusicas = 0;
+"""
+
+# No trigger de faixa nova: as reviews desse nome ainda não contam no álbum
+# (não há outra faixa dele com o mesmo nome)
+_NOME_NOVO_NO_ALBUM = """NOT EXISTS (
+    SELECT 1 FROM Musica m WHERE m.album_id = Album.id AND m.nome = NEW.nome AND m.id != NEW.id
+)"""
 
-# Criando tabela
 def criarTabelaAlbum():
+    """
+    Album é derivado de Musica: um álbum por (artista, album) distinto.
+    Sem artista vira '' (e não NULL): o índice único e o cursor por
+    (artista, nome) tratam NULL como distinto e fora da ordem.
+    Triggers mantêm Musica.album_id, qtdeMusicas e a nota média (soma e
+    quantidade de reviews) a cada escrita em Musica e Review, então a
+    página do álbum é uma leitura pela PK e um range scan das faixas.
+    """
     with get_connection() as conexao:
         cur = conexao.cursor()
-        #cur.execute("DROP TABLE Album")
-        cur.execute("CREATE TABLE IF NOT EXISTS Album(id INTEGER PRIMARY KEY AUTOINCREMENT, nome TEXT, notaMedia FLOAT, qtdeMusicas INT, artista TEXT, duracao TEXT, genero TEXT)")
+        cur.execute("SELECT name FROM sqlite_master WHERE type='table' AND name='Album'")
+        existia = cur.fetchone() is not None
+        cur.execute("""
+            CREATE TABLE IF NOT EXISTS Album(
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                nome TEXT,
+                notaMedia FLOAT,
+                qtdeMusicas INT NOT NULL DEFAULT 0,
+                artista TEXT NOT NULL DEFAULT '',
+                duracao TEXT,
+                genero TEXT,
+                soma_notas FLOAT NOT NULL DEFAULT 0,
+                qtd_reviews INT NOT NULL DEFAULT 0
+            )
+        """)
+        adicionar_coluna(cur, "Album", "soma_notas", "FLOAT NOT NULL DEFAULT 0")
+        adicionar_coluna(cur, "Album", "qtd_reviews", "INT NOT NULL DEFAULT 0")
+        adicionar_coluna(cur, "Musica", "album_id", "INTEGER")
+        if existia:
+            _unificar_sem_artista(cur)
+            # O corpo dos triggers de faixa pode ter mudado: recriados abaixo
+            cur.execute("DROP TRIGGER IF EXISTS trg_album_musica_insert")
+            cur.execute("DROP TRIGGER IF EXISTS trg_album_musica_update")
+            cur.execute("DROP TRIGGER IF EXISTS trg_album_musica_delete")
+        # Um álbum por (artista, nome); também é a ordem da listagem
+        cur.execute("CREATE UNIQUE INDEX IF NOT EXISTS idx_album_artista_nome ON Album(artista, nome)")
+        # Listagem por nota
+        cur.execute("CREATE INDEX IF NOT EXISTS idx_album_nota ON Album(notaMedia, id)")
+        # Faixas do álbum
+        cur.execute("CREATE INDEX IF NOT EXISTS idx_musica_album ON Musica(album_id, id)")
 
+        # Faixa nova: cria o álbum se preciso, liga a faixa e soma 1
+        cur.execute(f"""
+            CREATE TRIGGER IF NOT EXISTS trg_album_musica_insert AFTER INSERT ON Musica
+            WHEN NEW.album IS NOT NULL AND NEW.album != ''
+            BEGIN
+                INSERT OR IGNORE INTO Album(nome, artista) VALUES(NEW.album, COALESCE(NEW.artista, ''));
+                UPDATE Musica SET album_id = (SELECT id FROM Album WHERE artista = COALESCE(NEW.artista, '') AND nome = NEW.album)
+                WHERE id = NEW.id;
+                UPDATE Album SET
+                    qtdeMusicas = qtdeMusicas + 1,
+                    soma_notas = soma_notas + (SELECT COALESCE(SUM(nota), 0) FROM Review WHERE musica = NEW.nome AND {_NOME_NOVO_NO_ALBUM}),
+                    qtd_reviews = qtd_reviews + (SELECT COUNT(*) FROM Review WHERE musica = NEW.nome AND {_NOME_NOVO_NO_ALBUM})
+                WHERE artista = COALESCE(NEW.artista, '') AND nome = NEW.album;
+                UPDATE Album SET notaMedia = CASE WHEN qtd_reviews > 0 THEN soma_notas * 1.0 / qtd_reviews END
+                WHERE artista = COALESCE(NEW.artista, '') AND nome = NEW.album;
+            END
+        """)
+        # Faixa que mudou de nome/artista/álbum: religa e recalcula os dois álbuns envolvidos
+        cur.execute(f"""
+            CREATE TRIGGER IF NOT EXISTS trg_album_musica_update AFTER UPDATE OF nome, artista, album ON Musica
+            WHEN OLD.nome IS NOT NEW.nome OR OLD.artista IS NOT NEW.artista OR OLD.album IS NOT NEW.album
+            BEGIN
+                INSERT OR IGNORE INTO Album(nome, artista)
+                SELECT NEW.album, COALESCE(NEW.artista, '') WHERE NEW.album IS NOT NULL AND NEW.album != '';
+                UPDATE Musica SET album_id = (SELECT id FROM Album WHERE artista = COALESCE(NEW.artista, '') AND nome = NEW.album)
+                WHERE id = NEW.id;
+                {_RECALCULAR.format(ids="OLD.album_id, (SELECT album_id FROM Musica WHERE id = NEW.id)")}
+            END
+        """)
+        cur.execute(f"""
+            CREATE TRIGGER IF NOT EXISTS trg_album_musica_delete AFTER DELETE ON Musica
+            WHEN OLD.album_id IS NOT NULL
+            BEGIN
+                {_RECALCULAR.format(ids="OLD.album_id")}
+            END
+        """)
 
-# Inserindo dados 
-def inserirDados(dados):
-    with get_connection() as conexao:
-        cur = conexao.cursor()
-        query = "INSERT INTO Album(nome, notaMedia, qtdeMusicas, artista, duracao, genero) VALUES(?,?,?,?,?,?)"
-        cur.execute(query, dados)
+        # Reviews: soma/subtrai a nota nos álbuns das faixas com esse nome (Review liga por nome)
+        cur.execute("""
+            CREATE TRIGGER IF NOT EXISTS trg_album_review_insert AFTER INSERT ON Review
+            BEGIN
+                UPDATE Album SET
+                    soma_notas = soma_notas + NEW.nota,
+                    qtd_reviews = qtd_reviews + 1,
+                    notaMedia = (soma_notas + NEW.nota) * 1.0 / (qtd_reviews + 1)
+                WHERE id IN (SELECT album_id FROM Musica WHERE nome = NEW.musica);
+            END
+        """)
+        cur.execute("""
+            CREATE TRIGGER IF NOT EXISTS trg_album_review_delete AFTER DELETE ON Review
+            BEGIN
+                UPDATE Album SET
+                    soma_notas = soma_notas - OLD.nota,
+                    qtd_reviews = qtd_reviews - 1,
+                    notaMedia = CASE WHEN qtd_reviews > 1 THEN (soma_notas - OLD.nota) * 1.0 / (qtd_reviews - 1) END
+                WHERE id IN (SELECT album_id FROM Musica WHERE nome = OLD.musica);
+            END
+        """)
+        cur.execute("""
+            CREATE TRIGGER IF NOT EXISTS trg_album_review_update AFTER UPDATE OF musica, nota ON Review
+            BEGIN
+                UPDATE Album SET
+                    soma_notas = soma_notas - OLD.nota,
+                    qtd_reviews = qtd_reviews - 1,
+                    notaMedia = CASE WHEN qtd_reviews > 1 THEN (soma_notas - OLD.nota) * 1.0 / (qtd_reviews - 1) END
+                WHERE id IN (SELECT album_id FROM Musica WHERE nome = OLD.musica);
+                UPDATE Album SET
+                    soma_notas = soma_notas + NEW.nota,
+                    qtd_reviews = qtd_reviews + 1,
+                    notaMedia = (soma_notas + NEW.nota) * 1.0 / (qtd_reviews + 1)
+                WHERE id IN (SELECT album_id FROM Musica WHERE nome = NEW.musica);
+            END
+        """)
+        if not existia:
+            _preencher(cur)
 
-# Atualizando dados
-def atualizarDados(novos_dados):
-    with get_connection() as conexao:
-        cur = conexao.cursor()
-        query = "UPDATE Album SET nome=?, notaMedia=?, qtdeMusicas=?, artista=?, duracao=?, genero=? WHERE id=?"
-        cur.execute(query, novos_dados)
+def _preencher(cur):
+    """Primeira criação: álbuns a partir do catálogo atual (único GROUP BY, uma vez)."""
+    cur.execute("""
+        INSERT OR IGNORE INTO Album(nome, artista)
+        SELECT DISTINCT album, COALESCE(artista, '') FROM Musica WHERE album IS NOT NULL AND album != ''
+    """)
+    cur.execute("""
+        UPDATE Musica SET album_id = (SELECT a.id FROM Album a WHERE a.artista = COALESCE(Musica.artista, '') AND a.nome = Musica.album)
+        WHERE album IS NOT NULL AND album != ''
+    """)
+    reconciliar_albums(cur)
 
-# Deletando dados
-def deletarDados(id):
-    with get_connection() as conexao:
-        cur = conexao.cursor()
-        query = "DELETE FROM Album WHERE id=?"
-        cur.execute(query, id)
+def _unificar_sem_artista(cur):
+    """
+    Bancos antigos: álbuns sem artista foram gravados com NULL, e o índice
+    único deixou um por faixa. Junta cada nome no de menor id e passa a ''.
+    """
+    if cur.execute("SELECT 1 FROM Album WHERE artista IS NULL LIMIT 1").fetchone() is None:
+        return
+    cur.execute("""
+        UPDATE Musica SET album_id = (
+            SELECT MIN(a2.id) FROM Album a1
+            JOIN Album a2 ON a2.nome = a1.nome AND COALESCE(a2.artista, '') = ''
+            WHERE a1.id = Musica.album_id
+        )
+        WHERE album_id IN (SELECT id FROM Album WHERE COALESCE(artista, '') = '')
+    """)
+    cur.execute("""
+        DELETE FROM Album WHERE COALESCE(artista, '') = ''
+        AND id NOT IN (SELECT MIN(id) FROM Album WHERE COALESCE(artista, '') = '' GROUP BY nome)
+    """)
+    cur.execute("UPDATE Album SET artista = '' WHERE artista IS NULL")
+    reconciliar_albums(cur)
 
-# Vendo dados
-def visualizarDados():
-    ver_dados = []
-    with get_connection() as conexao:
-        cur = conexao.cursor()
-        query = "SELECT * FROM Album"
-        cur.execute(query)
+def reconciliar_albums(cur) -> int:
+    """Recalcula contagem e nota de todos os álbuns (manutenção; as escritas já mantêm)."""
+    cur.execute("""
+        UPDATE Album SET
+            qtdeMusicas = (SELECT COUNT(*) FROM Musica m WHERE m.album_id = Album.id),
+            soma_notas = (SELECT COALESCE(SUM(r.nota), 0) FROM Review r WHERE r.musica IN (SELECT m.nome FROM Musica m WHERE m.album_id = Album.id)),
+            qtd_reviews = (SELECT COUNT(*) FROM Review r WHERE r.musica IN (SELECT m.nome FROM Musica m WHERE m.album_id = Album.id))
+    """)
+    cur.execute("UPDATE Album SET notaMedia = CASE WHEN qtd_reviews > 0 THEN soma_notas * 1.0 / qtd_reviews END")
+    cur.execute("DELETE FROM Album WHERE qtdeMusicas = 0")
+    return cur.execute("SELECT COUNT(*) FROM Album").fetchone()[0]
 
-        linhas = cur.fetchall()
-        for linha in linhas:
-            ver_dados.append(linha)
-    
-    return ver_dados
+# ------------------ LEITURA ------------------
 
-def verLinha(id):
-    ver_linha = []
-    with get_connection() as conexao:
+_COLUNAS = "id, nome, artista, notaMedia, qtdeMusicas, qtd_reviews, duracao, genero"
+
+def listar_albums(limite=20, apos=None, artista=None, ordem="nome"):
+    """
+    Álbuns paginados por keyset.
+    ordem="nome": por (artista, nome), `apos` = (artista, nome) da última linha;
+    ordem="nota": maiores notas primeiro, `apos` = (notaMedia, id).
+    """
+    filtros, params = [], []
+    if artista is not None:
+        filtros.append("artista = ?")
+        params.append(artista)
+    if ordem == "nota":
+        filtros.append("notaMedia IS NOT NULL")
+        if apos is not None:
+            filtros.append("(notaMedia, id) < (?, ?)")
+            params.extend(apos)
+        ordenacao = "notaMedia DESC, id DESC"
+    else:
+        if apos is not None:
+            filtros.append("(artista, nome) > (?, ?)")
+            params.extend(apos)
+        ordenacao = "artista, nome"
+    where = f"WHERE {' AND '.join(filtros)}" if filtros else ""
+    with get_read_connection() as conexao:
+        cur = conexao.cursor()
+        cur.execute(f"SELECT {_COLUNAS} FROM Album {where} ORDER BY {ordenacao} LIMIT ?", (*params, limite))
+        return cur.fetchall()
+
+def obter_album(album_id):
+    """(album, faixas): leitura pela PK e um range scan em idx_musica_album."""
+    with get_read_connection() as conexao:
         cur = conexao.cursor()
-        query = "SELECT * FROM Album WHERE id=?"
-        cur.execute(query, id)
-
-        linhas = cur.fetchall()
-        for linha in linhas:
-            ver_linha.append(linha)
-        
-    return ver_linha
+        cur.execute(f"SELECT {_COLUNAS} FROM Album WHERE id = ?", (album_id,))
+        album = cur.fetchone()
+        if album is None:
+            return None, []
+        cur.execute(
+            "SELECT id, nome, artista, album, data_lancamento, url_imagem FROM Musica WHERE album_id = ? ORDER BY id",
+            (album_id,)
+        )
+        return album, cur.fetchall()
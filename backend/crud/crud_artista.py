@@ -0,0 +1,313 @@
+import json
+import threading
+import time
+from bd import get_connection, get_read_connection, executar_escrita, adicionar_coluna, leitura
+from config import ARTISTAS_TOP_INTERVALO_S, ARTISTAS_TOP_LOTE
+
+# Quantas faixas mais populares ficam guardadas em Artista.top_musicas
+TOP_MUSICAS = 5
+
+# ------------------ TABELA ------------------
+
+# Recalcula as estatísticas de artistas a partir das faixas deles
+# (idx_musica_artista + idx_review_musica + idx_curtida_musica); usado
+# quando uma faixa muda de artista ou é apagada, nunca na leitura. Cada
+# review/curtida conta uma vez por artista, como nos triggers de Review e Curtida
+_RECALCULAR = """
+    UPDATE Artista SET
+        top_pendente = 1,
+        qtd_musicas = (SELECT COUNT(*) FROM Musica m WHERE m.artista_id = Artista.id),
+        soma_notas = (SELECT COALESCE(SUM(r.nota), 0) FROM Review r WHERE r.musica IN (SELECT m.nome FROM Musica m WHERE m.artista_id = Artista.id)),
+        qtd_reviews = (SELECT COUNT(*) FROM Review r WHERE r.musica IN (SELECT m.nome FROM Musica m WHERE m.artista_id = Artista.id)),
+        qtd_curtidas = (SELECT COUNT(*) FROM Curtida c WHERE c.musica_nome IN (SELECT m.nome FROM Musica m WHERE m.artista_id = Artista.id))
+    WHERE id IN ({ids});
+    UPDATE Artista SET nota_media = CASE WHEN qtd_reviews > 0 THEN soma_notas * 1.0 / qtd_reviews END
+    WHERE id IN ({ids});
+    DELETE FROM Artista WHERE id IN ({ids}) AND qtd_musicas = 0;
+"""
+
+# No trigger de faixa nova: as reviews/curtidas desse nome ainda não contam
+# no artista (não há outra faixa dele com o mesmo nome)
+_NOME_NOVO_NO_ARTISTA = """NOT EXISTS (
+    SELECT 1 FROM Musica m WHERE m.artista_id = Artista.id AND m.nome = NEW.nome AND m.id != NEW.id
+)"""
+
+# Nomes dos triggers, para recriá-los quando o corpo muda
+_TRIGGERS = (
+    "trg_artista_musica_insert", "trg_artista_musica_update", "trg_artista_musica_delete",
+    "trg_artista_review_insert", "trg_artista_review_delete", "trg_artista_review_update",
+    "trg_artista_curtida_insert", "trg_artista_curtida_delete",
+)
+
+def criarTabelaArtista():
+    """
+    Artista é derivado de Musica.artista: quantidade de faixas, nota média
+    (soma e quantidade de reviews) e curtidas ficam materializadas e são
+    mantidas por triggers a cada escrita em Musica, Review e Curtida. As
+    faixas mais populares são caras demais para o trigger: ele só marca
+    `top_pendente` e `atualizador_top` recalcula os artistas marcados.
+    """
+    with get_connection() as conexao:
+        cur = conexao.cursor()
+        cur.execute("SELECT name FROM sqlite_master WHERE type='table' AND name='Artista'")
+        existia = cur.fetchone() is not None
+        cur.execute("""
+            CREATE TABLE IF NOT EXISTS Artista(
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                nome TEXT NOT NULL UNIQUE,
+                qtd_musicas INT NOT NULL DEFAULT 0,
+                soma_notas FLOAT NOT NULL DEFAULT 0,
+                qtd_reviews INT NOT NULL DEFAULT 0,
+                nota_media FLOAT,
+                qtd_curtidas INT NOT NULL DEFAULT 0,
+                popularidade INT GENERATED ALWAYS AS (qtd_curtidas + qtd_reviews) VIRTUAL,
+                top_musicas TEXT NOT NULL DEFAULT '[]',
+                top_pendente INT NOT NULL DEFAULT 1
+            )
+        """)
+        if adicionar_coluna(cur, "Artista", "top_pendente", "INT NOT NULL DEFAULT 1"):
+            # Bancos da versão anterior: triggers enfileiravam artista.top direto na Tarefa
+            cur.execute("DELETE FROM Tarefa WHERE tipo = 'artista.top' AND estado IN ('pendente', 'executando')")
+        # Só roda quando a versão do esquema muda: recria os triggers com o corpo atual
+        for nome in _TRIGGERS:
+            cur.execute(f"DROP TRIGGER IF EXISTS {nome}")
+        adicionar_coluna(cur, "Musica", "artista_id", "INTEGER")
+        # Listagem por popularidade (por nome usa o UNIQUE de nome)
+        cur.execute("CREATE INDEX IF NOT EXISTS idx_artista_popularidade ON Artista(popularidade, id)")
+        # Faixas do artista
+        cur.execute("CREATE INDEX IF NOT EXISTS idx_musica_artista ON Musica(artista_id, id)")
+        # Curtidas de uma música (contagens por artista e top faixas)
+        cur.execute("CREATE INDEX IF NOT EXISTS idx_curtida_musica ON Curtida(musica_nome)")
+        # Artistas com top faixas a recalcular (índice parcial: só os marcados)
+        cur.execute("CREATE INDEX IF NOT EXISTS idx_artista_top_pendente ON Artista(id) WHERE top_pendente = 1")
+
+        # Faixa nova: cria o artista se preciso, liga a faixa e soma os totais dela
+        cur.execute(f"""
+            CREATE TRIGGER IF NOT EXISTS trg_artista_musica_insert AFTER INSERT ON Musica
+            WHEN NEW.artista IS NOT NULL AND NEW.artista != ''
+            BEGIN
+                INSERT OR IGNORE INTO Artista(nome) VALUES(NEW.artista);
+                UPDATE Musica SET artista_id = (SELECT id FROM Artista WHERE nome = NEW.artista)
+                WHERE id = NEW.id;
+                UPDATE Artista SET
+                    top_pendente = 1,
+                    qtd_musicas = qtd_musicas + 1,
+                    soma_notas = soma_notas + (SELECT COALESCE(SUM(nota), 0) FROM Review WHERE musica = NEW.nome AND {_NOME_NOVO_NO_ARTISTA}),
+                    qtd_reviews = qtd_reviews + (SELECT COUNT(*) FROM Review WHERE musica = NEW.nome AND {_NOME_NOVO_NO_ARTISTA}),
+                    qtd_curtidas = qtd_curtidas + (SELECT COUNT(*) FROM Curtida WHERE musica_nome = NEW.nome AND {_NOME_NOVO_NO_ARTISTA})
+                WHERE nome = NEW.artista;
+                UPDATE Artista SET nota_media = CASE WHEN qtd_reviews > 0 THEN soma_notas * 1.0 / qtd_reviews END
+                WHERE nome = NEW.artista;
+            END
+        """)
+        # Faixa que mudou de nome/artista: religa e recalcula os dois artistas envolvidos
+        cur.execute(f"""
+            CREATE TRIGGER IF NOT EXISTS trg_artista_musica_update AFTER UPDATE OF nome, artista ON Musica
+            WHEN OLD.nome IS NOT NEW.nome OR OLD.artista IS NOT NEW.artista
+            BEGIN
+                INSERT OR IGNORE INTO Artista(nome)
+                SELECT NEW.artista WHERE NEW.artista IS NOT NULL AND NEW.artista != '';
+                UPDATE Musica SET artista_id = (SELECT id FROM Artista WHERE nome = NEW.artista)
+                WHERE id = NEW.id;
+                {_RECALCULAR.format(ids="OLD.artista_id, (SELECT artista_id FROM Musica WHERE id = NEW.id)")}
+            END
+        """)
+        cur.execute(f"""
+            CREATE TRIGGER IF NOT EXISTS trg_artista_musica_delete AFTER DELETE ON Musica
+            WHEN OLD.artista_id IS NOT NULL
+            BEGIN
+                {_RECALCULAR.format(ids="OLD.artista_id")}
+            END
+        """)
+
+        # Reviews e curtidas: ajustam os totais dos artistas das faixas com esse nome
+        cur.execute(f"""
+            CREATE TRIGGER IF NOT EXISTS trg_artista_review_insert AFTER INSERT ON Review
+            BEGIN
+                UPDATE Artista SET
+                    top_pendente = 1,
+                    soma_notas = soma_notas + NEW.nota,
+                    qtd_reviews = qtd_reviews + 1,
+                    nota_media = (soma_notas + NEW.nota) * 1.0 / (qtd_reviews + 1)
+                WHERE id IN (SELECT artista_id FROM Musica WHERE nome = NEW.musica);
+            END
+        """)
+        cur.execute(f"""
+            CREATE TRIGGER IF NOT EXISTS trg_artista_review_delete AFTER DELETE ON Review
+            BEGIN
+                UPDATE Artista SET
+                    top_pendente = 1,
+                    soma_notas = soma_notas - OLD.nota,
+                    qtd_reviews = qtd_reviews - 1,
+                    nota_media = CASE WHEN qtd_reviews > 1 THEN (soma_notas - OLD.nota) * 1.0 / (qtd_reviews - 1) END
+                WHERE id IN (SELECT artista_id FROM Musica WHERE nome = OLD.musica);
+            END
+        """)
+        cur.execute(f"""
+            CREATE TRIGGER IF NOT EXISTS trg_artista_review_update AFTER UPDATE OF musica, nota ON Review
+            BEGIN
+                UPDATE Artista SET
+                    top_pendente = 1,
+                    soma_notas = soma_notas - OLD.nota,
+                    qtd_reviews = qtd_reviews - 1,
+                    nota_media = CASE WHEN qtd_reviews > 1 THEN (soma_notas - OLD.nota) * 1.0 / (qtd_reviews - 1) END
+                WHERE id IN (SELECT artista_id FROM Musica WHERE nome = OLD.musica);
+                UPDATE Artista SET
+                    top_pendente = 1,
+                    soma_notas = soma_notas + NEW.nota,
+                    qtd_reviews = qtd_reviews + 1,
+                    nota_media = (soma_notas + NEW.nota) * 1.0 / (qtd_reviews + 1)
+                WHERE id IN (SELECT artista_id FROM Musica WHERE nome = NEW.musica);
+            END
+        """)
+        cur.execute(f"""
+            CREATE TRIGGER IF NOT EXISTS trg_artista_curtida_insert AFTER INSERT ON Curtida
+            BEGIN
+                UPDATE Artista SET qtd_curtidas = qtd_curtidas + 1, top_pendente = 1
+                WHERE id IN (SELECT artista_id FROM Musica WHERE nome = NEW.musica_nome);
+            END
+        """)
+        cur.execute(f"""
+            CREATE TRIGGER IF NOT EXISTS trg_artista_curtida_delete AFTER DELETE ON Curtida
+            BEGIN
+                UPDATE Artista SET qtd_curtidas = qtd_curtidas - 1, top_pendente = 1
+                WHERE id IN (SELECT artista_id FROM Musica WHERE nome = OLD.musica_nome);
+            END
+        """)
+        if not existia:
+            _preencher(cur)
+
+def _preencher(cur):
+    """Primeira criação: artistas a partir do catálogo atual (todos nascem com top_pendente)."""
+    cur.execute("""
+        INSERT OR IGNORE INTO Artista(nome)
+        SELECT DISTINCT artista FROM Musica WHERE artista IS NOT NULL AND artista != ''
+    """)
+    cur.execute("""
+        UPDATE Musica SET artista_id = (SELECT a.id FROM Artista a WHERE a.nome = Musica.artista)
+        WHERE artista IS NOT NULL AND artista != ''
+    """)
+    reconciliar_artistas(cur)
+
+def reconciliar_artistas(cur) -> int:
+    """Recalcula as estatísticas de todos os artistas (manutenção; as escritas já mantêm)."""
+    cur.execute("""
+        UPDATE Artista SET
+            qtd_musicas = (SELECT COUNT(*) FROM Musica m WHERE m.artista_id = Artista.id),
+            soma_notas = (SELECT COALESCE(SUM(r.nota), 0) FROM Review r WHERE r.musica IN (SELECT m.nome FROM Musica m WHERE m.artista_id = Artista.id)),
+            qtd_reviews = (SELECT COUNT(*) FROM Review r WHERE r.musica IN (SELECT m.nome FROM Musica m WHERE m.artista_id = Artista.id)),
+            qtd_curtidas = (SELECT COUNT(*) FROM Curtida c WHERE c.musica_nome IN (SELECT m.nome FROM Musica m WHERE m.artista_id = Artista.id))
+    """)
+    cur.execute("UPDATE Artista SET nota_media = CASE WHEN qtd_reviews > 0 THEN soma_notas * 1.0 / qtd_reviews END")
+    cur.execute("DELETE FROM Artista WHERE qtd_musicas = 0")
+    return cur.execute("SELECT COUNT(*) FROM Artista").fetchone()[0]
+
+# ------------------ TOP FAIXAS ------------------
+
+def _calcular_top(conexao, artista_id):
+    """No escritor: lê e grava na mesma transação, então nenhuma marcação se perde."""
+    cur = conexao.cursor()
+    cur.execute(
+        """
+        SELECT id, nome, album, url_imagem, curtidas, reviews, media FROM (
+            SELECT m.id, m.nome, m.album, m.url_imagem,
+                   (SELECT COUNT(*) FROM Curtida c WHERE c.musica_nome = m.nome) AS curtidas,
+                   (SELECT COUNT(*) FROM Review r WHERE r.musica = m.nome) AS reviews,
+                   (SELECT AVG(nota) FROM Review r WHERE r.musica = m.nome) AS media
+            FROM Musica m WHERE m.artista_id = ?
+        )
+        ORDER BY curtidas + reviews DESC, id
+        LIMIT ?
+        """,
+        (artista_id, TOP_MUSICAS)
+    )
+    colunas = [c[0] for c in cur.description]
+    top = [dict(zip(colunas, linha)) for linha in cur.fetchall()]
+    cur.execute(
+        "UPDATE Artista SET top_musicas = ?, top_pendente = 0 WHERE id = ?",
+        (json.dumps(top, ensure_ascii=False), artista_id)
+    )
+
+def atualizar_tops(lote: int = ARTISTAS_TOP_LOTE) -> int:
+    """Recalcula até `lote` artistas marcados, um por escrita. Retorna quantos."""
+    with leitura() as conexao:
+        ids = [i for (i,) in conexao.execute(
+            "SELECT id FROM Artista WHERE top_pendente = 1 LIMIT ?", (lote,)
+        )]
+    for artista_id in ids:
+        executar_escrita(_calcular_top, artista_id)
+    return len(ids)
+
+class AtualizadorTop:
+    """
+    Thread que a cada `intervalo` segundos recalcula as top faixas dos
+    artistas marcados pelos triggers. Uma rajada de curtidas num artista
+    vira um recálculo só. Cada worker roda uma; recalcular duas vezes é
+    inofensivo.
+    """
+
+    def __init__(self, intervalo: float):
+        self._intervalo = intervalo
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def iniciar(self):
+        with self._lock:
+            if self._intervalo <= 0 or (self._thread is not None and self._thread.is_alive()):
+                return
+            self._thread = threading.Thread(target=self._loop, name="atualizador-top-artistas", daemon=True)
+            self._thread.start()
+
+    def _loop(self):
+        while True:
+            time.sleep(self._intervalo)
+            try:
+                atualizar_tops()
+            except Exception as e:
+                print(f"Erro ao atualizar top faixas dos artistas: {e}")
+
+atualizador_top = AtualizadorTop(ARTISTAS_TOP_INTERVALO_S)
+
+# ------------------ LEITURA ------------------
+
+_COLUNAS = "id, nome, qtd_musicas, nota_media, qtd_reviews, qtd_curtidas, popularidade"
+
+def listar_artistas(limite=20, apos=None, ordem="nome", prefixo=None):
+    """
+    Artistas paginados por keyset.
+    ordem="nome": `apos` = (nome,) da última linha; `prefixo` filtra pelo começo do nome;
+    ordem="popularidade": curtidas + reviews, maiores primeiro, `apos` = (popularidade, id).
+    """
+    filtros, params = [], []
+    if prefixo:
+        filtros.append("nome >= ? AND nome < ?")
+        params.extend((prefixo, prefixo + "\U0010ffff"))
+    if ordem == "popularidade":
+        if apos is not None:
+            filtros.append("(popularidade, id) < (?, ?)")
+            params.extend(apos)
+        ordenacao = "popularidade DESC, id DESC"
+    else:
+        if apos is not None:
+            filtros.append("nome > ?")
+            params.append(apos[0])
+        ordenacao = "nome"
+    where = f"WHERE {' AND '.join(filtros)}" if filtros else ""
+    with get_read_connection() as conexao:
+        cur = conexao.cursor()
+        cur.execute(f"SELECT {_COLUNAS} FROM Artista {where} ORDER BY {ordenacao} LIMIT ?", (*params, limite))
+        return cur.fetchall()
+
+def obter_artista(artista_id):
+    """(artista, top_musicas, álbuns): PK + range scan em idx_album_artista_nome."""
+    with get_read_connection() as conexao:
+        cur = conexao.cursor()
+        cur.execute(f"SELECT {_COLUNAS}, top_musicas FROM Artista WHERE id = ?", (artista_id,))
+        linha = cur.fetchone()
+        if linha is None:
+            return None, [], []
+        cur.execute(
+            "SELECT id, nome, notaMedia, qtdeMusicas FROM Album WHERE artista = ? ORDER BY nome",
+            (linha[1],)
+        )
+        return linha[:-1], json.loads(linha[-1]), cur.fetchall()
@@ -1,16 +1,310 @@
-from bd import get_connection
+from bd import get_connection, get_read_connection, executar_escrita
+from config import FEED_LIMITE_CELEBRIDADE, FEED_MAX_ENTRADAS
+from tarefas import tarefa, enfileirar
 from typing import List, Dict, Any, Tuple
 import sqlite3
+import threading
+import time
 
-def obter_feed_usuario(usuario_id: int) -> List[Dict[str, Any]]:
+# A cada quantas atividades registradas o aparo das timelines é enfileirado
+_APARAR_A_CADA = 1000
+_registradas = 0
+
+# ------------------ TABELAS (timeline) ------------------
+
+def criarTabelaFeed():
+    """
+    Atividade: o que cada usuário fez (review, lista criada), uma linha por evento.
+    TimelineEntrada: a "caixa de entrada" de cada usuário, preenchida na
+    escrita (fan-out) com as atividades de quem ele segue. Ler a timeline é
+    um range scan na chave primária (usuario_id, atividade_id).
+    """
+    with get_connection() as conexao:
+        cur = conexao.cursor()
+        cur.execute("SELECT name FROM sqlite_master WHERE type='table' AND name='Atividade'")
+        existia = cur.fetchone() is not None
+        cur.execute("""
+            CREATE TABLE IF NOT EXISTS Atividade(
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                autor_id INTEGER NOT NULL,
+                tipo TEXT NOT NULL,
+                ref_id INTEGER NOT NULL,
+                target_id INTEGER,
+                acao TEXT,
+                nota FLOAT,
+                comentario TEXT,
+                criado_em REAL
+            )
+        """)
+        # Pull das celebridades, backfill ao seguir e remoção ao deixar de seguir
+        cur.execute("CREATE INDEX IF NOT EXISTS idx_atividade_autor ON Atividade(autor_id, id)")
+        cur.execute("CREATE INDEX IF NOT EXISTS idx_atividade_ref ON Atividade(tipo, ref_id)")
+        cur.execute("""
+            CREATE TABLE IF NOT EXISTS TimelineEntrada(
+                usuario_id INTEGER NOT NULL,
+                atividade_id INTEGER NOT NULL,
+                PRIMARY KEY(usuario_id, atividade_id)
+            ) WITHOUT ROWID
+        """)
+        # Lista de celebridades (qtd_seguidores acima do limite) sem varrer Usuario
+        cur.execute("CREATE INDEX IF NOT EXISTS idx_usuario_seguidores ON Usuario(qtd_seguidores)")
+        if not existia:
+            _preencher_historico(cur)
+
+def _preencher_historico(cur):
+    """Primeira criação: atividades a partir de Review/Lista e fan-out para os seguidores atuais."""
+    agora = time.time()
+    cur.execute("""
+        INSERT INTO Atividade(autor_id, tipo, ref_id, target_id, acao, nota, comentario, criado_em)
+        SELECT autor_id, tipo, ref_id, target_id, acao, nota, comentario, ? FROM (
+            SELECT r.usuario_id AS autor_id, 'review' AS tipo, r.id AS ref_id, m.id AS target_id,
+                   'Avaliou a música ' || r.musica || ' (' || COALESCE(m.artista, '') || ')' AS acao,
+                   r.nota AS nota, r.comentario AS comentario
+            FROM Review r
+            LEFT JOIN Musica m ON m.id = (SELECT id FROM Musica WHERE nome = r.musica LIMIT 1)
+            WHERE r.usuario_id IS NOT NULL
+            UNION ALL
+            SELECT l.usuario_id, 'list_create', l.id, l.id,
+                   'Criou a nova lista ''' || l.nome || '''', NULL, NULL
+            FROM Lista l WHERE l.publica AND l.usuario_id IS NOT NULL
+        )
+    """, (agora,))
+    cur.execute("""
+        INSERT OR IGNORE INTO TimelineEntrada(usuario_id, atividade_id)
+        SELECT a.autor_id, a.id FROM Atividade a
+        UNION ALL
+        SELECT s.seguidor_id, a.id
+        FROM Atividade a
+        JOIN Seguidores s ON s.seguido_id = a.autor_id
+        JOIN Usuario u ON u.id = a.autor_id
+        WHERE u.qtd_seguidores <= ?
+    """, (FEED_LIMITE_CELEBRIDADE,))
+    _aparar(cur, FEED_MAX_ENTRADAS)
+
+# ------------------ ESCRITA (fan-out) ------------------
+
+def registrar_atividade(conexao, autor_id, tipo, ref_id, target_id, acao, nota=None, comentario=None):
+    """
+    Registra a atividade na transação de escrita corrente. Ela entra na
+    timeline do autor na hora; a distribuição para os seguidores vai para
+    a fila de tarefas (feed.fanout), enfileirada na mesma transação.
+    """
+    global _registradas
+    cur = conexao.cursor()
+    cur.execute(
+        """
+        INSERT INTO Atividade(autor_id, tipo, ref_id, target_id, acao, nota, comentario, criado_em)
+        VALUES(?,?,?,?,?,?,?,?)
+        """,
+        (autor_id, tipo, ref_id, target_id, acao, nota, comentario, time.time())
+    )
+    atividade_id = cur.lastrowid
+    cur.execute("INSERT INTO TimelineEntrada(usuario_id, atividade_id) VALUES(?, ?)", (autor_id, atividade_id))
+    enfileirar(conexao, "feed.fanout", {"atividade_id": atividade_id}, chave=f"feed.fanout:{atividade_id}")
+
+    _registradas += 1
+    if _registradas % _APARAR_A_CADA == 0:
+        # Varre todas as timelines: vai para a fila, nunca na transação da requisição
+        enfileirar(conexao, "feed.aparar", {"maximo": FEED_MAX_ENTRADAS}, chave=f"feed.aparar:{int(time.time()) // 60}")
+    return atividade_id
+
+def _distribuir(conexao, atividade_id):
+    cur = conexao.cursor()
+    cur.execute(
+        """
+        SELECT u.qtd_seguidores FROM Atividade a JOIN Usuario u ON u.id = a.autor_id
+        WHERE a.id = ?
+        """,
+        (atividade_id,)
+    )
+    linha = cur.fetchone()
+    # Atividade já apagada, ou autor celebridade (seguidores puxam na leitura)
+    if linha is None or (linha[0] or 0) > FEED_LIMITE_CELEBRIDADE:
+        return 0
+    cur.execute(
+        """
+        INSERT OR IGNORE INTO TimelineEntrada(usuario_id, atividade_id)
+        SELECT s.seguidor_id, a.id FROM Atividade a
+        JOIN Seguidores s ON s.seguido_id = a.autor_id
+        WHERE a.id = ?
+        """,
+        (atividade_id,)
+    )
+    return cur.rowcount
+
+@tarefa("feed.fanout")
+def _tarefa_fanout(payload: dict):
+    """Um INSERT ... SELECT pelo índice de Seguidores (idempotente: OR IGNORE)."""
+    executar_escrita(_distribuir, payload["atividade_id"])
+
+def remover_atividade(conexao, tipo, ref_id):
+    """
+    Apaga a atividade (review/lista apagada). As entradas órfãs nas
+    timelines somem no próximo aparo; até lá o JOIN da leitura as ignora.
+    """
+    conexao.execute("DELETE FROM Atividade WHERE tipo = ? AND ref_id = ?", (tipo, ref_id))
+
+def ao_seguir(conexao, seguidor_id, seguido_id, recentes: int = 50):
+    """Traz as atividades recentes de quem passou a ser seguido para a timeline."""
+    conexao.execute(
+        """
+        INSERT OR IGNORE INTO TimelineEntrada(usuario_id, atividade_id)
+        SELECT ?, id FROM Atividade WHERE autor_id = ? ORDER BY id DESC LIMIT ?
+        """,
+        (seguidor_id, seguido_id, recentes)
+    )
+
+def ao_deixar_de_seguir(conexao, seguidor_id, seguido_id):
+    conexao.execute(
+        """
+        DELETE FROM TimelineEntrada
+        WHERE usuario_id = ? AND atividade_id IN (SELECT id FROM Atividade WHERE autor_id = ?)
+        """,
+        (seguidor_id, seguido_id)
+    )
+
+def _aparar_usuario(cur, usuario_id, maximo: int) -> int:
+    """Mantém só as `maximo` entradas mais recentes da timeline do usuário."""
+    return cur.execute(
+        """
+        DELETE FROM TimelineEntrada
+        WHERE usuario_id = ? AND atividade_id < (
+            SELECT atividade_id FROM TimelineEntrada WHERE usuario_id = ?
+            ORDER BY atividade_id DESC LIMIT 1 OFFSET ?
+        )
+        """,
+        (usuario_id, usuario_id, maximo - 1)
+    ).rowcount
+
+def _aparar(cur, maximo: int) -> int:
+    """Aparo completo numa transação só (preenchimento inicial do esquema)."""
+    cur.execute(
+        "SELECT usuario_id FROM TimelineEntrada GROUP BY usuario_id HAVING COUNT(*) > ?",
+        (maximo,)
+    )
+    removidas = sum(_aparar_usuario(cur, usuario_id, maximo) for (usuario_id,) in cur.fetchall())
+    cur.execute("DELETE FROM TimelineEntrada WHERE atividade_id NOT IN (SELECT id FROM Atividade)")
+    return removidas + cur.rowcount
+
+def _apagar_entradas(conexao, pares) -> int:
+    conexao.executemany("DELETE FROM TimelineEntrada WHERE usuario_id = ? AND atividade_id = ?", pares)
+    return len(pares)
+
+def aparar_timelines(maximo: int = FEED_MAX_ENTRADAS, lote: int = 500) -> int:
+    """
+    Apara as timelines e tira as entradas de atividades apagadas (tarefa
+    feed.aparar, manage.py aparar-timelines). As varreduras rodam numa
+    conexão de leitura; o escritor recebe um usuário ou um lote por vez,
+    então as escritas das rotas passam no meio.
+    """
+    with get_read_connection() as conexao:
+        usuarios = [u for (u,) in conexao.execute(
+            "SELECT usuario_id FROM TimelineEntrada GROUP BY usuario_id HAVING COUNT(*) > ?",
+            (maximo,)
+        )]
+        orfas = conexao.execute("""
+            SELECT t.usuario_id, t.atividade_id FROM TimelineEntrada t
+            WHERE NOT EXISTS (SELECT 1 FROM Atividade a WHERE a.id = t.atividade_id)
+        """).fetchall()
+    removidas = 0
+    for usuario_id in usuarios:
+        removidas += executar_escrita(_aparar_usuario, usuario_id, maximo)
+    for i in range(0, len(orfas), lote):
+        removidas += executar_escrita(_apagar_entradas, orfas[i:i + lote])
+    return removidas
+
+@tarefa("feed.aparar")
+def _tarefa_aparar(payload: dict):
+    aparar_timelines(payload.get("maximo", FEED_MAX_ENTRADAS))
+
+# ------------------ LEITURA ------------------
+
+class _Celebridades:
+    """Ids dos usuários acima do limite de fan-out, relidos a cada `ttl` segundos."""
+
+    def __init__(self, ttl: float = 60.0):
+        self._ttl = ttl
+        self._ids = ()
+        self._lido_em = None
+        self._lock = threading.Lock()
+
+    def obter(self, cur) -> tuple:
+        with self._lock:
+            if self._lido_em is not None and time.monotonic() - self._lido_em < self._ttl:
+                return self._ids
+        cur.execute("SELECT id FROM Usuario WHERE qtd_seguidores > ?", (FEED_LIMITE_CELEBRIDADE,))
+        ids = tuple(linha[0] for linha in cur.fetchall())
+        with self._lock:
+            self._ids, self._lido_em = ids, time.monotonic()
+        return ids
+
+_celebridades = _Celebridades()
+
+_COLUNAS_TIMELINE = """
+    a.id, a.autor_id, u.username, a.tipo, a.target_id, a.acao, a.nota, a.comentario, a.criado_em
+"""
+
+def obter_timeline(usuario_id: int, limite: int = 20, antes_de: int | None = None) -> list:
+    """
+    Timeline de quem `usuario_id` segue (e dele mesmo), mais recente primeiro.
+    Caminho comum: um range scan na caixa de entrada. Celebridades seguidas
+    (sem fan-out) são puxadas por idx_atividade_autor e intercaladas.
+    Retorna linhas (id, autor_id, username, tipo, target_id, acao, nota, comentario, criado_em).
+    """
+    limite_id = antes_de if antes_de is not None else 2 ** 63 - 1
+    with get_read_connection() as conexao:
+        cur = conexao.cursor()
+        cur.execute(
+            f"""
+            SELECT {_COLUNAS_TIMELINE}
+            FROM TimelineEntrada t
+            JOIN Atividade a ON a.id = t.atividade_id
+            LEFT JOIN Usuario u ON u.id = a.autor_id
+            WHERE t.usuario_id = ? AND t.atividade_id < ?
+            ORDER BY t.atividade_id DESC
+            LIMIT ?
+            """,
+            (usuario_id, limite_id, limite)
+        )
+        linhas = {linha[0]: linha for linha in cur.fetchall()}
+
+        celebridades = _celebridades.obter(cur)
+        if celebridades:
+            marcadores = ",".join("?" * len(celebridades))
+            cur.execute(
+                f"SELECT seguido_id FROM Seguidores WHERE seguidor_id = ? AND seguido_id IN ({marcadores})",
+                (usuario_id, *celebridades)
+            )
+            for (autor_id,) in cur.fetchall():
+                cur.execute(
+                    f"""
+                    SELECT {_COLUNAS_TIMELINE}
+                    FROM Atividade a
+                    LEFT JOIN Usuario u ON u.id = a.autor_id
+                    WHERE a.autor_id = ? AND a.id < ?
+                    ORDER BY a.id DESC
+                    LIMIT ?
+                    """,
+                    (autor_id, limite_id, limite)
+                )
+                for linha in cur.fetchall():
+                    linhas.setdefault(linha[0], linha)
+
+    return sorted(linhas.values(), key=lambda linha: linha[0], reverse=True)[:limite]
+
+# ------------------ FEED DE UM USUÁRIO ------------------
+
+
+def obter_feed_usuario(usuario_id: int, conexao=None) -> List[Dict[str, Any]]:
     """
     Busca as atividades recentes (reviews e listas) de um usuário.
     Retorna uma lista de dicionários padronizados para o frontend.
+    Com `conexao`, usa ela (e não a fecha).
     """
     
     conn = None
     try:
-        conn = get_connection()
+        conn = conexao or get_read_connection()
         cur = conn.cursor()
 
         reviews_query = """
@@ -69,5 +363,5 @@ def obter_feed_usuario(usuario_id: int) -> List[Dict[str, Any]]:
         print(f"Erro no banco de dados ao buscar feed: {e}")
         return []
     finally:
-        if conn:
-            pass
\ No newline at end of file
+        if conn and conn is not conexao:
+            conn.close()
\ No newline at end of file
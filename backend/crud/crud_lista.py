@@ -1,4 +1,11 @@
-from bd import get_connection
+import sqlite3 as lite
+from bd import get_connection, get_read_connection, executar_escrita, adicionar_coluna, leitura
+from crud.crud_feed import registrar_atividade, remover_atividade
+
+# Espaço entre posições consecutivas; mover uma faixa usa o ponto médio
+# entre vizinhas, então só renumeramos a lista quando o espaço se esgota.
+INTERVALO_POSICAO = 1024.0
+MENOR_INTERVALO = 1e-9
 
 def criarTabelaLista():
     with get_connection() as conn:
@@ -29,18 +36,78 @@ def criarTabelaLista():
             )
         """)
 
+        # Ordenação manual: posicao fracionária, menor = primeira da lista
+        if adicionar_coluna(cur, "ListaMusica", "posicao", "REAL"):
+            # Bancos antigos: mantém a ordem de exibição (mais recentes primeiro)
+            cur.execute("""
+                UPDATE ListaMusica SET posicao = ordem.n * ?
+                FROM (
+                    SELECT lista_id, musica_id,
+                           ROW_NUMBER() OVER (PARTITION BY lista_id ORDER BY adicionado_em DESC, musica_id DESC) AS n
+                    FROM ListaMusica
+                ) AS ordem
+                WHERE ListaMusica.lista_id = ordem.lista_id AND ListaMusica.musica_id = ordem.musica_id
+            """, (INTERVALO_POSICAO,))
+        cur.execute("CREATE INDEX IF NOT EXISTS idx_listamusica_posicao ON ListaMusica(lista_id, posicao, musica_id)")
+
+        # Contagem mantida na própria Lista: listar as listas de um usuário vira
+        # um único scan em idx_lista_usuario, sem COUNT correlacionado por linha
+        criou_contagem = adicionar_coluna(cur, "Lista", "qtd_musicas", "INTEGER NOT NULL DEFAULT 0")
+        cur.execute("CREATE INDEX IF NOT EXISTS idx_lista_usuario ON Lista(usuario_id, id)")
+        cur.execute("""
+            CREATE TRIGGER IF NOT EXISTS trg_listamusica_insert AFTER INSERT ON ListaMusica
+            BEGIN
+                UPDATE Lista SET qtd_musicas = qtd_musicas + 1 WHERE id = NEW.lista_id;
+            END
+        """)
+        cur.execute("""
+            CREATE TRIGGER IF NOT EXISTS trg_listamusica_delete AFTER DELETE ON ListaMusica
+            BEGIN
+                UPDATE Lista SET qtd_musicas = qtd_musicas - 1 WHERE id = OLD.lista_id;
+            END
+        """)
+        # Remoção da música das listas (trigger abaixo e ON DELETE CASCADE) sem varrer ListaMusica
+        cur.execute("CREATE INDEX IF NOT EXISTS idx_listamusica_musica ON ListaMusica(musica_id)")
+        cur.execute("""
+            CREATE TRIGGER IF NOT EXISTS trg_musica_delete_listas AFTER DELETE ON Musica
+            BEGIN
+                DELETE FROM ListaMusica WHERE musica_id = OLD.id;
+            END
+        """)
+        if criou_contagem:
+            _reconciliar(cur)
+
+def _reconciliar(cur):
+    cur.execute("""
+        UPDATE Lista
+        SET qtd_musicas = (SELECT COUNT(*) FROM ListaMusica lm WHERE lm.lista_id = Lista.id)
+        WHERE qtd_musicas != (SELECT COUNT(*) FROM ListaMusica lm WHERE lm.lista_id = Lista.id)
+    """)
+    return cur.rowcount
+
+def reconciliar_contagens_listas():
+    """
+    Recalcula qtd_musicas de todas as listas a partir de ListaMusica.
+    Retorna quantas listas estavam com a contagem divergente.
+    """
+    return executar_escrita(lambda conn: _reconciliar(conn.cursor()))
+
 def criar_lista(usuario_id, nome, descricao, publica=True):
-    with get_connection() as conn:
+    def _criar(conn):
         cur = conn.cursor()
         cur.execute(
             "INSERT INTO Lista(usuario_id, nome, descricao, publica) VALUES(?,?,?,?)", 
             (usuario_id, nome, descricao, publica)
         )
-        return cur.lastrowid
+        lista_id = cur.lastrowid
+        if publica:
+            registrar_atividade(conn, usuario_id, "list_create", lista_id, lista_id, f"Criou a nova lista '{nome}'")
+        return lista_id
+    return executar_escrita(_criar)
     
 def editar_lista(lista_id, usuario_id, nome, descricao, publica):
     """Atualiza nome, descrição e status de privacidade de uma lista, verificando o dono."""
-    with get_connection() as conn:
+    def _editar(conn):
         cur = conn.cursor()
         cur.execute(
             """
@@ -50,17 +117,20 @@ def editar_lista(lista_id, usuario_id, nome, descricao, publica):
             """,
             (nome, descricao, publica, lista_id, usuario_id)
         )
-        conn.commit()
+        editada = cur.rowcount > 0
+        if editada and not publica:
+            # Lista que virou privada sai das timelines
+            remover_atividade(conn, "list_create", lista_id)
         # Retorna True se alguma linha foi afetada (edição bem-sucedida)
-        return cur.rowcount > 0
+        return editada
+    return executar_escrita(_editar)
 
-def listar_listas_usuario(usuario_id, apenas_publicas=False):
-    """Retorna todas as listas de um usuário."""
-    with get_connection() as conn:
+def listar_listas_usuario(usuario_id, apenas_publicas=False, limite=None, conexao=None):
+    """Retorna as listas de um usuário (todas, ou as `limite` mais recentes)."""
+    with leitura(conexao) as conn:
         cur = conn.cursor()
         query = """
-            SELECT l.id, l.nome, l.descricao, l.url_capa, l.publica, l.data_criacao,
-                   (SELECT COUNT(*) FROM ListaMusica lm WHERE lm.lista_id = l.id) as qtd_musicas
+            SELECT l.id, l.nome, l.descricao, l.url_capa, l.publica, l.data_criacao, l.qtd_musicas
             FROM Lista l
             WHERE l.usuario_id = ?
         """
@@ -68,51 +138,159 @@ def listar_listas_usuario(usuario_id, apenas_publicas=False):
             query += " AND l.publica = 1"
             
         query += " ORDER BY l.id DESC"
+        if limite is not None:
+            query += f" LIMIT {int(limite)}"
         
         cur.execute(query, (usuario_id,))
         return cur.fetchall()
 
 def obter_lista_por_id(lista_id):
-    with get_connection() as conn:
+    with get_read_connection() as conn:
         cur = conn.cursor()
         cur.execute("SELECT * FROM Lista WHERE id = ?", (lista_id,))
         return cur.fetchone()
 
 def adicionar_musica_lista(lista_id, musica_id):
-    with get_connection() as conn:
+    """Adiciona no topo da lista (posição antes da primeira atual). False se a música não existe."""
+    def _adicionar(conn):
         cur = conn.cursor()
+        try:
+            cur.execute(
+                """
+                INSERT OR IGNORE INTO ListaMusica(lista_id, musica_id, posicao)
+                VALUES(?, ?, COALESCE((SELECT MIN(posicao) FROM ListaMusica WHERE lista_id = ?), 0) - ?)
+                """,
+                (lista_id, musica_id, lista_id, INTERVALO_POSICAO)
+            )
+        except lite.IntegrityError:
+            # Chave estrangeira (o escritor liga foreign_keys): música inexistente
+            return False
+        return True
+    return executar_escrita(_adicionar)
+
+def _renumerar_lista(cur, lista_id):
+    """Redistribui as posições com o intervalo padrão (só quando o espaço acaba)."""
+    cur.execute("""
+        UPDATE ListaMusica SET posicao = ordem.n * ?
+        FROM (
+            SELECT musica_id, ROW_NUMBER() OVER (ORDER BY posicao, musica_id) AS n
+            FROM ListaMusica WHERE lista_id = ?
+        ) AS ordem
+        WHERE ListaMusica.lista_id = ? AND ListaMusica.musica_id = ordem.musica_id
+    """, (INTERVALO_POSICAO, lista_id, lista_id))
+
+def _nova_posicao(cur, lista_id, musica_id, antes_de):
+    """Posição entre a vizinha anterior e `antes_de` (ou após a última se None)."""
+    if antes_de is None:
         cur.execute(
-            "INSERT OR IGNORE INTO ListaMusica(lista_id, musica_id) VALUES(?,?)", 
+            "SELECT MAX(posicao) FROM ListaMusica WHERE lista_id = ? AND musica_id != ?",
             (lista_id, musica_id)
         )
-        conn.commit()
+        ultima = cur.fetchone()[0]
+        return (ultima or 0) + INTERVALO_POSICAO
+
+    cur.execute("SELECT posicao FROM ListaMusica WHERE lista_id = ? AND musica_id = ?", (lista_id, antes_de))
+    alvo = cur.fetchone()
+    if alvo is None:
+        return None
+    cur.execute(
+        """
+        SELECT posicao FROM ListaMusica
+        WHERE lista_id = ? AND musica_id != ? AND (posicao < ? OR (posicao = ? AND musica_id < ?))
+        ORDER BY posicao DESC, musica_id DESC LIMIT 1
+        """,
+        (lista_id, musica_id, alvo[0], alvo[0], antes_de)
+    )
+    anterior = cur.fetchone()
+    if anterior is None:
+        return alvo[0] - INTERVALO_POSICAO
+    if alvo[0] - anterior[0] < MENOR_INTERVALO:
+        return None
+    return (anterior[0] + alvo[0]) / 2
+
+def mover_musica_lista(lista_id, musica_id, antes_de=None):
+    """
+    Move a faixa para logo antes de `antes_de` (ou para o fim se None).
+    Normalmente é uma única escrita; retorna False se alguma das faixas
+    não estiver na lista.
+    """
+    def _mover(conn):
+        cur = conn.cursor()
+        cur.execute("SELECT 1 FROM ListaMusica WHERE lista_id = ? AND musica_id = ?", (lista_id, musica_id))
+        if cur.fetchone() is None or antes_de == musica_id:
+            return False
+
+        posicao = _nova_posicao(cur, lista_id, musica_id, antes_de)
+        if posicao is None and antes_de is not None:
+            cur.execute("SELECT 1 FROM ListaMusica WHERE lista_id = ? AND musica_id = ?", (lista_id, antes_de))
+            if cur.fetchone() is None:
+                return False
+            # Sem espaço entre as vizinhas: renumera e tenta de novo
+            _renumerar_lista(cur, lista_id)
+            posicao = _nova_posicao(cur, lista_id, musica_id, antes_de)
+
+        cur.execute(
+            "UPDATE ListaMusica SET posicao = ? WHERE lista_id = ? AND musica_id = ?",
+            (posicao, lista_id, musica_id)
+        )
+        return True
+    return executar_escrita(_mover)
 
 def remover_musica_lista(lista_id, musica_id):
-    with get_connection() as conn:
+    def _remover(conn):
         cur = conn.cursor()
         cur.execute(
             "DELETE FROM ListaMusica WHERE lista_id=? AND musica_id=?", 
             (lista_id, musica_id)
         )
-        conn.commit()
+    executar_escrita(_remover)
 
 def deletar_lista(lista_id, usuario_id):
     """Deleta a lista se pertencer ao usuário."""
-    with get_connection() as conn:
+    def _deletar(conn):
         cur = conn.cursor()
         cur.execute("DELETE FROM Lista WHERE id=? AND usuario_id=?", (lista_id, usuario_id))
-        return cur.rowcount > 0
+        if cur.rowcount == 0:
+            return False
+        remover_atividade(conn, "list_create", lista_id)
+        return True
+    return executar_escrita(_deletar)
     
-def obter_musicas_da_lista(lista_id):
-    """Retorna as músicas contidas em uma lista específica."""
-    with get_connection() as conn:
+# Colunas que `fields=` pode pedir (campo público -> expressão SQL)
+CAMPOS_LISTA_MUSICA = {
+    "id": "m.id",
+    "nome": "m.nome",
+    "artista": "m.artista",
+    "album": "m.album",
+    "url_imagem": "m.url_imagem",
+    "data_lancamento": "m.data_lancamento",
+    "adicionado_em": "lm.adicionado_em",
+}
+
+def obter_musicas_da_lista(lista_id, limite=None, apos=None, colunas: dict | None = None):
+    """
+    Retorna as músicas contidas em uma lista específica, na ordem da lista.
+    Paginação por cursor: `apos` é a (posicao, musica_id) da última faixa da
+    página anterior; a busca é um range scan em idx_listamusica_posicao.
+    Cada linha traz as `colunas` pedidas (padrão: todas) e termina com a
+    posicao, para montar o próximo cursor.
+    """
+    selecao = ", ".join((colunas or CAMPOS_LISTA_MUSICA).values())
+    with get_read_connection() as conn:
         cur = conn.cursor()
-        query = """
-            SELECT m.id, m.nome, m.artista, m.album, m.url_imagem, m.data_lancamento, lm.adicionado_em
-            FROM Musica m
-            JOIN ListaMusica lm ON m.id = lm.musica_id
+        query = f"""
+            SELECT {selecao}, lm.posicao
+            FROM ListaMusica lm
+            JOIN Musica m ON m.id = lm.musica_id
             WHERE lm.lista_id = ?
-            ORDER BY lm.adicionado_em DESC
         """
-        cur.execute(query, (lista_id,))
+        params = [lista_id]
+        if apos is not None:
+            query += " AND (lm.posicao > ? OR (lm.posicao = ? AND lm.musica_id > ?))"
+            params += [apos[0], apos[0], apos[1]]
+        query += " ORDER BY lm.posicao, lm.musica_id"
+        if limite is not None:
+            query += " LIMIT ?"
+            params.append(limite)
+        cur.execute(query, params)
         return cur.fetchall()
\ No newline at end of file
@@ -1,5 +1,11 @@
+import hashlib
 import sqlite3 as lite
-from bd import get_connection
+from urllib.parse import urlparse
+from bd import get_connection, get_read_connection, executar_escrita
+from cache import cache, publicar_invalidacao
+import autocomplete
+from tarefas import enfileirar
+from config import CAPAS_HOSTS_PERMITIDOS
 
 # ------------------ TABELA ------------------
 
@@ -16,32 +22,68 @@ def criarTabelaMusica():
                 url_imagem TEXT
             )
         """)
+        # Joins por nome (Review.musica, Curtida.musica_nome) e ranking do autocomplete
+        cur.execute("CREATE INDEX IF NOT EXISTS idx_musica_nome ON Musica(nome)")
 
 # ------------------ CRUD BÁSICO ------------------
 
+def _prefetch_capa(conexao, url):
+    """
+    Agenda o download da capa para o cache (uma vez por URL, deduplicado
+    pela chave). Só para hosts que /capas aceita: os outros virariam
+    tarefa morta na primeira tentativa.
+    """
+    if not url or not url.startswith(("http://", "https://")):
+        return
+    try:
+        host = urlparse(url).hostname
+    except ValueError:
+        return
+    if not host or (CAPAS_HOSTS_PERMITIDOS and host not in CAPAS_HOSTS_PERMITIDOS):
+        return
+    chave = "capa:" + hashlib.sha1(url.encode()).hexdigest()
+    enfileirar(conexao, "capa.prefetch", {"url": url}, chave=chave)
+
 def inserirDados(dados):
-    with get_connection() as conexao:
+    """Insere a música pelo escritor único e retorna o id criado."""
+    def _inserir(conexao):
         cur = conexao.cursor()
         query = "INSERT INTO Musica(nome, artista, album, data_lancamento, url_imagem) VALUES(?,?,?,?,?)"
         cur.execute(query, dados)
-        conexao.commit()
+        novo_id = cur.lastrowid
+        autocomplete.indexar_musica(conexao, novo_id, dados[0], dados[1], dados[2])
+        _prefetch_capa(conexao, dados[4])
+        return novo_id
+    novo_id = executar_escrita(_inserir)
+    autocomplete.indice_prefixo.registrar(novo_id, dados[0], dados[1], dados[2])
+    return novo_id
 
 def atualizarDados(dados):
-    with get_connection() as conexao:
+    def _atualizar(conexao):
         cur = conexao.cursor()
         query = "UPDATE Musica SET nome=?, artista=?, album=?, data_lancamento=?, url_imagem=? WHERE id=?"
         cur.execute(query, dados)
-        conexao.commit()
+        autocomplete.indexar_musica(conexao, dados[-1], dados[0], dados[1], dados[2])
+        publicar_invalidacao(conexao, f"musica:{dados[-1]}")
+        _prefetch_capa(conexao, dados[4])
+    executar_escrita(_atualizar)
+    cache.invalidar_local([f"musica:{dados[-1]}"])
+    autocomplete.indice_prefixo.registrar(dados[-1], dados[0], dados[1], dados[2])
 
 def deletarDados(id):
-    with get_connection() as conexao:
+    def _deletar(conexao):
         cur = conexao.cursor()
         query = "DELETE FROM Musica WHERE id=?"
         cur.execute(query, id)
+        autocomplete.remover_musica(conexao, id[0])
+        publicar_invalidacao(conexao, f"musica:{id[0]}")
+    executar_escrita(_deletar)
+    cache.invalidar_local([f"musica:{id[0]}"])
+    autocomplete.indice_prefixo.remover(id[0])
 
 def visualizarDados():
     ver_dados = []
-    with get_connection() as conexao:
+    with get_read_connection() as conexao:
         cur = conexao.cursor()
         query = "SELECT * FROM Musica"
         cur.execute(query)
@@ -51,22 +93,25 @@ def visualizarDados():
     return ver_dados
 
 def verLinha(id):
-    ver_linha = []
-    with get_connection() as conexao:
-        cur = conexao.cursor()
-        query = "SELECT * FROM Musica WHERE id=?"
-        cur.execute(query, id)
-        linhas = cur.fetchall()
-        for linha in linhas:
-            ver_linha.append(linha)
-    return ver_linha
+    def _carregar():
+        ver_linha = []
+        with get_read_connection() as conexao:
+            cur = conexao.cursor()
+            query = "SELECT * FROM Musica WHERE id=?"
+            cur.execute(query, id)
+            linhas = cur.fetchall()
+            for linha in linhas:
+                ver_linha.append(linha)
+        return ver_linha
+    # Lida em quase toda rota de música (reviews, like, rating)
+    return cache.obter(f"musica:{id[0]}", _carregar)
 
 def obterMusicaPorDados(nome, artista, album):
     """
     Verifica se já existe uma música com o mesmo Nome, Artista e Álbum.
     Retorna a linha (tupla) se existir, ou None.
     """
-    with get_connection() as conexao:
+    with get_read_connection() as conexao:
         cur = conexao.cursor()
         query = """
             SELECT * FROM Musica 
@@ -98,19 +143,31 @@ def _where_and_params(q: str | None):
 
 def contar_busca(q: str | None) -> int:
     where, params = _where_and_params(q)
-    with get_connection() as conexao:
+    with get_read_connection() as conexao:
         cur = conexao.cursor()
         cur.execute(f"SELECT COUNT(*) FROM Musica {where}", params)
         (total,) = cur.fetchone()
     return int(total or 0)
 
-def listar_busca(q: str | None, order: str, limit: int, offset: int):
+# Colunas que `fields=` pode pedir (campo público -> expressão SQL)
+CAMPOS_MUSICA = {
+    "id": "id",
+    "nome": "nome",
+    "artista": "artista",
+    "album": "album",
+    "data_lancamento": "data_lancamento",
+    "url_imagem": "url_imagem",
+}
+
+def listar_busca(q: str | None, order: str, limit: int, offset: int, colunas: dict | None = None):
+    """`colunas` (de projecao.escolher_campos) restringe o SELECT; padrão: todas."""
     order_sql = _ALLOWED_ORDER.get(order, _ALLOWED_ORDER["id_desc"])
     where, params = _where_and_params(q)
-    with get_connection() as conexao:
+    selecao = ", ".join(colunas.values()) if colunas else "*"
+    with get_read_connection() as conexao:
         cur = conexao.cursor()
         cur.execute(
-            f"SELECT * FROM Musica {where} "
+            f"SELECT {selecao} FROM Musica {where} "
             f"ORDER BY {order_sql} LIMIT ? OFFSET ?",
             (*params, limit, offset),
         )
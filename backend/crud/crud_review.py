@@ -1,5 +1,6 @@
 import sqlite3 as lite
-from bd import get_connection
+from bd import get_connection, get_read_connection, executar_escrita
+from crud.crud_feed import registrar_atividade, remover_atividade
 
 def criarTabelaReview():
     with get_connection() as conexao:
@@ -14,26 +15,51 @@ def criarTabelaReview():
                 FOREIGN KEY(usuario_id) REFERENCES Usuario(id)
             )
         """)
+        # Agregados por música (AVG/COUNT) e reviews por música buscam por nome
+        cur.execute("CREATE INDEX IF NOT EXISTS idx_review_musica ON Review(musica)")
+        # Reviews de um usuário (perfil, feed, exportação por id)
+        cur.execute("CREATE INDEX IF NOT EXISTS idx_review_usuario ON Review(usuario_id, id)")
 
 def inserirReview(musica_nome, nota, comentario, usuario_id):
     """Insere um review vinculando ao ID do usuário logado."""
-    with get_connection() as conexao:
+    def _inserir(conexao):
         cur = conexao.cursor()
         query = "INSERT INTO Review(musica, nota, comentario, usuario_id) VALUES(?,?,?,?)"
         cur.execute(query, (musica_nome, nota, comentario, usuario_id))
+        review_id = cur.lastrowid
+        # Fan-out para a timeline de quem segue o autor, na mesma transação
+        cur.execute("SELECT id, artista FROM Musica WHERE nome = ? LIMIT 1", (musica_nome,))
+        musica = cur.fetchone() or (None, "")
+        registrar_atividade(
+            conexao, usuario_id, "review", review_id, musica[0],
+            f"Avaliou a música {musica_nome} ({musica[1]})", nota, comentario
+        )
         # Retorna o ID da linha que acabou de ser criada
-        return cur.lastrowid
+        return review_id
+    return executar_escrita(_inserir)
     
-def listarReviewsPorMusica(musica_nome):
+# Colunas que `fields=` pode pedir (campo público -> expressão SQL)
+CAMPOS_REVIEW = {
+    "id": "r.id",
+    "musica": "r.musica",
+    "nota": "r.nota",
+    "comentario": "r.comentario",
+    "autor": "u.username",
+    "autor_id": "u.id",
+}
+
+def listarReviewsPorMusica(musica_nome, colunas: dict | None = None):
     """
     Retorna lista de reviews fazendo JOIN com a tabela de usuários 
     para obter o nome do autor.
     Retorno: [(id, musica, nota, comentario, nome_autor), ...]
+    ou só as `colunas` pedidas, nessa ordem.
     """
-    with get_connection() as conexao:
+    selecao = ", ".join((colunas or CAMPOS_REVIEW).values())
+    with get_read_connection() as conexao:
         cur = conexao.cursor()
-        sql = """
-            SELECT r.id, r.musica, r.nota, r.comentario, u.username, u.id
+        sql = f"""
+            SELECT {selecao}
             FROM Review r
             LEFT JOIN Usuario u ON r.usuario_id = u.id
             WHERE r.musica = ?
@@ -42,8 +68,29 @@ def listarReviewsPorMusica(musica_nome):
         cur.execute(sql, (musica_nome,))
         return cur.fetchall()
 
+def obterMediasEmLote(musica_ids):
+    """
+    Média e quantidade de reviews de várias músicas numa única consulta
+    agrupada (usa idx_review_musica).
+    Retorno: {musica_id: (media, qtde)} apenas para músicas existentes.
+    """
+    if not musica_ids:
+        return {}
+    marcadores = ",".join("?" * len(musica_ids))
+    with get_read_connection() as conexao:
+        cur = conexao.cursor()
+        sql = f"""
+            SELECT m.id, AVG(r.nota), COUNT(r.id)
+            FROM Musica m
+            LEFT JOIN Review r ON r.musica = m.nome
+            WHERE m.id IN ({marcadores})
+            GROUP BY m.id
+        """
+        cur.execute(sql, tuple(musica_ids))
+        return {row[0]: (row[1], row[2]) for row in cur.fetchall()}
+
 def obterReviewPorId(review_id):
-    with get_connection() as conexao:
+    with get_read_connection() as conexao:
         cur = conexao.cursor()
         sql = """
             SELECT r.id, r.musica, r.nota, r.comentario, u.username, u.id
@@ -55,13 +102,16 @@ def obterReviewPorId(review_id):
         return cur.fetchone()
     
 def atualizarDados(novos_dados):
-    with get_connection() as conexao:
+    def _atualizar(conexao):
         cur = conexao.cursor()
         query = "UPDATE Review SET musica=?, nota=?, comentario=? WHERE id=?"
         cur.execute(query, novos_dados)
+    executar_escrita(_atualizar)
 
 def deletarDados(id):
-    with get_connection() as conexao:
+    def _deletar(conexao):
         cur = conexao.cursor()
         query = "DELETE FROM Review WHERE id=?"
         cur.execute(query, id)
+        remover_atividade(conexao, "review", id[0])
+    executar_escrita(_deletar)
@@ -1,9 +1,16 @@
 import sqlite3 as lite
 from datetime import datetime
-from bd import get_connection
-from passlib.context import CryptContext
+from bd import get_connection, get_read_connection, executar_escrita, adicionar_coluna, leitura
+from cache import cache, publicar_invalidacao
+from autocomplete import normalizar
+from crud.crud_feed import ao_seguir, ao_deixar_de_seguir
+from functools import lru_cache
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+@lru_cache(maxsize=1)
+def _pwd_context():
+    # passlib/bcrypt só são carregados no primeiro cadastro/login
+    from passlib.context import CryptContext
+    return CryptContext(schemes=["bcrypt"], deprecated="auto")
 
 # -------------------------- Funções de Segurança --------------------------
 
@@ -18,7 +25,7 @@ def hash_password(password: str) -> str:
     # Isso evita o ValueError: password cannot be longer than 72 bytes
     truncated_password_bytes = password.encode('utf-8')[:72]
     
-    return pwd_context.hash(truncated_password_bytes)
+    return _pwd_context().hash(truncated_password_bytes)
 
 def verify_password(plain_password: str, hashed_password: str) -> bool:
     """
@@ -27,7 +34,7 @@ def verify_password(plain_password: str, hashed_password: str) -> bool:
     # Precisamos aplicar o mesmo truncamento na verificação.
     truncated_password_bytes = plain_password.encode('utf-8')[:72]
     
-    return pwd_context.verify(truncated_password_bytes, hashed_password)
+    return _pwd_context().verify(truncated_password_bytes, hashed_password)
 
 # -------------------------- Funções CRUD --------------------------
 # Criando tabela
@@ -66,20 +73,71 @@ def criarTabelaUsuario():
             )
         """)    
 
+    with get_connection() as conexao:
+        cur = conexao.cursor()
+        # Busca de usuários: prefixo de username sem diferenciar maiúsculas...
+        cur.execute("CREATE INDEX IF NOT EXISTS idx_usuario_username_nocase ON Usuario(username COLLATE NOCASE)")
+        # ...e prefixo de qualquer palavra do nome (tokens normalizados)
+        cur.execute("SELECT name FROM sqlite_master WHERE type='table' AND name='UsuarioToken'")
+        tokens_existiam = cur.fetchone() is not None
+        cur.execute("""
+            CREATE TABLE IF NOT EXISTS UsuarioToken(
+                token TEXT NOT NULL,
+                usuario_id INTEGER NOT NULL,
+                PRIMARY KEY(token, usuario_id)
+            ) WITHOUT ROWID
+        """)
+        cur.execute("CREATE INDEX IF NOT EXISTS idx_usuariotoken_usuario ON UsuarioToken(usuario_id)")
+        if not tokens_existiam:
+            cur.execute("SELECT id, nome FROM Usuario")
+            for usuario_id, nome in cur.fetchall():
+                _indexar_nome(conexao, usuario_id, nome)
+
+        # Seguidores mantidos por trigger: ranking da busca e perfis sem COUNT
+        criou_contagem = adicionar_coluna(cur, "Usuario", "qtd_seguidores", "INTEGER NOT NULL DEFAULT 0")
+        cur.execute("CREATE INDEX IF NOT EXISTS idx_seguidores_seguido ON Seguidores(seguido_id)")
+        cur.execute("""
+            CREATE TRIGGER IF NOT EXISTS trg_seguidores_insert AFTER INSERT ON Seguidores
+            BEGIN
+                UPDATE Usuario SET qtd_seguidores = qtd_seguidores + 1 WHERE id = NEW.seguido_id;
+            END
+        """)
+        cur.execute("""
+            CREATE TRIGGER IF NOT EXISTS trg_seguidores_delete AFTER DELETE ON Seguidores
+            BEGIN
+                UPDATE Usuario SET qtd_seguidores = qtd_seguidores - 1 WHERE id = OLD.seguido_id;
+            END
+        """)
+        if criou_contagem:
+            cur.execute("""
+                UPDATE Usuario
+                SET qtd_seguidores = (SELECT COUNT(*) FROM Seguidores s WHERE s.seguido_id = Usuario.id)
+            """)
+
+def _indexar_nome(conexao, usuario_id, nome):
+    """Regrava os tokens do nome do usuário (transação corrente)."""
+    conexao.execute("DELETE FROM UsuarioToken WHERE usuario_id = ?", (usuario_id,))
+    conexao.executemany(
+        "INSERT OR IGNORE INTO UsuarioToken(token, usuario_id) VALUES(?, ?)",
+        [(token, usuario_id) for token in set(normalizar(nome).split())]
+    )
+
 # Inserindo dados 
 def inserirDados(nome, username, email, senha_hash):
     """Insere um novo usuário no banco."""
     try:
         data_hoje = datetime.now().strftime("%Y-%m-%d")
         
-        with get_connection() as conexao:
+        def _inserir(conexao):
             cur = conexao.cursor()
             query = """
             INSERT INTO Usuario(nome, username, email, senha_hash, biografia, url_foto, url_capa, localizacao, data_cadastro) 
             VALUES(?,?,?,?, '', '', '', '', ?)
             """
             cur.execute(query, (nome, username, email, senha_hash, data_hoje))
-            conexao.commit()
+            _indexar_nome(conexao, cur.lastrowid, nome)
+            return cur.lastrowid
+        return executar_escrita(_inserir)
     except lite.IntegrityError:
         print(f"Erro: O email/username {email}/{username} já está cadastrado.")
         raise
@@ -89,7 +147,7 @@ def inserirDados(nome, username, email, senha_hash):
 
 def obter_perfil_por_id(id):
     """Retorna dados do perfil + data_cadastro + localizacao."""
-    with get_connection() as conexao:
+    with get_read_connection() as conexao:
         cur = conexao.cursor()
         query = """
             SELECT id, nome, username, email, biografia, url_foto, url_capa, localizacao, data_cadastro 
@@ -99,15 +157,18 @@ def obter_perfil_por_id(id):
         return cur.fetchone()
     
 def obter_usuario_por_email(email):
-    with get_connection() as conexao:
-        cur = conexao.cursor()
-        query = "SELECT id, nome, username, email, senha_hash FROM Usuario WHERE email=?"
-        cur.execute(query, (email,))
-        return cur.fetchone()
+    def _carregar():
+        with get_read_connection() as conexao:
+            cur = conexao.cursor()
+            query = "SELECT id, nome, username, email, senha_hash FROM Usuario WHERE email=?"
+            cur.execute(query, (email,))
+            return cur.fetchone()
+    # Chamada em toda requisição autenticada (get_current_user)
+    return cache.obter(f"usuario:{email}", _carregar)
     
 def atualizar_perfil(id, nome, biografia, url_foto, url_capa, localizacao):
     """Atualiza dados editáveis do perfil."""
-    with get_connection() as conexao:
+    def _atualizar(conexao):
         cur = conexao.cursor()
         query = """
             UPDATE Usuario 
@@ -115,13 +176,21 @@ def atualizar_perfil(id, nome, biografia, url_foto, url_capa, localizacao):
             WHERE id=?
         """
         cur.execute(query, (nome, biografia, url_foto, url_capa, localizacao, id))
-        conexao.commit()
+        _indexar_nome(conexao, id, nome)
+        cur.execute("SELECT email FROM Usuario WHERE id=?", (id,))
+        linha = cur.fetchone()
+        if linha:
+            publicar_invalidacao(conexao, f"usuario:{linha[0]}")
+            return linha[0]
+    email = executar_escrita(_atualizar)
+    if email:
+        cache.invalidar_local([f"usuario:{email}"])
         
 # --- Estatísticas ---
 
-def obter_estatisticas_usuario(user_id):
+def obter_estatisticas_usuario(user_id, conexao=None):
     """Calcula: Total Reviews, Média Nota, Seguidores, Curtidas."""
-    with get_connection() as con:
+    with leitura(conexao) as con:
         cur = con.cursor()
         
         # 1. Total Reviews
@@ -157,7 +226,7 @@ def obter_estatisticas_usuario(user_id):
 
 def verificar_curtida(usuario_id, musica_nome):
     """Retorna True se o usuário já curtiu a música."""
-    with get_connection() as con:
+    with get_read_connection() as con:
         cur = con.cursor()
         cur.execute(
             "SELECT 1 FROM Curtida WHERE usuario_id=? AND musica_nome=?", 
@@ -165,75 +234,138 @@ def verificar_curtida(usuario_id, musica_nome):
         )
         return cur.fetchone() is not None
 
+def verificar_curtidas_em_lote(usuario_id, musica_ids):
+    """
+    Versão em lote de `verificar_curtida` para grades de músicas.
+    Uma única consulta (PK de Musica + PK de Curtida); retorna o conjunto
+    de ids curtidos pelo usuário dentre `musica_ids`.
+    """
+    if not musica_ids:
+        return set()
+    marcadores = ",".join("?" * len(musica_ids))
+    with get_read_connection() as con:
+        cur = con.cursor()
+        cur.execute(
+            f"""
+            SELECT m.id FROM Musica m
+            WHERE m.id IN ({marcadores})
+              AND EXISTS (SELECT 1 FROM Curtida c WHERE c.usuario_id = ? AND c.musica_nome = m.nome)
+            """,
+            (*musica_ids, usuario_id)
+        )
+        return {row[0] for row in cur.fetchall()}
+
 def alternar_curtida(usuario_id, musica_nome):
     """
     Se já curtiu, remove (dislike).
     Se não curtiu, adiciona (like).
     Retorna True se ficou curtido, False se foi removido.
+
+    O toggle é um DELETE condicional seguido, só se nada foi apagado, do
+    INSERT, tudo na conexão do escritor; vai com `agrupar=True` para
+    dividir o commit com outros toggles que chegarem junto.
     """
-    liked = verificar_curtida(usuario_id, musica_nome)
-    
-    with get_connection() as con:
+    def _alternar(con):
         cur = con.cursor()
-        if liked:
-            cur.execute(
-                "DELETE FROM Curtida WHERE usuario_id=? AND musica_nome=?", 
-                (usuario_id, musica_nome)
-            )
-            con.commit()
+        cur.execute(
+            "DELETE FROM Curtida WHERE usuario_id=? AND musica_nome=?", 
+            (usuario_id, musica_nome)
+        )
+        if cur.rowcount > 0:
             return False 
-        else:
-            cur.execute(
-                "INSERT INTO Curtida(usuario_id, musica_nome) VALUES(?,?)", 
-                (usuario_id, musica_nome)
-            )
-            con.commit()
-            return True 
+        cur.execute(
+            "INSERT INTO Curtida(usuario_id, musica_nome) VALUES(?,?)", 
+            (usuario_id, musica_nome)
+        )
+        return True 
+    return executar_escrita(_alternar, agrupar=True)
     
-def listar_musicas_curtidas(usuario_id):
+# Colunas que `fields=` pode pedir (campo público -> expressão SQL)
+CAMPOS_CURTIDA = {
+    "id": "m.id",
+    "nome": "m.nome",
+    "artista": "m.artista",
+    "album": "m.album",
+    "data_lancamento": "m.data_lancamento",
+    "url_imagem": "m.url_imagem",
+    "user_rating": "r.nota",
+}
+
+def listar_musicas_curtidas(usuario_id, colunas: dict | None = None, limite=None, conexao=None):
     """
     Retorna a lista de músicas curtidas, buscando a nota (review) 
-    pelo NOME da música.
+    pelo NOME da música. `colunas` restringe o SELECT (padrão: todas).
+    `limite` corta nas mais recentes (prévia do perfil).
     """
-    with get_connection() as con:
+    selecao = ", ".join((colunas or CAMPOS_CURTIDA).values())
+    with leitura(conexao) as con:
         cur = con.cursor()
         
-        query = """
-            SELECT 
-                m.id, 
-                m.nome, 
-                m.artista, 
-                m.album, 
-                m.data_lancamento, 
-                m.url_imagem,
-                r.nota  
+        query = f"""
+            SELECT {selecao}
             FROM Musica m
             JOIN Curtida c ON m.nome = c.musica_nome
             LEFT JOIN Review r ON m.nome = r.musica AND r.usuario_id = c.usuario_id
             WHERE c.usuario_id = ?
             ORDER BY m.id DESC
         """
+        if limite is not None:
+            query += f" LIMIT {int(limite)}"
         cur.execute(query, (usuario_id,))
         return cur.fetchall()
     
 # --- FUNÇÕES DE BUSCA E SOCIAL ---
 
-def pesquisar_usuarios(termo):
-    """Busca usuários por nome ou username"""
-    with get_connection() as con:
+# Maior caractere válido: "abc" <= x < "abc" + _FIM_PREFIXO cobre todo prefixo "abc"
+_FIM_PREFIXO = "\U0010ffff"
+
+def pesquisar_usuarios(termo, limite=20, apos=None):
+    """
+    Busca usuários por prefixo de username (índice NOCASE) ou de uma
+    palavra do nome (UsuarioToken). Ordem: username exato, prefixo de
+    username, prefixo do nome; depois mais seguidores primeiro.
+    `apos` = (classe, qtd_seguidores, id) da última linha da página anterior.
+    Retorno: [(id, nome, username, url_foto, biografia, classe, qtd_seguidores)]
+    """
+    termo = (termo or "").strip()
+    if not termo:
+        return []
+    # Palavras do nome são comparadas normalizadas; sem palavra válida o intervalo fica vazio
+    palavras = normalizar(termo).split()
+    token_de, token_ate = (palavras[0], palavras[0] + _FIM_PREFIXO) if palavras else ("", "")
+
+    query = """
+        WITH candidatos(id, classe) AS (
+            SELECT id, CASE WHEN username = ? COLLATE NOCASE THEN 0 ELSE 1 END
+            FROM Usuario
+            WHERE username >= ? COLLATE NOCASE AND username < ? COLLATE NOCASE
+            UNION ALL
+            SELECT usuario_id, 2 FROM UsuarioToken WHERE token >= ? AND token < ?
+        )
+        SELECT * FROM (
+            SELECT u.id, u.nome, u.username, u.url_foto, u.biografia, MIN(c.classe) AS classe, u.qtd_seguidores
+            FROM candidatos c JOIN Usuario u ON u.id = c.id
+            GROUP BY u.id
+        )
+    """
+    params = [termo, termo, termo + _FIM_PREFIXO, token_de, token_ate]
+    if apos is not None:
+        query += """
+        WHERE classe > ?
+           OR (classe = ? AND (qtd_seguidores < ? OR (qtd_seguidores = ? AND id > ?)))
+        """
+        params += [apos[0], apos[0], apos[1], apos[1], apos[2]]
+    query += " ORDER BY classe, qtd_seguidores DESC, id LIMIT ?"
+    params.append(limite)
+
+    with get_read_connection() as con:
         cur = con.cursor()
-        termo_like = f"%{termo}%"
-        cur.execute("""
-            SELECT id, nome, username, url_foto, biografia 
-            FROM Usuario 
-            WHERE nome LIKE ? OR username LIKE ?
-            LIMIT 20
-        """, (termo_like, termo_like))
+        cur.execute(query, params)
         return cur.fetchall()
 
-def verificar_seguindo(seguidor_id, seguido_id):
+def verificar_seguindo(seguidor_id, seguido_id, conexao=None):
     """Retorna True se seguidor_id já segue seguido_id."""
-    with get_connection() as con:
+    with leitura(conexao) as con:
         cur = con.cursor()
         cur.execute(
             "SELECT 1 FROM Seguidores WHERE seguidor_id=? AND seguido_id=?", 
@@ -241,43 +373,58 @@ def verificar_seguindo(seguidor_id, seguido_id):
         )
         return cur.fetchone() is not None
 
+def verificar_seguindo_em_lote(seguidor_id, seguido_ids):
+    """Conjunto dos ids, dentre `seguido_ids`, que `seguidor_id` segue (uma consulta na PK)."""
+    if not seguido_ids:
+        return set()
+    marcadores = ",".join("?" * len(seguido_ids))
+    with get_read_connection() as con:
+        cur = con.cursor()
+        cur.execute(
+            f"SELECT seguido_id FROM Seguidores WHERE seguidor_id = ? AND seguido_id IN ({marcadores})",
+            (seguidor_id, *seguido_ids)
+        )
+        return {row[0] for row in cur.fetchall()}
+
 def alternar_seguir(seguidor_id, seguido_id):
     """
     Se já segue, remove (unfollow).
     Se não segue, adiciona (follow).
-    Retorna True se agora está seguindo, False se deixou de seguir.
+    Retorna True se agora está seguindo, False se deixou de seguir
+    e None se o usuário seguido não existe.
     """
     if seguidor_id == seguido_id:
         raise ValueError("Você não pode seguir a si mesmo.")
 
-    segue = verificar_seguindo(seguidor_id, seguido_id)
-    
-    with get_connection() as con:
+    def _alternar(con):
         cur = con.cursor()
-        if segue:
-            # Unfollow
-            cur.execute(
-                "DELETE FROM Seguidores WHERE seguidor_id=? AND seguido_id=?", 
-                (seguidor_id, seguido_id)
-            )
-            estado_atual = False
-        else:
-            # Follow
+        # Unfollow; se não havia nada para apagar, vira follow
+        cur.execute(
+            "DELETE FROM Seguidores WHERE seguidor_id=? AND seguido_id=?", 
+            (seguidor_id, seguido_id)
+        )
+        if cur.rowcount > 0:
+            ao_deixar_de_seguir(con, seguidor_id, seguido_id)
+            return False
+        try:
             cur.execute(
                 "INSERT INTO Seguidores(seguidor_id, seguido_id) VALUES(?,?)", 
                 (seguidor_id, seguido_id)
             )
-            estado_atual = True
-        con.commit()
+        except lite.IntegrityError:
+            # Chave estrangeira (o escritor liga foreign_keys): seguido inexistente
+            return None
+        ao_seguir(con, seguidor_id, seguido_id)
+        return True
     
-    return estado_atual
+    return executar_escrita(_alternar, agrupar=True)
 
-def obter_perfil_publico(user_id):
+def obter_perfil_publico(user_id, conexao=None):
     """
     Retorna dados básicos de um usuário pelo ID.
     Usado quando visitamos o perfil de outra pessoa.
     """
-    with get_connection() as con:
+    with leitura(conexao) as con:
         cur = con.cursor()
         cur.execute("SELECT id, nome, username, email, biografia, url_foto, url_capa, localizacao, data_cadastro FROM Usuario WHERE id=?", (user_id,))
         row = cur.fetchone()
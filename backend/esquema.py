@@ -0,0 +1,59 @@
+import fcntl
+
+from bd import DB_PATH, get_connection
+from crud.crud_musica import criarTabelaMusica
+from crud.crud_review import criarTabelaReview
+from crud.crud_usuario import criarTabelaUsuario
+from crud.crud_lista import criarTabelaLista
+from crud.crud_feed import criarTabelaFeed
+from crud.crud_album import criarTabelaAlbum
+from crud.crud_artista import criarTabelaArtista
+from cache import criarTabelaInvalidacao
+from autocomplete import criarTabelaTrigrama
+from tarefas import criarTabelaTarefa
+
+# Incrementar sempre que uma tabela, coluna, índice ou trigger mudar
+VERSAO_ESQUEMA = 13
+
+def versao_atual() -> int:
+    with get_connection() as con:
+        return con.execute("PRAGMA user_version").fetchone()[0]
+
+def garantir_esquema() -> bool:
+    """
+    Bootstrap do banco. No caminho comum é só a leitura do `user_version`
+    do cabeçalho do arquivo; os CREATE/ALTER rodam apenas quando a versão
+    gravada é diferente de VERSAO_ESQUEMA. Um lock de arquivo impede que
+    vários workers subindo juntos migrem ao mesmo tempo.
+    Retorna True se o esquema foi (re)criado.
+    """
+    if versao_atual() == VERSAO_ESQUEMA:
+        return False
+
+    with open(f"{DB_PATH}.lock", "w") as trava:
+        fcntl.flock(trava, fcntl.LOCK_EX)
+        try:
+            # Outro worker pode ter migrado enquanto esperávamos o lock
+            if versao_atual() == VERSAO_ESQUEMA:
+                return False
+            with get_connection() as con:
+                # Banco novo: auto_vacuum incremental só pode ser escolhido antes da primeira tabela
+                if con.execute("SELECT COUNT(*) FROM sqlite_master").fetchone()[0] == 0:
+                    con.execute("PRAGMA auto_vacuum=INCREMENTAL")
+                    con.execute("VACUUM")
+            criarTabelaMusica()
+            criarTabelaReview()
+            criarTabelaUsuario()
+            criarTabelaLista()
+            criarTabelaFeed()
+            criarTabelaAlbum()
+            criarTabelaInvalidacao()
+            criarTabelaTrigrama()
+            criarTabelaTarefa()
+            # Depois de Tarefa: a migração descarta as tarefas artista.top antigas
+            criarTabelaArtista()
+            with get_connection() as con:
+                con.execute(f"PRAGMA user_version = {VERSAO_ESQUEMA}")
+            return True
+        finally:
+            fcntl.flock(trava, fcntl.LOCK_UN)
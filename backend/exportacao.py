@@ -0,0 +1,172 @@
+"""
+Exportações em streaming (NDJSON ou CSV, opcionalmente gzip).
+
+Nada é carregado inteiro: cada seção é lida em lotes por keyset
+(`WHERE chave > ? ORDER BY chave LIMIT ?`) e cada lote é formatado e
+enviado antes do próximo ser lido, então a memória fica constante
+qualquer que seja o tamanho da tabela. Cada lote é uma consulta curta,
+sem transação de leitura aberta durante a exportação inteira (que
+impediria o checkpoint do WAL).
+
+Toda linha exportada traz um `cursor`: repassado em `apos`, a exportação
+continua logo depois dessa linha.
+"""
+import csv
+import io
+import json
+import zlib
+
+from bd import get_read_connection
+from paginacao import codificar_cursor, decodificar_cursor
+
+LOTE = 1000
+
+# Seções da exportação de dados de um usuário, na ordem em que saem:
+# (tipo, consulta por keyset, colunas da chave, colunas exportadas)
+_SECOES_USUARIO = (
+    (
+        "review",
+        """
+        SELECT id, musica, nota, comentario FROM Review
+        WHERE usuario_id = ? AND id > ? ORDER BY id LIMIT ?
+        """,
+        1,
+        ("id", "musica", "nota", "comentario"),
+    ),
+    (
+        "curtida",
+        """
+        SELECT musica_nome FROM Curtida
+        WHERE usuario_id = ? AND musica_nome > ? ORDER BY musica_nome LIMIT ?
+        """,
+        1,
+        ("musica",),
+    ),
+    (
+        "lista",
+        """
+        SELECT id, nome, descricao, publica, data_criacao FROM Lista
+        WHERE usuario_id = ? AND id > ? ORDER BY id LIMIT ?
+        """,
+        1,
+        ("id", "nome", "descricao", "publica", "data_criacao"),
+    ),
+    (
+        "lista_musica",
+        """
+        SELECT lm.lista_id, lm.musica_id, m.nome, m.artista, m.album, lm.adicionado_em
+        FROM ListaMusica lm
+        JOIN Lista l ON l.id = lm.lista_id
+        LEFT JOIN Musica m ON m.id = lm.musica_id
+        WHERE l.usuario_id = ? AND (lm.lista_id, lm.musica_id) > (?, ?)
+        ORDER BY lm.lista_id, lm.musica_id LIMIT ?
+        """,
+        2,
+        ("lista_id", "musica_id", "nome", "artista", "album", "adicionado_em"),
+    ),
+)
+
+COLUNAS_CATALOGO = ("id", "nome", "artista", "album", "data_lancamento", "url_imagem")
+COLUNAS_USUARIO = ("tipo", "id", "musica", "nota", "comentario", "nome", "descricao", "publica",
+                   "data_criacao", "lista_id", "musica_id", "artista", "album", "adicionado_em")
+
+# Valor "antes de tudo" para cada tipo de chave
+_INICIO = {"review": (0,), "curtida": ("",), "lista": (0,), "lista_musica": (0, 0)}
+
+def validar_cursor(apos: str | None, usuario: bool):
+    """Lança ValueError se `apos` não for um cursor desta exportação."""
+    if apos is None:
+        return None
+    if not usuario:
+        (ultimo_id,) = decodificar_cursor(apos, 1)
+        if not isinstance(ultimo_id, int):
+            raise ValueError("Cursor inválido")
+        return ultimo_id
+    tipo, *chave = decodificar_cursor(apos, 3)
+    if tipo not in _INICIO:
+        raise ValueError("Cursor inválido")
+    # Validado aqui: dentro do StreamingResponse um erro já não vira 400
+    chave = tuple(chave[:len(_INICIO[tipo])])
+    if not all(type(v) is type(inicio) for v, inicio in zip(chave, _INICIO[tipo])):
+        raise ValueError("Cursor inválido")
+    return tipo, chave
+
+def lotes_catalogo(apos_id: int | None = None, lote: int = LOTE):
+    """Lotes de registros do catálogo (dicts), em ordem de id."""
+    ultimo = apos_id or 0
+    with get_read_connection() as conexao:
+        while True:
+            linhas = conexao.execute(
+                "SELECT id, nome, artista, album, data_lancamento, url_imagem "
+                "FROM Musica WHERE id > ? ORDER BY id LIMIT ?",
+                (ultimo, lote),
+            ).fetchall()
+            if not linhas:
+                return
+            registros = []
+            for linha in linhas:
+                registro = dict(zip(COLUNAS_CATALOGO, linha))
+                registro["cursor"] = codificar_cursor(linha[0])
+                registros.append(registro)
+            yield registros
+            ultimo = linhas[-1][0]
+
+def lotes_usuario(usuario_id: int, apos=None, lote: int = LOTE):
+    """Lotes dos reviews, curtidas, listas e faixas das listas do usuário."""
+    tipos = [s[0] for s in _SECOES_USUARIO]
+    inicio_secao = tipos.index(apos[0]) if apos else 0
+    with get_read_connection() as conexao:
+        for indice, (tipo, sql, tamanho_chave, colunas) in enumerate(_SECOES_USUARIO):
+            if indice < inicio_secao:
+                continue
+            chave = tuple(apos[1]) if apos and indice == inicio_secao else _INICIO[tipo]
+            while True:
+                linhas = conexao.execute(sql, (usuario_id, *chave, lote)).fetchall()
+                if not linhas:
+                    break
+                registros = []
+                for linha in linhas:
+                    registro = {"tipo": tipo, **dict(zip(colunas, linha))}
+                    chave_linha = list(linha[:tamanho_chave])
+                    registro["cursor"] = codificar_cursor(tipo, *chave_linha, *([None] * (2 - tamanho_chave)))
+                    registros.append(registro)
+                yield registros
+                chave = tuple(linhas[-1][:tamanho_chave])
+
+def _ndjson(lotes):
+    for registros in lotes:
+        yield "".join(json.dumps(r, ensure_ascii=False, default=str) + "\n" for r in registros).encode()
+
+def _csv(lotes, colunas):
+    colunas = (*colunas, "cursor")
+    buffer = io.StringIO()
+    escritor = csv.DictWriter(buffer, fieldnames=colunas, extrasaction="ignore")
+    escritor.writeheader()
+    for registros in lotes:
+        escritor.writerows(registros)
+        yield buffer.getvalue().encode()
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue().encode()
+
+def _gzip(pedacos):
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31)
+    for pedaco in pedacos:
+        comprimido = compressor.compress(pedaco)
+        if comprimido:
+            yield comprimido
+    yield compressor.flush()
+
+def gerar(lotes, formato: str, colunas, gzip: bool = False):
+    """Iterador de bytes no formato pedido ("ndjson" ou "csv")."""
+    pedacos = _csv(lotes, colunas) if formato == "csv" else _ndjson(lotes)
+    return _gzip(pedacos) if gzip else pedacos
+
+def tipo_midia(formato: str, gzip: bool) -> tuple:
+    """(media type, extensão do arquivo)."""
+    if gzip:
+        return "application/gzip", f"{formato}.gz"
+    if formato == "csv":
+        return "text/csv; charset=utf-8", "csv"
+    return "application/x-ndjson", "ndjson"
@@ -0,0 +1,224 @@
+import asyncio
+import random
+import threading
+import time
+from email.utils import parsedate_to_datetime
+
+from config import (
+    GENIUS_ACCESS_TOKEN,
+    GENIUS_API_URL,
+    GENIUS_TIMEOUT,
+    GENIUS_CONCORRENCIA,
+    GENIUS_MAX_TENTATIVAS,
+    GENIUS_BACKOFF_BASE,
+    GENIUS_ESPERA_MAX,
+    GENIUS_DISJUNTOR_FALHAS,
+    GENIUS_DISJUNTOR_ESPERA,
+)
+
+class ErroGenius(Exception):
+    """Falha definitiva de uma consulta ao Genius (já com as retentativas)."""
+    def __init__(self, status: int, detalhe: str, retry_after: float | None = None):
+        super().__init__(detalhe)
+        self.status = status
+        self.detalhe = detalhe
+        self.retry_after = retry_after
+
+class GeniusIndisponivel(ErroGenius):
+    """Disjuntor aberto: o Genius vem falhando e a consulta nem é enviada."""
+    def __init__(self, retry_after: float):
+        super().__init__(503, "Genius indisponível no momento, tente novamente mais tarde.", retry_after)
+
+class Disjuntor:
+    """
+    Circuit breaker simples. Depois de `limite` falhas seguidas abre por
+    `espera` segundos (falha rápido); passado o tempo deixa uma tentativa
+    passar (meio-aberto) e fecha de novo no primeiro sucesso. Uma
+    tentativa que some sem resultado (cancelada) libera a vaga com
+    `liberar_teste`; se nem isso acontecer, outra passa após `espera`.
+    """
+
+    def __init__(self, limite: int, espera: float):
+        self._limite = limite
+        self._espera = espera
+        self._falhas = 0
+        self._aberto_ate = 0.0
+        self._testando = False
+        self._teste_desde = 0.0
+        self._lock = threading.Lock()
+
+    def permitir(self) -> bool:
+        with self._lock:
+            if self._falhas < self._limite:
+                return True
+            agora = time.monotonic()
+            if agora < self._aberto_ate:
+                return False
+            if self._testando and agora - self._teste_desde < self._espera:
+                return False
+            self._testando = True
+            self._teste_desde = agora
+            return True
+
+    def liberar_teste(self):
+        """A tentativa não chegou a sucesso nem falha (ex.: cancelada): outra pode testar."""
+        with self._lock:
+            self._testando = False
+
+    def registrar_sucesso(self):
+        with self._lock:
+            self._falhas = 0
+            self._testando = False
+
+    def registrar_falha(self):
+        with self._lock:
+            self._falhas += 1
+            self._testando = False
+            if self._falhas >= self._limite:
+                self._aberto_ate = time.monotonic() + self._espera
+
+    def segundos_ate_fechar(self) -> float:
+        with self._lock:
+            return max(0.0, self._aberto_ate - time.monotonic())
+
+    def estado(self) -> str:
+        with self._lock:
+            if self._falhas < self._limite:
+                return "fechado"
+            return "aberto" if time.monotonic() < self._aberto_ate else "meio-aberto"
+
+disjuntor = Disjuntor(GENIUS_DISJUNTOR_FALHAS, GENIUS_DISJUNTOR_ESPERA)
+_cliente = None
+
+def _obter_cliente():
+    """Cliente HTTP compartilhado (pool de conexões/keep-alive), criado no primeiro uso."""
+    global _cliente
+    if _cliente is None:
+        import httpx  # só carregado por quem realmente usa o Genius
+        _cliente = httpx.AsyncClient(
+            base_url=GENIUS_API_URL,
+            headers={"Authorization": f"Bearer {GENIUS_ACCESS_TOKEN}"},
+            timeout=GENIUS_TIMEOUT,
+            limits=httpx.Limits(max_connections=GENIUS_CONCORRENCIA, max_keepalive_connections=GENIUS_CONCORRENCIA),
+        )
+    return _cliente
+
+async def fechar_cliente():
+    global _cliente
+    if _cliente is not None:
+        await _cliente.aclose()
+        _cliente = None
+
+def _ler_retry_after(valor: str | None) -> float | None:
+    """Retry-After em segundos ou como data HTTP."""
+    if not valor:
+        return None
+    try:
+        return max(0.0, float(valor))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(valor).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+def formatar_resultados(data: dict) -> list:
+    results = []
+
+    # O Genius retorna "hits", cada "hit" tem um "result"
+    for hit in (data.get("response") or {}).get("hits") or []:
+        track = hit.get("result") or {}
+
+        # Às vezes o Genius não tem um álbum associado
+        album_name = track["album"].get("name") if track.get("album") else "Single"
+
+        r_date = track.get("release_date") or track.get("release_date_for_display") or "Data desc."
+
+        results.append({
+            "genius_id": track.get("id"),
+            "nome": track.get("title"),
+            "artista": (track.get("primary_artist") or {}).get("name"),
+            "album": album_name,
+            "data_lancamento": r_date,
+            "url_imagem_capa": track.get("song_art_image_thumbnail_url"),
+        })
+
+    return results
+
+async def buscar(query: str) -> list:
+    """
+    Uma consulta ao /search do Genius. 429 e 5xx (e erros de rede) são
+    repetidos com backoff exponencial com jitter, respeitando Retry-After;
+    outros 4xx falham na hora. Lança ErroGenius / GeniusIndisponivel.
+    """
+    import httpx
+
+    cliente = _obter_cliente()
+    ultimo_erro = ErroGenius(502, "Erro ao buscar no Genius")
+    for tentativa in range(GENIUS_MAX_TENTATIVAS):
+        if not disjuntor.permitir():
+            raise GeniusIndisponivel(disjuntor.segundos_ate_fechar())
+
+        retry_after = None
+        registrado = False
+        try:
+            try:
+                response = await cliente.get("/search", params={"q": query})
+            except httpx.HTTPError as e:
+                ultimo_erro = ErroGenius(502, f"Erro de comunicação com o Genius: {e}")
+            else:
+                if response.status_code < 400:
+                    disjuntor.registrar_sucesso()
+                    registrado = True
+                    try:
+                        return formatar_resultados(response.json())
+                    except (ValueError, TypeError, AttributeError, KeyError):
+                        # 200 com corpo que não é o JSON esperado: repetir não ajuda
+                        raise ErroGenius(502, "Resposta inválida do Genius")
+                if response.status_code != 429 and response.status_code < 500:
+                    # Erro do pedido (ex.: 401 de token inválido), não do Genius
+                    disjuntor.registrar_sucesso()
+                    registrado = True
+                    raise ErroGenius(response.status_code, f"Erro ao buscar no Genius: {response.text}")
+                retry_after = _ler_retry_after(response.headers.get("Retry-After"))
+                ultimo_erro = ErroGenius(response.status_code, f"Erro ao buscar no Genius: {response.text}", retry_after)
+            disjuntor.registrar_falha()
+            registrado = True
+        finally:
+            # Cancelada (cliente desconectou, wait_for) ou erro inesperado no meio
+            if not registrado:
+                disjuntor.liberar_teste()
+
+        if tentativa == GENIUS_MAX_TENTATIVAS - 1:
+            break
+        if retry_after is not None:
+            if retry_after > GENIUS_ESPERA_MAX:
+                # Esperar tanto prenderia a requisição; devolve o erro com o prazo
+                break
+            espera = retry_after
+        else:
+            espera = random.uniform(0, min(GENIUS_ESPERA_MAX, GENIUS_BACKOFF_BASE * 2 ** tentativa))
+        await asyncio.sleep(espera)
+
+    raise ultimo_erro
+
+async def buscar_lote(queries: list, concorrencia: int = GENIUS_CONCORRENCIA) -> list:
+    """
+    Várias consultas em paralelo (no máximo `concorrencia` ao mesmo tempo)
+    no cliente compartilhado. Uma falha não derruba o lote: cada item traz
+    `ok` e os resultados ou o erro.
+    """
+    semaforo = asyncio.Semaphore(concorrencia)
+
+    async def _uma(query):
+        async with semaforo:
+            try:
+                return {"query": query, "ok": True, "resultados": await buscar(query)}
+            except ErroGenius as e:
+                return {"query": query, "ok": False, "status": e.status, "erro": e.detalhe}
+            except Exception as e:
+                # Qualquer outro imprevisto fica só nesta consulta, não derruba o lote
+                print(f"Erro inesperado na busca '{query}' no Genius: {e!r}")
+                return {"query": query, "ok": False, "status": 502, "erro": "Erro ao buscar no Genius"}
+
+    return await asyncio.gather(*(_uma(q) for q in queries))
@@ -0,0 +1,146 @@
+"""
+Gravador de tráfego: amostra requisições reais para um JSONL compacto
+que `scripts/replay.py` reproduz contra uma instância local.
+
+Desligado (GRAVACAO_ARQUIVO vazio), o middleware só repassa a chamada.
+Ligado, cada requisição sorteada vira uma linha com método, template da
+rota, caminho, query, corpo JSON pequeno (sem campos de senha), hash do
+sujeito (token ou IP), status, bytes e duração. A escrita no arquivo é
+feita por uma thread, fora do event loop.
+"""
+import atexit
+import hashlib
+import json
+import queue
+import random
+import threading
+import time
+
+from config import GRAVACAO_ARQUIVO, GRAVACAO_AMOSTRA
+
+# Corpos maiores que isso não são gravados (uploads, listas enormes)
+_CORPO_MAX = 4096
+_CAMPOS_SENSIVEIS = {"senha", "password", "senha_atual", "nova_senha"}
+
+def _sujeito(scope) -> str:
+    """Hash estável de quem fez a requisição, sem guardar token nem IP."""
+    for nome, valor in scope["headers"]:
+        if nome == b"authorization" and valor[:7].lower() == b"bearer ":
+            return "t:" + hashlib.sha1(valor[7:]).hexdigest()[:16]
+    cliente = scope.get("client")
+    return "ip:" + hashlib.sha1((cliente[0] if cliente else "?").encode()).hexdigest()[:16]
+
+def _corpo_gravavel(corpo: bytes, scope):
+    if not corpo or len(corpo) > _CORPO_MAX:
+        return None
+    tipo = next((v for n, v in scope["headers"] if n == b"content-type"), b"")
+    if not tipo.startswith(b"application/json"):
+        return None
+    try:
+        dados = json.loads(corpo)
+    except ValueError:
+        return None
+    if isinstance(dados, dict):
+        dados = {k: v for k, v in dados.items() if k not in _CAMPOS_SENSIVEIS}
+    return dados
+
+class Gravador:
+    """Fila de linhas prontas + thread que as anexa ao arquivo em lotes."""
+
+    def __init__(self, arquivo: str, amostra: float):
+        self.arquivo = arquivo
+        self.amostra = amostra
+        self._fila = queue.SimpleQueue()
+        self._thread = None
+        self._lock = threading.Lock()
+        self._lock_thread = threading.Lock()
+        self.gravadas = 0
+
+    @property
+    def ativo(self) -> bool:
+        return bool(self.arquivo) and self.amostra > 0
+
+    def sortear(self) -> bool:
+        return self.amostra >= 1 or random.random() < self.amostra
+
+    def registrar(self, registro: dict):
+        self._fila.put(json.dumps(registro, ensure_ascii=False, separators=(",", ":")))
+        if self._thread is None:
+            with self._lock_thread:
+                if self._thread is None:
+                    self._thread = threading.Thread(target=self._loop, name="gravador-trafego", daemon=True)
+                    self._thread.start()
+
+    def _loop(self):
+        while True:
+            self._escrever([self._fila.get()])
+
+    def _escrever(self, linhas: list):
+        # Junta o que mais estiver na fila num único write
+        while True:
+            try:
+                linhas.append(self._fila.get_nowait())
+            except queue.Empty:
+                break
+        if not linhas:
+            return
+        with self._lock:
+            try:
+                with open(self.arquivo, "a", encoding="utf-8") as f:
+                    f.write("\n".join(linhas) + "\n")
+                self.gravadas += len(linhas)
+            except OSError as e:
+                print(f"Erro ao gravar tráfego: {e}")
+
+    def descarregar(self):
+        """Grava o que ainda está na fila (chamado na saída do processo)."""
+        self._escrever([])
+
+gravador = Gravador(GRAVACAO_ARQUIVO, GRAVACAO_AMOSTRA)
+atexit.register(gravador.descarregar)
+
+class GravacaoMiddleware:
+    """Middleware ASGI: grava uma amostra das requisições (ver `gravador`)."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not gravador.ativo or not gravador.sortear():
+            await self.app(scope, receive, send)
+            return
+
+        corpo = bytearray()
+        resposta = {"status": None, "bytes": 0}
+
+        async def _receive():
+            mensagem = await receive()
+            if mensagem["type"] == "http.request" and len(corpo) <= _CORPO_MAX:
+                corpo.extend(mensagem.get("body", b""))
+            return mensagem
+
+        async def _send(mensagem):
+            if mensagem["type"] == "http.response.start":
+                resposta["status"] = mensagem["status"]
+            elif mensagem["type"] == "http.response.body":
+                resposta["bytes"] += len(mensagem.get("body", b""))
+            await send(mensagem)
+
+        inicio_epoch = time.time()
+        inicio = time.perf_counter()
+        try:
+            await self.app(scope, _receive, _send)
+        finally:
+            rota = scope.get("route")
+            gravador.registrar({
+                "t": round(inicio_epoch, 3),
+                "metodo": scope["method"],
+                "rota": getattr(rota, "path", None),
+                "caminho": scope["path"],
+                "query": scope.get("query_string", b"").decode("latin-1"),
+                "corpo": _corpo_gravavel(bytes(corpo), scope),
+                "sujeito": _sujeito(scope),
+                "status": resposta["status"] or 500,
+                "bytes": resposta["bytes"],
+                "ms": round((time.perf_counter() - inicio) * 1000, 2),
+            })
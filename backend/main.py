@@ -1,19 +1,36 @@
-from fastapi import FastAPI, HTTPException, Query, Depends
+from fastapi import FastAPI, HTTPException, Query, Depends, Request, Response
+from fastapi.responses import JSONResponse, FileResponse, RedirectResponse, StreamingResponse, PlainTextResponse
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel, Field
-from typing import List, Tuple, Optional
+from typing import List, Tuple, Optional, Dict
 
-import httpx
 from config import GENIUS_CLIENT_SECRET, GENIUS_CLIENT_ID, GENIUS_ACCESS_TOKEN, GENIUS_API_URL
-
-from bd import get_connection
-
-from datetime import timedelta
-
-from auth import create_access_token, get_current_user, ACCESS_TOKEN_EXPIRE_MINUTES
+from config import COMPRESSAO_MINIMO, COMPRESSAO_NIVEL_GZIP, COMPRESSAO_NIVEL_BROTLI, ADMISSAO_THREADS, PERFIL_ATIVO
+import genius
+from genius import ErroGenius
+import busca_hibrida
+from capas import cache_capas, ErroCapa
+
+from bd import get_read_connection, snapshot_leitura, escritor, FilaEscritaCheia, EscritaExpirada
+from cache import cache
+from autocomplete import sugerir
+from paginacao import codificar_cursor, decodificar_cursor
+from projecao import escolher_campos, linhas_para_dicts
+from compressao import CompressaoMiddleware
+from gravacao import GravacaoMiddleware
+import perfilador
+from admissao import AdmissaoMiddleware, controle as controle_admissao
+
+from datetime import timedelta, datetime, timezone
+
+from auth import create_access_token, get_current_user, get_current_user_optional, exigir_admin, ACCESS_TOKEN_EXPIRE_MINUTES
+from backup import agendador_backup, BackupEmAndamento
+from manutencao import agendador_manutencao, ManutencaoEmAndamento
+import exportacao
+
+from esquema import garantir_esquema
 
 from crud.crud_musica import (
-    criarTabelaMusica,
     visualizarDados as musica_list,
     inserirDados as musica_insert,
     verLinha as musica_get,
@@ -21,11 +38,11 @@ from crud.crud_musica import (
     deletarDados as musica_delete,
     contar_busca,
     listar_busca,
-    obterMusicaPorDados
+    obterMusicaPorDados,
+    CAMPOS_MUSICA
 )
 
 from crud.crud_usuario import (
-    criarTabelaUsuario,
     inserirDados as usuario_insert,
     obter_usuario_por_email,
     obter_perfil_por_id,
@@ -34,25 +51,29 @@ from crud.crud_usuario import (
     hash_password,
     verify_password,
     verificar_curtida,
+    verificar_curtidas_em_lote,
     alternar_curtida,
     listar_musicas_curtidas,
     pesquisar_usuarios,
     obter_perfil_publico,
     verificar_seguindo,
-    alternar_seguir
+    verificar_seguindo_em_lote,
+    alternar_seguir,
+    CAMPOS_CURTIDA
 )
 
-# from crud.crud_album import criarTabelaAlbum
+from crud.crud_album import listar_albums, obter_album
+from crud.crud_artista import listar_artistas, obter_artista, atualizador_top
 from crud.crud_review import (
-    criarTabelaReview,
     inserirReview,
     listarReviewsPorMusica,
     obterReviewPorId,
-    deletarDados as review_delete
+    obterMediasEmLote,
+    deletarDados as review_delete,
+    CAMPOS_REVIEW
 )
 
 from crud.crud_lista import (
-    criarTabelaLista, 
     criar_lista, 
     listar_listas_usuario, 
     deletar_lista,
@@ -60,22 +81,39 @@ from crud.crud_lista import (
     adicionar_musica_lista,
     remover_musica_lista,
     obter_musicas_da_lista,
-    editar_lista
+    mover_musica_lista,
+    editar_lista,
+    CAMPOS_LISTA_MUSICA
 )
 
-from crud.crud_feed import obter_feed_usuario 
+from crud.crud_feed import obter_feed_usuario, obter_timeline
+import tarefas
 
 app = FastAPI(title="HitNote API")
 
 @app.on_event("startup")
 def on_startup():
-    print("Iniciando a aplicação e criando tabelas...")
-    criarTabelaMusica()
-    criarTabelaReview()
-    criarTabelaUsuario()
-    criarTabelaLista()
+    print("Iniciando a aplicação...")
+    if garantir_esquema():
+        print("Esquema do banco criado/atualizado.")
+    escritor.iniciar()
+    agendador_backup.iniciar()
+    agendador_manutencao.iniciar()
+    tarefas.processador.iniciar()
+    atualizador_top.iniciar()
+    # As rotas síncronas rodam neste pool; o controle de admissão limita cada classe abaixo dele
+    import anyio.to_thread
+    anyio.to_thread.current_default_thread_limiter().total_tokens = ADMISSAO_THREADS
     print("Tabelas prontas.")
 
+@app.on_event("shutdown")
+async def on_shutdown():
+    await genius.fechar_cliente()
+
+# Limites por classe de rota e por usuário/IP, antes de ocupar uma thread.
+# Adicionado antes do CORS para que as recusas (503/429) levem os headers de CORS.
+app.add_middleware(AdmissaoMiddleware)
+
 # Libera o front local
 # CORS liberado em dev; em prod, restrinja para o host do front
 app.add_middleware(
@@ -86,11 +124,155 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Listas grandes (músicas, curtidas, reviews) em redes móveis
+app.add_middleware(
+    CompressaoMiddleware,
+    minimo=COMPRESSAO_MINIMO,
+    nivel_gzip=COMPRESSAO_NIVEL_GZIP,
+    nivel_brotli=COMPRESSAO_NIVEL_BROTLI,
+)
+
+# Perfilador sob demanda; desligado, nem entra na pilha de middlewares
+if PERFIL_ATIVO:
+    app.add_middleware(perfilador.PerfilMiddleware)
+
+# Por fora de tudo: a duração gravada é a que o cliente viu (inclui fila da admissão)
+app.add_middleware(GravacaoMiddleware)
+
+@app.exception_handler(FilaEscritaCheia)
+@app.exception_handler(EscritaExpirada)
+def fila_escrita_cheia_handler(request: Request, exc: Exception):
+    # Escritor saturado ou travado: recusa em vez de deixar a requisição presa
+    return JSONResponse(status_code=503, content={"detail": str(exc)}, headers={"Retry-After": "1"})
+
 # ----------------------------- Health --------------------------------------
 @app.get("/health")
 def health():
     return {"status": "ok"}
 
+@app.get("/health/escrita")
+def health_escrita():
+    """Profundidade da fila do escritor único e tempos de espera/execução."""
+    return escritor.estatisticas()
+
+@app.get("/health/cache")
+def health_cache():
+    """Acertos, faltas e invalidações do cache em memória deste worker."""
+    return cache.estatisticas()
+
+@app.get("/health/capas")
+def health_capas():
+    """Acertos, downloads e expulsões do cache de capas em disco."""
+    return cache_capas.estatisticas()
+
+@app.get("/health/admissao")
+def health_admissao():
+    """Execuções, fila, recusas e espera de cada classe do controle de admissão."""
+    return controle_admissao.estatisticas()
+
+@app.get("/health/busca")
+def health_busca():
+    """Taxa de buscas híbridas resolvidas só no catálogo local e tempo poupado."""
+    return busca_hibrida.estatisticas.estatisticas()
+
+@app.get("/health/manutencao")
+def health_manutencao():
+    """Tamanho do WAL, páginas livres e quando rodou a última manutenção."""
+    estado = agendador_manutencao.estado()
+    relatorio = estado.pop("ultimo_relatorio") or {}
+    return {**estado, "ultima_duracao_s": relatorio.get("duracao_s")}
+
+@app.get("/health/tarefas")
+def health_tarefas():
+    """Tarefas por estado, atraso da fila, vazão e falhas do processador deste worker."""
+    return tarefas.processador.estatisticas()
+
+# ----------------------------- Admin ---------------------------------------
+
+@app.get("/admin/perfis", dependencies=[Depends(exigir_admin)])
+def admin_listar_perfis():
+    """Perfis guardados no anel deste worker, mais recentes primeiro."""
+    return {"ativo": PERFIL_ATIVO, "perfis": perfilador.anel.listar()}
+
+def _perfil_ou_404(perfil_id: int):
+    perfil = perfilador.anel.obter(perfil_id)
+    if perfil is None:
+        raise HTTPException(status_code=404, detail="Perfil não encontrado (ou já saiu do anel)")
+    return perfil
+
+@app.get("/admin/perfis/{perfil_id}", dependencies=[Depends(exigir_admin)])
+def admin_obter_perfil(perfil_id: int):
+    """SQL executado com tempos e funções mais amostradas."""
+    return _perfil_ou_404(perfil_id).detalhe()
+
+@app.get("/admin/perfis/{perfil_id}/folded", response_class=PlainTextResponse, dependencies=[Depends(exigir_admin)])
+def admin_perfil_folded(perfil_id: int):
+    """Pilhas no formato folded (flamegraph.pl, speedscope)."""
+    return _perfil_ou_404(perfil_id).folded()
+
+@app.get("/admin/tarefas/mortas", dependencies=[Depends(exigir_admin)])
+def admin_tarefas_mortas(limite: int = Query(100, ge=1, le=1000)):
+    """Tarefas que esgotaram as tentativas, com o último erro."""
+    return tarefas.listar_mortas(limite)
+
+@app.post("/admin/tarefas/{tarefa_id}/reenfileirar", dependencies=[Depends(exigir_admin)])
+def admin_reenfileirar_tarefa(tarefa_id: int):
+    """Devolve uma tarefa morta para a fila."""
+    if not tarefas.reenfileirar(tarefa_id):
+        raise HTTPException(status_code=404, detail="Tarefa morta não encontrada")
+    return {"msg": "Tarefa reenfileirada"}
+
+@app.get("/admin/backups", dependencies=[Depends(exigir_admin)])
+def admin_listar_backups():
+    """Snapshots em disco, backup em andamento e relatório do último."""
+    return agendador_backup.estado()
+
+@app.post("/admin/backups", status_code=202, dependencies=[Depends(exigir_admin)])
+def admin_disparar_backup():
+    """Dispara um backup online em segundo plano; acompanhe por GET /admin/backups."""
+    try:
+        agendador_backup.disparar()
+    except BackupEmAndamento as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    return {"msg": "Backup iniciado"}
+
+@app.get("/admin/manutencao", dependencies=[Depends(exigir_admin)])
+def admin_estado_manutencao():
+    """Última manutenção (estatísticas, órfãos, vacuum, checkpoint), WAL e páginas livres."""
+    return agendador_manutencao.estado()
+
+@app.post("/admin/manutencao", status_code=202, dependencies=[Depends(exigir_admin)])
+def admin_disparar_manutencao():
+    """Dispara a manutenção em segundo plano; acompanhe por GET /admin/manutencao."""
+    try:
+        agendador_manutencao.disparar()
+    except ManutencaoEmAndamento as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    return {"msg": "Manutenção iniciada"}
+
+def _resposta_exportacao(lotes, formato: str, colunas, gzip: bool, nome: str) -> StreamingResponse:
+    media_type, extensao = exportacao.tipo_midia(formato, gzip)
+    return StreamingResponse(
+        exportacao.gerar(lotes, formato, colunas, gzip),
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="{nome}.{extensao}"'},
+    )
+
+@app.get("/admin/exportar/musicas", dependencies=[Depends(exigir_admin)])
+def admin_exportar_catalogo(
+    formato: str = Query("ndjson", pattern="^(ndjson|csv)$"),
+    gzip: bool = Query(False, description="Arquivo .gz em vez de texto puro"),
+    apos: Optional[str] = Query(None, description="cursor da última linha recebida, para retomar"),
+):
+    """Catálogo inteiro em streaming, com memória constante no servidor."""
+    try:
+        apos_id = exportacao.validar_cursor(apos, usuario=False)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return _resposta_exportacao(
+        exportacao.lotes_catalogo(apos_id), formato, exportacao.COLUNAS_CATALOGO, gzip, "catalogo"
+    )
+
 # ----------------------------- Músicas -------------------------------------
 class MusicaIn(BaseModel):
     nome: str
@@ -101,6 +283,9 @@ class MusicaIn(BaseModel):
 
 class MusicaOut(MusicaIn):
     id: int
+    is_liked: Optional[bool] = None  # só preenchido quando há token
+    media: Optional[float] = None  # só com with_rating=true
+    qtde_reviews: Optional[int] = None
 
 class MusicaProfileOut(BaseModel):
     id: int
@@ -123,23 +308,147 @@ def rows_to_musicas(rows: List[Tuple]) -> List[MusicaOut]:
         ) 
         for r in rows
     ]
+
+# Campos calculados fora do SELECT que `fields=` também aceita
+EXTRAS_MUSICA = ("is_liked", "media", "qtde_reviews")
+DESCRICAO_FIELDS = "Campos a retornar, separados por vírgula (ex.: id,nome,artista). O id sempre vem."
+
+def _projecao(fields: Optional[str], disponiveis: dict, extras=()):
+    try:
+        return escolher_campos(fields, disponiveis, extras=extras)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+def _completar_extras(items: List[dict], extras: set, current_user):
+    """Preenche is_liked/media/qtde_reviews pedidos em `fields` (consultas em lote)."""
+    ids = [item["id"] for item in items]
+    if "is_liked" in extras:
+        curtidas = verificar_curtidas_em_lote(current_user[0], ids) if current_user else None
+        for item in items:
+            item["is_liked"] = None if curtidas is None else item["id"] in curtidas
+    if extras & {"media", "qtde_reviews"}:
+        medias = obterMediasEmLote(ids)
+        for item in items:
+            media, qtde = medias.get(item["id"], (None, 0))
+            if "media" in extras:
+                item["media"] = media
+            if "qtde_reviews" in extras:
+                item["qtde_reviews"] = qtde
+
 class MusicaPage(BaseModel):
     items: List[MusicaOut]
     total: int
     page: int
     page_size: int
 
+# Limite de ids aceitos pelos endpoints em lote
+MAX_IDS_LOTE = 500
+
+def parse_ids(ids: str) -> List[int]:
+    """Converte "1,2,3" em [1, 2, 3] (sem repetidos), validando o limite do lote."""
+    try:
+        valores = list(dict.fromkeys(int(p) for p in ids.split(",") if p.strip()))
+    except ValueError:
+        raise HTTPException(status_code=400, detail="ids deve ser uma lista de inteiros separados por vírgula")
+    if len(valores) > MAX_IDS_LOTE:
+        raise HTTPException(status_code=400, detail=f"Máximo de {MAX_IDS_LOTE} ids por requisição")
+    return valores
+
 @app.get("/musicas", response_model=MusicaPage)
 def list_musicas(
     q: Optional[str] = Query(None, description="Busca por nome/artista/album"),
     page: int = Query(1, ge=1),
     page_size: int = Query(10, ge=1, le=100),
     order: str = Query("id_desc", pattern="^(id_asc|id_desc|nome_asc|nome_desc)$"),
+    with_rating: bool = Query(False, description="Inclui média e quantidade de reviews de cada música"),
+    fields: Optional[str] = Query(None, description=DESCRICAO_FIELDS),
+    current_user: Optional[tuple] = Depends(get_current_user_optional),
 ):
+    projecao = _projecao(fields, CAMPOS_MUSICA, EXTRAS_MUSICA)
     total = contar_busca(q)
     offset = (page - 1) * page_size
+    if projecao:
+        # Só as colunas pedidas saem do banco; sem passar pelo modelo Pydantic
+        colunas, extras = projecao
+        items = linhas_para_dicts(colunas, listar_busca(q, order, page_size, offset, colunas))
+        _completar_extras(items, extras, current_user)
+        return JSONResponse({"items": items, "total": total, "page": page, "page_size": page_size})
     rows = listar_busca(q, order, page_size, offset)
-    return MusicaPage(items=rows_to_musicas(rows), total=total, page=page, page_size=page_size)
+    items = rows_to_musicas(rows)
+    if current_user:
+        curtidas = verificar_curtidas_em_lote(current_user[0], [m.id for m in items])
+        for m in items:
+            m.is_liked = m.id in curtidas
+    if with_rating:
+        medias = obterMediasEmLote([m.id for m in items])
+        for m in items:
+            m.media, m.qtde_reviews = medias.get(m.id, (None, 0))
+    return MusicaPage(items=items, total=total, page=page, page_size=page_size)
+
+class SugestaoOut(BaseModel):
+    id: int
+    nome: str
+    artista: str
+    album: Optional[str] = None
+
+@app.get("/musicas/autocomplete", response_model=List[SugestaoOut])
+def autocomplete_musicas(
+    q: str = Query(..., min_length=1, description="Texto digitado (tolera erros de digitação)"),
+    limite: int = Query(10, ge=1, le=25),
+):
+    """Sugestões para a caixa de busca (prefixos em memória + índice de trigramas)."""
+    return [
+        SugestaoOut(id=mid, nome=nome, artista=artista, album=album)
+        for mid, nome, artista, album in sugerir(q, limite)
+    ]
+
+class RatingOut(BaseModel):
+    musica_id: int
+    media: Optional[float]
+    qtde: int
+
+@app.get("/musicas/ratings", response_model=List[RatingOut])
+def ratings_em_lote(ids: str = Query(..., description=f"Ids de músicas separados por vírgula (máx. {MAX_IDS_LOTE})")):
+    """Média e quantidade de reviews de várias músicas numa única consulta agrupada."""
+    medias = obterMediasEmLote(parse_ids(ids))
+    return [RatingOut(musica_id=mid, media=media, qtde=qtde) for mid, (media, qtde) in medias.items()]
+
+# ----------------------------- Capas ---------------------------------------
+# As capas vivem em /capas/{hash}: o endereço muda quando o conteúdo muda,
+# então podem ser cacheadas para sempre pelo navegador/CDN. As rotas por
+# URL ou por música só resolvem o hash e redirecionam.
+CACHE_IMUTAVEL = "public, max-age=31536000, immutable"
+CACHE_REDIRECIONAMENTO = "public, max-age=86400"
+
+def _redirecionar_capa(url: str, tamanho: Optional[int]):
+    try:
+        hash_conteudo = cache_capas.resolver(url)
+    except ErroCapa as e:
+        raise HTTPException(status_code=e.status, detail=e.detalhe)
+    destino = f"/capas/{hash_conteudo}" + (f"?tamanho={tamanho}" if tamanho else "")
+    return RedirectResponse(destino, status_code=302, headers={"Cache-Control": CACHE_REDIRECIONAMENTO})
+
+@app.get("/capas")
+def get_capa_por_url(url: str, tamanho: Optional[int] = None):
+    """Proxy de capa externa (ex.: url_imagem_capa do Genius)."""
+    return _redirecionar_capa(url, tamanho)
+
+@app.get("/capas/{hash_conteudo}")
+def get_capa(hash_conteudo: str, tamanho: Optional[int] = None):
+    try:
+        caminho, tipo = cache_capas.arquivo(hash_conteudo, tamanho)
+    except ErroCapa as e:
+        raise HTTPException(status_code=e.status, detail=e.detalhe)
+    return FileResponse(caminho, media_type=tipo, headers={"Cache-Control": CACHE_IMUTAVEL})
+
+@app.get("/musicas/{id}/capa")
+def get_capa_musica(id: int, tamanho: Optional[int] = None):
+    r = musica_get((id,))
+    if not r:
+        raise HTTPException(status_code=404, detail="Música não encontrada")
+    if not r[0][5]:
+        raise HTTPException(status_code=404, detail="Música sem capa")
+    return _redirecionar_capa(r[0][5], tamanho)
 
 @app.get("/musicas/{id}", response_model=MusicaOut)
 def get_musica(id: int):
@@ -156,20 +465,15 @@ def create_musica(data: MusicaIn):
         print(f"Música '{data.nome}' já existe. Retornando ID {musica_existente[0]}.")
         return rows_to_musicas([musica_existente])[0]
 
-    musica_insert([data.nome, data.artista, data.album, data.data_lancamento, data.url_imagem])
-    
-    with get_connection() as con:
-        cur = con.cursor()
-        cur.execute("SELECT * FROM Musica ORDER BY id DESC LIMIT 1")
-        row = cur.fetchone()
+    novo_id = musica_insert([data.nome, data.artista, data.album, data.data_lancamento, data.url_imagem])
         
-    return rows_to_musicas([row])[0]
+    return get_musica(novo_id)
 
 @app.put("/musicas/{id}", response_model=MusicaOut)
 def update_musica(id: int, data: MusicaIn):
     # garante que existe
     _ = get_musica(id)
-    musica_update([data.nome, data.artista, data.album, data.data_lancamento, id])
+    musica_update([data.nome, data.artista, data.album, data.data_lancamento, data.url_imagem, id])
     return get_musica(id)
 
 @app.delete("/musicas/{id}", status_code=204)
@@ -179,6 +483,10 @@ def delete_musica(id: int):
     musica_delete((id,))
     return
 
+def _erro_genius(e: ErroGenius) -> HTTPException:
+    headers = {"Retry-After": str(int(e.retry_after) + 1)} if e.retry_after is not None else None
+    return HTTPException(status_code=e.status, detail=e.detalhe, headers=headers)
+
 @app.get("/api/v1/search-genius")
 async def search_genius(query: str):
     """
@@ -187,45 +495,62 @@ async def search_genius(query: str):
     if not GENIUS_ACCESS_TOKEN:
         raise HTTPException(status_code=500, detail="API do Genius não configurada no servidor.")
 
-    headers = {"Authorization": f"Bearer {GENIUS_ACCESS_TOKEN}"}
-    params = {"q": query}
-    
     try:
-        async with httpx.AsyncClient() as client:
-            response = await client.get(f"{GENIUS_API_URL}/search", headers=headers, params=params)
-            
-            response.raise_for_status() 
-        
-        data = response.json()
-        results = []
-        
-        # O Genius retorna "hits", cada "hit" tem um "result"
-        for hit in data.get("response", {}).get("hits", []):
-            track = hit.get("result", {})
-            
-            # Às vezes o Genius não tem um álbum associado
-            album_name = track.get("album", {}).get("name") if track.get("album") else "Single"
-
-            r_date = track.get("release_date") or track.get("release_date_for_display") or "Data desc."
-
-            results.append({
-                "genius_id": track.get("id"),
-                "nome": track.get("title"),
-                "artista": track.get("primary_artist", {}).get("name"),
-                "album": album_name,
-                "data_lancamento": r_date,
-                "url_imagem_capa": track.get("song_art_image_thumbnail_url"),
-            })
-        
-        return results
+        return await genius.buscar(query)
+    except ErroGenius as e:
+        raise _erro_genius(e)
+
+class BuscaHibridaItem(BaseModel):
+    origem: str
+    id: Optional[int] = None
+    genius_id: Optional[int] = None
+    nome: Optional[str] = None
+    artista: Optional[str] = None
+    album: Optional[str] = None
+    data_lancamento: Optional[str] = None
+    url_imagem_capa: Optional[str] = None
+
+class BuscaHibridaOut(BaseModel):
+    resultados: List[BuscaHibridaItem]
+    genius_consultado: bool
+    erro_genius: Optional[str] = None
+
+@app.get("/api/v1/search-hybrid", response_model=BuscaHibridaOut)
+async def search_hybrid(
+    query: str = Query(..., min_length=1),
+    limite: int = Query(10, ge=1, le=50),
+):
+    """
+    Busca no catálogo local e só recorre ao Genius quando não há
+    resultados locais suficientes. Itens locais trazem `id`; os do Genius,
+    `genius_id`.
+    """
+    if not GENIUS_ACCESS_TOKEN:
+        # Sem Genius configurado ainda dá para responder com o catálogo local
+        return await busca_hibrida.buscar(query, limite, min_local=0)
+    return await busca_hibrida.buscar(query, limite)
+
+class GeniusLoteIn(BaseModel):
+    queries: List[str] = Field(min_length=1, max_length=MAX_IDS_LOTE)
+
+@app.post("/api/v1/search-genius/batch")
+async def search_genius_batch(data: GeniusLoteIn):
+    """
+    Resolve muitos títulos no Genius de uma vez (ferramentas de importação).
+    As consultas rodam em paralelo com concorrência limitada; cada item
+    traz seus resultados ou o erro, sem derrubar o lote inteiro.
+    """
+    if not GENIUS_ACCESS_TOKEN:
+        raise HTTPException(status_code=500, detail="API do Genius não configurada no servidor.")
+
+    resultados = await genius.buscar_lote(data.queries)
+    return {
+        "resultados": resultados,
+        "ok": sum(1 for r in resultados if r["ok"]),
+        "falhas": sum(1 for r in resultados if not r["ok"]),
+        "disjuntor": genius.disjuntor.estado(),
+    }
 
-    except httpx.HTTPStatusError as e:
-        raise HTTPException(
-            status_code=e.response.status_code, 
-            detail=f"Erro ao buscar no Genius: {e.response.text}"
-        )
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Erro interno: {str(e)}")
 # ----------------------------- Reviews -------------------------------------
 # Mantendo o design atual do DB: Review.musica = NOME da música (string)
 class ReviewIn(BaseModel):
@@ -253,8 +578,17 @@ def row_to_review(row: Tuple) -> ReviewOut:
     )
 
 @app.get("/musicas/{id}/reviews", response_model=List[ReviewOut])
-def list_reviews_by_musica(id: int):
+def list_reviews_by_musica(id: int, fields: Optional[str] = Query(None, description=DESCRICAO_FIELDS)):
+    projecao = _projecao(fields, CAMPOS_REVIEW)
     m = get_musica(id)
+
+    if projecao:
+        colunas, _ = projecao
+        reviews = linhas_para_dicts(colunas, listarReviewsPorMusica(m.nome, colunas))
+        if "autor" in colunas:
+            for r in reviews:
+                r["autor"] = r["autor"] or "Usuário Deletado"
+        return JSONResponse(reviews)
     
     rows = listarReviewsPorMusica(m.nome)
     
@@ -280,7 +614,7 @@ def create_review_for_musica(id: int, data: ReviewIn, current_user: tuple = Depe
 @app.get("/musicas/{id}/rating")
 def rating_by_musica(id: int):
     m = get_musica(id)
-    with get_connection() as con:
+    with get_read_connection() as con:
         cur = con.cursor()
         cur.execute("SELECT AVG(nota), COUNT(*) FROM Review WHERE musica=?", (m.nome,))
         avg, cnt = cur.fetchone()
@@ -469,9 +803,38 @@ def toggle_like(id: int, current_user: tuple = Depends(get_current_user)):
     novo_estado = alternar_curtida(user_id, m.nome)
     return {"is_liked": novo_estado}
 
+class CurtidasStatusOut(BaseModel):
+    is_liked: Dict[int, bool]
+
+@app.get("/usuarios/me/curtidas/status", response_model=CurtidasStatusOut)
+def get_my_likes_status(
+    ids: str = Query(..., description=f"Ids de músicas separados por vírgula (máx. {MAX_IDS_LOTE})"),
+    current_user: tuple = Depends(get_current_user),
+):
+    """Estado de curtida de várias músicas de uma vez (uma única consulta)."""
+    musica_ids = parse_ids(ids)
+    curtidas = verificar_curtidas_em_lote(current_user[0], musica_ids)
+    return CurtidasStatusOut(is_liked={mid: mid in curtidas for mid in musica_ids})
+
+def _curtidas_projetadas(user_id: int, colunas: dict) -> JSONResponse:
+    itens = linhas_para_dicts(colunas, listar_musicas_curtidas(user_id, colunas))
+    # Mesmos valores padrão da resposta completa
+    padroes = {"album": "Single", "data_lancamento": "", "url_imagem": "", "user_rating": 0}
+    for item in itens:
+        for campo, padrao in padroes.items():
+            if campo in item and not item[campo]:
+                item[campo] = padrao
+    return JSONResponse(itens)
+
 @app.get("/usuarios/me/curtidas", response_model=List[MusicaProfileOut])
-def get_my_likes(current_user: tuple = Depends(get_current_user)):
+def get_my_likes(
+    fields: Optional[str] = Query(None, description=DESCRICAO_FIELDS),
+    current_user: tuple = Depends(get_current_user),
+):
     """Retorna a lista de músicas favoritas do usuário com a nota pessoal."""
+    projecao = _projecao(fields, CAMPOS_CURTIDA)
+    if projecao:
+        return _curtidas_projetadas(current_user[0], projecao[0])
     try:
         user_id = current_user[0]
         rows = listar_musicas_curtidas(user_id)
@@ -498,11 +861,14 @@ def get_my_likes(current_user: tuple = Depends(get_current_user)):
 # --- Adicione logo abaixo de get_my_likes ---
 
 @app.get("/usuarios/{user_id}/curtidas", response_model=List[MusicaProfileOut])
-def get_user_likes(user_id: int):
+def get_user_likes(user_id: int, fields: Optional[str] = Query(None, description=DESCRICAO_FIELDS)):
     """
     Retorna as músicas favoritas de QUALQUER usuário pelo ID.
     Útil para o Perfil Público.
     """
+    projecao = _projecao(fields, CAMPOS_CURTIDA)
+    if projecao:
+        return _curtidas_projetadas(user_id, projecao[0])
     try:
         # Reusa a mesma lógica do banco de dados que já funciona
         rows = listar_musicas_curtidas(user_id)
@@ -527,12 +893,53 @@ def get_user_likes(user_id: int):
         print(f"ERRO NO BACKEND: {e}")
         raise HTTPException(status_code=500, detail=str(e))
     
+@app.get("/usuarios/me/exportar")
+def export_my_data(
+    formato: str = Query("ndjson", pattern="^(ndjson|csv)$"),
+    gzip: bool = Query(False, description="Arquivo .gz em vez de texto puro"),
+    apos: Optional[str] = Query(None, description="cursor da última linha recebida, para retomar"),
+    current_user: tuple = Depends(get_current_user),
+):
+    """Reviews, curtidas, listas e faixas das listas do usuário logado, em streaming."""
+    try:
+        inicio = exportacao.validar_cursor(apos, usuario=True)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return _resposta_exportacao(
+        exportacao.lotes_usuario(current_user[0], inicio), formato, exportacao.COLUNAS_USUARIO, gzip,
+        f"hitnote-{current_user[2]}",
+    )
+
 # --- SEGUIDORES ---
 
 @app.get("/usuarios/busca", response_model=List[UsuarioPublico])
-def search_users(q: str):
-    """Busca usuários pelo nome."""
-    rows = pesquisar_usuarios(q)
+def search_users(
+    response: Response,
+    q: str,
+    cursor: Optional[str] = Query(None, description="Valor do header X-Next-Cursor da página anterior"),
+    limite: int = Query(20, ge=1, le=100),
+    current_user: Optional[tuple] = Depends(get_current_user_optional),
+):
+    """
+    Busca usuários por prefixo de username ou de palavra do nome, ranqueados
+    por correspondência e número de seguidores. O cursor da próxima página
+    vem no header X-Next-Cursor; com token, is_following vem resolvido.
+    """
+    try:
+        apos = decodificar_cursor(cursor, 3, (int, int, int)) if cursor else None
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    rows = pesquisar_usuarios(q, limite + 1, apos)
+    if len(rows) > limite:
+        rows = rows[:limite]
+        ultima = rows[-1]
+        response.headers["X-Next-Cursor"] = codificar_cursor(ultima[5], ultima[6], ultima[0])
+
+    seguindo = set()
+    if current_user:
+        seguindo = verificar_seguindo_em_lote(current_user[0], [row[0] for row in rows])
+
     resultados = []
     for row in rows:
         resultados.append({
@@ -541,7 +948,7 @@ def search_users(q: str):
             "username": row[2],
             "url_foto": row[3],
             "biografia": row[4],
-            "is_following": False 
+            "is_following": row[0] in seguindo
         })
     return resultados
 
@@ -565,9 +972,11 @@ def toggle_follow_route(id: int, current_user: tuple = Depends(get_current_user)
     meu_id = current_user[0]
     try:
         novo_estado = alternar_seguir(meu_id, id)
-        return {"is_following": novo_estado}
     except ValueError as e:
         raise HTTPException(status_code=400, detail=str(e))
+    if novo_estado is None:
+        raise HTTPException(status_code=404, detail="Usuário não encontrado")
+    return {"is_following": novo_estado}
     
 # --- LISTAS (PLAYLISTS) ---
 
@@ -592,9 +1001,17 @@ class ListaItemOut(BaseModel):
     album: str
     url_imagem: Optional[str]
     adicionado_em: str
+    is_liked: Optional[bool] = None
+    media: Optional[float] = None
+    qtde_reviews: Optional[int] = None
 
 class ListaFullOut(ListaOut):
     items: List[ListaItemOut]
+    next_cursor: Optional[str] = None
+
+class ListaItemsPage(BaseModel):
+    items: List[ListaItemOut]
+    next_cursor: Optional[str] = None
 
 @app.post("/listas", response_model=ListaOut, status_code=201)
 def create_lista_route(data: ListaIn, current_user: tuple = Depends(get_current_user)):
@@ -666,18 +1083,37 @@ def update_lista_route(lista_id: int, data: ListaIn, current_user: Optional[Tupl
         descricao=data.descricao,
         url_capa=lista_recarregada[3],
         publica=data.publica,
-        song_count=0, 
+        song_count=lista_recarregada[7], 
         usuario_id=user_id
     )
 
-@app.get("/listas/{lista_id}", response_model=ListaFullOut)
-def get_lista_details(lista_id: int):
-    """Retorna os detalhes da lista e suas músicas."""
-    lista = obter_lista_por_id(lista_id)
-    if not lista:
-        raise HTTPException(status_code=404, detail="Lista não encontrada")
-    
-    musicas_raw = obter_musicas_da_lista(lista_id)
+def _montar_pagina_lista(lista_id: int, limite: int, cursor: Optional[str], current_user, with_rating: bool, projecao=None):
+    """
+    Uma página de faixas da lista (ordem da lista) e o cursor da próxima.
+    Com `projecao` (de `fields=`), só as colunas pedidas saem do banco.
+    """
+    try:
+        apos = decodificar_cursor(cursor, 2, ((int, float), int)) if cursor else None
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    colunas = projecao[0] if projecao else None
+    # Busca uma linha a mais só para saber se existe próxima página
+    musicas_raw = obter_musicas_da_lista(lista_id, limite + 1, apos, colunas)
+    next_cursor = None
+    if len(musicas_raw) > limite:
+        musicas_raw = musicas_raw[:limite]
+        ultima = musicas_raw[-1]
+        # id é a primeira coluna e a posicao, a última
+        next_cursor = codificar_cursor(ultima[-1], ultima[0])
+
+    if projecao:
+        items = linhas_para_dicts(colunas, musicas_raw)
+        for item in items:
+            if "adicionado_em" in item:
+                item["adicionado_em"] = str(item["adicionado_em"])
+        _completar_extras(items, projecao[1], current_user)
+        return items, next_cursor
     
     items = []
     for m in musicas_raw:
@@ -691,7 +1127,35 @@ def get_lista_details(lista_id: int):
             "adicionado_em": str(m[6])
         })
 
-    return {
+    if current_user:
+        curtidas = verificar_curtidas_em_lote(current_user[0], [item["id"] for item in items])
+        for item in items:
+            item["is_liked"] = item["id"] in curtidas
+
+    if with_rating:
+        medias = obterMediasEmLote([item["id"] for item in items])
+        for item in items:
+            item["media"], item["qtde_reviews"] = medias.get(item["id"], (None, 0))
+
+    return items, next_cursor
+
+@app.get("/listas/{lista_id}", response_model=ListaFullOut)
+def get_lista_details(
+    lista_id: int,
+    limite: int = Query(100, ge=1, le=500, description="Faixas na primeira página; o restante via next_cursor"),
+    with_rating: bool = Query(False, description="Inclui média e quantidade de reviews de cada música"),
+    fields: Optional[str] = Query(None, description="Campos das faixas, separados por vírgula. O id sempre vem."),
+    current_user: Optional[tuple] = Depends(get_current_user_optional),
+):
+    """Retorna os detalhes da lista e a primeira página de músicas."""
+    projecao = _projecao(fields, CAMPOS_LISTA_MUSICA, EXTRAS_MUSICA)
+    lista = obter_lista_por_id(lista_id)
+    if not lista:
+        raise HTTPException(status_code=404, detail="Lista não encontrada")
+    
+    items, next_cursor = _montar_pagina_lista(lista_id, limite, None, current_user, with_rating, projecao)
+
+    resposta = {
         "id": lista[0],
         "nome": lista[1],
         "descricao": lista[2],
@@ -699,8 +1163,44 @@ def get_lista_details(lista_id: int):
         "publica": bool(lista[4]),
         "usuario_id": lista[6], 
         "items": items,
-        "song_count": len(items)
+        "next_cursor": next_cursor,
+        "song_count": lista[7]
     }
+    return JSONResponse(resposta) if projecao else resposta
+
+@app.get("/listas/{lista_id}/musicas", response_model=ListaItemsPage)
+def get_lista_musicas(
+    lista_id: int,
+    cursor: Optional[str] = Query(None, description="next_cursor da página anterior"),
+    limite: int = Query(100, ge=1, le=500),
+    with_rating: bool = Query(False, description="Inclui média e quantidade de reviews de cada música"),
+    fields: Optional[str] = Query(None, description="Campos das faixas, separados por vírgula. O id sempre vem."),
+    current_user: Optional[tuple] = Depends(get_current_user_optional),
+):
+    """Faixas da lista paginadas por cursor (range scan por posição)."""
+    projecao = _projecao(fields, CAMPOS_LISTA_MUSICA, EXTRAS_MUSICA)
+    if not obter_lista_por_id(lista_id):
+        raise HTTPException(status_code=404, detail="Lista não encontrada")
+    items, next_cursor = _montar_pagina_lista(lista_id, limite, cursor, current_user, with_rating, projecao)
+    resposta = {"items": items, "next_cursor": next_cursor}
+    return JSONResponse(resposta) if projecao else resposta
+
+class PosicaoIn(BaseModel):
+    antes_de: Optional[int] = None  # id da música que ficará logo depois; None = fim da lista
+
+@app.put("/listas/{lista_id}/musicas/{musica_id}/posicao", status_code=204)
+def move_music_in_list(lista_id: int, musica_id: int, data: PosicaoIn, current_user: tuple = Depends(get_current_user)):
+    """Reordena uma faixa da lista (uma única escrita na maioria dos casos)."""
+    lista = obter_lista_por_id(lista_id)
+    if not lista:
+        raise HTTPException(404, "Lista não encontrada")
+
+    if lista[6] != current_user[0]:
+        raise HTTPException(403, "Você não é dono desta lista")
+
+    if not mover_musica_lista(lista_id, musica_id, data.antes_de):
+        raise HTTPException(404, "Música não encontrada na lista")
+    return
 
 @app.post("/listas/{lista_id}/musicas/{musica_id}", status_code=201)
 def add_music_to_list(lista_id: int, musica_id: int, current_user: tuple = Depends(get_current_user)):
@@ -712,7 +1212,8 @@ def add_music_to_list(lista_id: int, musica_id: int, current_user: tuple = Depen
     if lista[6] != current_user[0]: 
         raise HTTPException(403, "Você não é dono desta lista")
 
-    adicionar_musica_lista(lista_id, musica_id)
+    if not adicionar_musica_lista(lista_id, musica_id):
+        raise HTTPException(404, "Música não encontrada")
     return {"msg": "Adicionado com sucesso"}
 
 @app.delete("/listas/{lista_id}/musicas/{musica_id}", status_code=204)
@@ -729,6 +1230,129 @@ def remove_music_from_list(lista_id: int, musica_id: int, current_user: tuple =
     remover_musica_lista(lista_id, musica_id)
     return
 
+# ----------------------------- Álbuns -------------------------------------
+class AlbumOut(BaseModel):
+    id: int
+    nome: str
+    artista: Optional[str] = None
+    media: Optional[float] = None
+    qtde_musicas: int = 0
+    qtde_reviews: int = 0
+    duracao: Optional[str] = None
+    genero: Optional[str] = None
+
+class AlbumPage(BaseModel):
+    items: List[AlbumOut]
+    next_cursor: Optional[str] = None
+
+class AlbumFullOut(AlbumOut):
+    musicas: List[MusicaOut]
+
+def _row_to_album(r) -> dict:
+    return {
+        "id": r[0], "nome": r[1], "artista": r[2] or None, "media": r[3],
+        "qtde_musicas": r[4], "qtde_reviews": r[5], "duracao": r[6], "genero": r[7],
+    }
+
+@app.get("/albums", response_model=AlbumPage)
+def list_albums(
+    cursor: Optional[str] = Query(None, description="next_cursor da página anterior"),
+    limite: int = Query(20, ge=1, le=100),
+    artista: Optional[str] = Query(None, description="Só os álbuns deste artista"),
+    ordem: str = Query("nome", pattern="^(nome|nota)$", description="nome (artista, álbum) ou nota (maior média primeiro)"),
+):
+    """Álbuns derivados do catálogo, com média e contagens já calculadas."""
+    try:
+        tipos = ((int, float), int) if ordem == "nota" else (str, str)
+        apos = decodificar_cursor(cursor, 2, tipos) if cursor else None
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    rows = listar_albums(limite + 1, apos, artista, ordem)
+    next_cursor = None
+    if len(rows) > limite:
+        ultima = rows[limite - 1]
+        next_cursor = codificar_cursor(ultima[3], ultima[0]) if ordem == "nota" else codificar_cursor(ultima[2], ultima[1])
+    return {"items": [_row_to_album(r) for r in rows[:limite]], "next_cursor": next_cursor}
+
+@app.get("/albums/{album_id}", response_model=AlbumFullOut)
+def get_album(album_id: int):
+    """Álbum pela PK e suas faixas por idx_musica_album."""
+    album, faixas = obter_album(album_id)
+    if album is None:
+        raise HTTPException(status_code=404, detail="Álbum não encontrado")
+    return {**_row_to_album(album), "musicas": rows_to_musicas(faixas)}
+
+# ----------------------------- Artistas -------------------------------------
+class ArtistaOut(BaseModel):
+    id: int
+    nome: str
+    qtde_musicas: int = 0
+    media: Optional[float] = None
+    qtde_reviews: int = 0
+    qtde_curtidas: int = 0
+    popularidade: int = 0
+
+class ArtistaPage(BaseModel):
+    items: List[ArtistaOut]
+    next_cursor: Optional[str] = None
+
+class TopMusicaOut(BaseModel):
+    id: int
+    nome: str
+    album: Optional[str] = None
+    url_imagem: Optional[str] = None
+    curtidas: int = 0
+    reviews: int = 0
+    media: Optional[float] = None
+
+class AlbumResumoOut(BaseModel):
+    id: int
+    nome: str
+    media: Optional[float] = None
+    qtde_musicas: int = 0
+
+class ArtistaFullOut(ArtistaOut):
+    top_musicas: List[TopMusicaOut]
+    albums: List[AlbumResumoOut]
+
+def _row_to_artista(r) -> dict:
+    return {
+        "id": r[0], "nome": r[1], "qtde_musicas": r[2], "media": r[3],
+        "qtde_reviews": r[4], "qtde_curtidas": r[5], "popularidade": r[6],
+    }
+
+@app.get("/artistas", response_model=ArtistaPage)
+def list_artistas(
+    cursor: Optional[str] = Query(None, description="next_cursor da página anterior"),
+    limite: int = Query(20, ge=1, le=100),
+    ordem: str = Query("nome", pattern="^(nome|popularidade)$", description="nome ou popularidade (curtidas + reviews)"),
+    prefixo: Optional[str] = Query(None, description="Só artistas cujo nome começa com isto"),
+):
+    """Diretório de artistas com contagens, média e curtidas já materializadas."""
+    try:
+        tipos = (int, int) if ordem == "popularidade" else (str,)
+        apos = decodificar_cursor(cursor, len(tipos), tipos) if cursor else None
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    rows = listar_artistas(limite + 1, apos, ordem, prefixo)
+    next_cursor = None
+    if len(rows) > limite:
+        ultima = rows[limite - 1]
+        next_cursor = codificar_cursor(ultima[6], ultima[0]) if ordem == "popularidade" else codificar_cursor(ultima[1])
+    return {"items": [_row_to_artista(r) for r in rows[:limite]], "next_cursor": next_cursor}
+
+@app.get("/artistas/{artista_id}", response_model=ArtistaFullOut)
+def get_artista(artista_id: int):
+    """Artista pela PK, faixas mais populares (pré-calculadas) e álbuns por idx_album_artista_nome."""
+    artista, top, albums = obter_artista(artista_id)
+    if artista is None:
+        raise HTTPException(status_code=404, detail="Artista não encontrado")
+    return {
+        **_row_to_artista(artista),
+        "top_musicas": top,
+        "albums": [{"id": a[0], "nome": a[1], "media": a[2], "qtde_musicas": a[3]} for a in albums],
+    }
+
 # ----------------------------- Feed -------------------------------------
 class ActivityItemOut(BaseModel):
     id: str 
@@ -743,4 +1367,101 @@ class ActivityItemOut(BaseModel):
 def get_user_feed_route(user_id: int):
     """Retorna a atividade recente (reviews e listas) de um usuário."""
     feed = obter_feed_usuario(user_id)
-    return feed
\ No newline at end of file
+    return feed
+
+class TimelineItemOut(BaseModel):
+    id: int
+    autor_id: int
+    autor: Optional[str] = None
+    tipo: str
+    acao: str
+    target_id: Optional[int] = None
+    nota: Optional[float] = None
+    comentario: Optional[str] = None
+    data_criacao: Optional[str] = None
+
+class TimelinePage(BaseModel):
+    items: List[TimelineItemOut]
+    next_cursor: Optional[str] = None
+
+@app.get("/usuarios/me/timeline", response_model=TimelinePage)
+def get_my_timeline(
+    cursor: Optional[str] = Query(None, description="next_cursor da página anterior"),
+    limite: int = Query(20, ge=1, le=100),
+    current_user: tuple = Depends(get_current_user),
+):
+    """Atividades de quem o usuário logado segue (e dele mesmo), mais recentes primeiro."""
+    try:
+        antes_de = decodificar_cursor(cursor, 1)[0] if cursor else None
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if antes_de is not None and not isinstance(antes_de, int):
+        raise HTTPException(status_code=400, detail="Cursor inválido")
+    linhas = obter_timeline(current_user[0], limite, antes_de)
+    items = [
+        {
+            "id": l[0], "autor_id": l[1], "autor": l[2], "tipo": l[3], "target_id": l[4],
+            "acao": l[5], "nota": l[6], "comentario": l[7],
+            "data_criacao": datetime.fromtimestamp(l[8], timezone.utc).isoformat() if l[8] else None,
+        }
+        for l in linhas
+    ]
+    next_cursor = codificar_cursor(linhas[-1][0]) if len(linhas) == limite else None
+    return {"items": items, "next_cursor": next_cursor}
+
+# ----------------------------- Página de perfil -------------------------------------
+class PaginaUsuarioOut(BaseModel):
+    perfil: UsuarioPerfilFull
+    listas: List[ListaOut]
+    listas_tem_mais: bool = False
+    curtidas: List[MusicaProfileOut]
+    atividade: List[ActivityItemOut]
+
+@app.get("/usuarios/{user_id}/pagina", response_model=PaginaUsuarioOut)
+def get_user_page(
+    user_id: int,
+    limite_listas: int = Query(20, ge=1, le=100),
+    limite_curtidas: int = Query(12, ge=0, le=100),
+    current_user: Optional[tuple] = Depends(get_current_user_optional),
+):
+    """
+    Tudo o que a tela de perfil mostra numa resposta só: perfil com
+    estatísticas, primeira página de listas, prévia das curtidas e
+    atividade recente. Uma conexão, um snapshot: os números batem entre
+    si mesmo com escritas concorrentes. As consultas são todas pontuais
+    em índices; rodá-las em paralelo exigiria uma conexão (e um snapshot)
+    por consulta, então vão em sequência na mesma thread.
+    """
+    meu_id = current_user[0] if current_user else None
+    with snapshot_leitura() as conexao:
+        perfil = obter_perfil_publico(user_id, conexao=conexao)
+        if not perfil:
+            raise HTTPException(status_code=404, detail="Usuário não encontrado")
+        perfil["stats"] = obter_estatisticas_usuario(user_id, conexao=conexao)
+        perfil["is_following"] = bool(meu_id) and meu_id != user_id and verificar_seguindo(meu_id, user_id, conexao=conexao)
+        listas = listar_listas_usuario(
+            user_id, apenas_publicas=meu_id != user_id, limite=limite_listas + 1, conexao=conexao
+        )
+        curtidas = listar_musicas_curtidas(user_id, limite=limite_curtidas, conexao=conexao) if limite_curtidas else []
+        atividade = obter_feed_usuario(user_id, conexao=conexao)
+
+    return {
+        "perfil": perfil,
+        "listas": [
+            {
+                "id": row[0], "nome": row[1], "descricao": row[2], "url_capa": row[3],
+                "publica": bool(row[4]), "song_count": row[6], "usuario_id": user_id,
+            }
+            for row in listas[:limite_listas]
+        ],
+        "listas_tem_mais": len(listas) > limite_listas,
+        "curtidas": [
+            {
+                "id": row[0], "nome": row[1], "artista": row[2], "album": row[3] or "Single",
+                "data_lancamento": row[4] or "", "url_imagem": row[5] or "",
+                "user_rating": row[6] if row[6] is not None else 0,
+            }
+            for row in curtidas
+        ],
+        "atividade": atividade,
+    }
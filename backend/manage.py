@@ -0,0 +1,121 @@
+"""
+Comandos de manutenção do HitNote (rodar a partir de backend/).
+
+    python manage.py reconciliar-listas
+    python manage.py reindexar-autocomplete
+    python manage.py backup
+    python manage.py aparar-timelines
+    python manage.py reconciliar-albums
+    python manage.py reconciliar-artistas
+    python manage.py manutencao
+    python manage.py ativar-auto-vacuum
+"""
+import argparse
+
+from bd import executar_escrita, escritor
+from crud.crud_lista import reconciliar_contagens_listas
+from crud.crud_feed import aparar_timelines, FEED_MAX_ENTRADAS
+from crud.crud_album import reconciliar_albums
+from crud.crud_artista import reconciliar_artistas
+import autocomplete
+import backup
+import manutencao
+
+
+def cmd_reconciliar_listas(args):
+    corrigidas = reconciliar_contagens_listas()
+    print(f"Listas com contagem corrigida: {corrigidas}")
+
+
+def cmd_reindexar_autocomplete(args):
+    total = executar_escrita(autocomplete.reindexar_tudo)
+    print(f"Músicas indexadas: {total}")
+
+
+def cmd_backup(args):
+    relatorio = backup.fazer_backup(manter=args.manter)
+    print(
+        f"Backup {relatorio['arquivo']}: {relatorio['bytes']} bytes, {relatorio['paginas']} páginas "
+        f"em {relatorio['passos']} passos, {relatorio['duracao_s']}s ({relatorio['mb_por_s']} MB/s), "
+        f"integridade {relatorio['integridade']}"
+    )
+    for arquivo in relatorio["removidos"]:
+        print(f"Removido pela retenção: {arquivo}")
+
+
+def cmd_aparar_timelines(args):
+    removidas = aparar_timelines(args.maximo)
+    print(f"Entradas de timeline removidas: {removidas}")
+
+
+def cmd_reconciliar_albums(args):
+    total = executar_escrita(lambda con: reconciliar_albums(con.cursor()))
+    print(f"Álbuns recalculados: {total}")
+
+
+def cmd_reconciliar_artistas(args):
+    total = executar_escrita(lambda con: reconciliar_artistas(con.cursor()))
+    print(f"Artistas recalculados: {total}")
+
+
+def cmd_manutencao(args):
+    relatorio = manutencao.executar_manutencao()
+    print(f"Estatísticas: {relatorio['estatisticas']['modo']} ({relatorio['estatisticas']['duracao_s']}s)")
+    for tabela, orfaos in relatorio["orfaos"].items():
+        print(f"Órfãos em {tabela}: {orfaos['removidas']} removidos de {orfaos['verificadas']} em {orfaos['lotes']} lotes")
+    vacuum = relatorio["vacuum"]
+    if vacuum["ativo"]:
+        print(f"Vacuum incremental: {vacuum['paginas_liberadas']} páginas liberadas em {vacuum['passos']} passos")
+    else:
+        print(f"Vacuum incremental desligado ({vacuum['paginas_livres']} páginas livres); veja ativar-auto-vacuum")
+    checkpoint = relatorio["checkpoint"]
+    print(
+        f"Checkpoint {checkpoint['modo']}: WAL {checkpoint['wal_bytes_antes']} -> {checkpoint['wal_bytes_depois']} bytes"
+        + (" (leitores ativos, incompleto)" if checkpoint["ocupado"] else "")
+    )
+    print(f"Total: {relatorio['duracao_s']}s")
+
+
+def cmd_ativar_auto_vacuum(args):
+    modo = executar_escrita(manutencao.ativar_auto_vacuum)
+    print("auto_vacuum incremental ativo" if modo == 2 else f"auto_vacuum = {modo}")
+
+
+def main():
+    # Reindexar, reconciliar e VACUUM podem passar do prazo das requisições: aqui espera o escritor sem limite
+    escritor.timeout_resultado = None
+    parser = argparse.ArgumentParser(description="Comandos de manutenção do HitNote")
+    sub = parser.add_subparsers(dest="comando", required=True)
+
+    p = sub.add_parser("reconciliar-listas", help="Corrige qtd_musicas das listas a partir de ListaMusica")
+    p.set_defaults(func=cmd_reconciliar_listas)
+
+    p = sub.add_parser("reindexar-autocomplete", help="Reconstrói o índice de trigramas do autocomplete")
+    p.set_defaults(func=cmd_reindexar_autocomplete)
+
+    p = sub.add_parser("backup", help="Snapshot online do banco (API de backup do SQLite) com verificação de integridade")
+    p.add_argument("--manter", type=int, default=backup.BACKUP_RETENCAO, help="Quantos snapshots manter")
+    p.set_defaults(func=cmd_backup)
+
+    p = sub.add_parser("aparar-timelines", help="Mantém só as entradas mais recentes de cada timeline")
+    p.add_argument("--maximo", type=int, default=FEED_MAX_ENTRADAS, help="Entradas mantidas por usuário")
+    p.set_defaults(func=cmd_aparar_timelines)
+
+    p = sub.add_parser("reconciliar-albums", help="Recalcula contagem de faixas e nota média de todos os álbuns")
+    p.set_defaults(func=cmd_reconciliar_albums)
+
+    p = sub.add_parser("reconciliar-artistas", help="Recalcula faixas, nota média e curtidas de todos os artistas")
+    p.set_defaults(func=cmd_reconciliar_artistas)
+
+    p = sub.add_parser("manutencao", help="ANALYZE/optimize, limpeza de órfãos, vacuum incremental e checkpoint do WAL")
+    p.set_defaults(func=cmd_manutencao)
+
+    p = sub.add_parser("ativar-auto-vacuum", help="Converte o banco para auto_vacuum incremental (VACUUM completo; bloqueia escritas)")
+    p.set_defaults(func=cmd_ativar_auto_vacuum)
+
+    args = parser.parse_args()
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()
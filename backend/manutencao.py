@@ -0,0 +1,302 @@
+"""
+Manutenção periódica do banco, em passos curtos que nunca seguram o
+escritor por muito tempo:
+
+- estatísticas do planejador: ANALYZE limitado por `analysis_limit` na
+  primeira vez, depois `PRAGMA optimize` (só reanalisa o que mudou);
+- limpeza de órfãos (ListaMusica sem lista ou música; Curtida e Review
+  de usuário que não existe mais): a busca é feita numa conexão de leitura, em janelas por rowid,
+  e o escritor só apaga um lote por vez, conferindo a condição de novo;
+- checkpoint do WAL: PASSIVE normalmente, TRUNCATE quando o arquivo passa
+  de MANUTENCAO_WAL_MAX_MB, esperando leitores por no máximo
+  MANUTENCAO_ESPERA_CHECKPOINT_MS;
+- `incremental_vacuum` em passos de MANUTENCAO_VACUUM_PAGINAS páginas,
+  se o banco tiver auto_vacuum incremental (bancos novos já nascem assim;
+  antigos convertem com `python manage.py ativar-auto-vacuum`).
+"""
+import fcntl
+import os
+import threading
+import time
+
+from bd import DB_PATH, executar_escrita, get_read_connection
+from config import (
+    MANUTENCAO_INTERVALO_MIN,
+    MANUTENCAO_ANALISE_LIMITE,
+    MANUTENCAO_WAL_MAX_MB,
+    MANUTENCAO_ESPERA_CHECKPOINT_MS,
+    MANUTENCAO_VACUUM_PAGINAS,
+    MANUTENCAO_LOTE_ORFAOS,
+    MANUTENCAO_PAUSA_MS,
+)
+from crud.crud_feed import remover_atividade
+
+# Passos de vacuum por rodada: o resto fica para a próxima
+_VACUUM_MAX_PASSOS = 64
+
+class ManutencaoEmAndamento(Exception):
+    """Outra manutenção (deste ou de outro worker) está rodando."""
+
+# Tabela -> condição de órfão sobre o alias `t`. Review e Curtida ligam à
+# música pelo nome, que muda quando a faixa é renomeada: nome sem música
+# correspondente não é órfão (apagar perderia dados dos usuários), só o usuário conta.
+_ORFAOS = {
+    "ListaMusica": """
+        NOT EXISTS (SELECT 1 FROM Lista l WHERE l.id = t.lista_id)
+        OR NOT EXISTS (SELECT 1 FROM Musica m WHERE m.id = t.musica_id)
+    """,
+    "Curtida": "NOT EXISTS (SELECT 1 FROM Usuario u WHERE u.id = t.usuario_id)",
+    "Review": "NOT EXISTS (SELECT 1 FROM Usuario u WHERE u.id = t.usuario_id)",
+}
+
+def _pausa(pausa_ms: float):
+    if pausa_ms > 0:
+        time.sleep(pausa_ms / 1000)
+
+# ------------------ Passos ------------------
+
+def atualizar_estatisticas(conexao, limite: int = MANUTENCAO_ANALISE_LIMITE) -> dict:
+    """No escritor: ANALYZE (primeira vez) ou PRAGMA optimize, ambos com amostragem limitada."""
+    conexao.execute(f"PRAGMA analysis_limit = {int(limite)}")
+    tem_estatisticas = conexao.execute(
+        "SELECT 1 FROM sqlite_master WHERE name = 'sqlite_stat1'"
+    ).fetchone() is not None
+    if tem_estatisticas:
+        conexao.execute("PRAGMA optimize").fetchall()
+        return {"modo": "optimize"}
+    conexao.execute("ANALYZE")
+    return {"modo": "analyze"}
+
+def _apagar_orfaos(conexao, tabela: str, rowids: list) -> int:
+    marcadores = ",".join("?" * len(rowids))
+    # Confere de novo no escritor: a linha pode ter deixado de ser órfã desde a leitura
+    orfao = _ORFAOS[tabela].replace("t.", f"{tabela}.")
+    condicao = f"rowid IN ({marcadores}) AND ({orfao})"
+    if tabela == "Review":
+        # Reviews apagadas também saem do feed, como em crud_review.deletarDados
+        ids = [r[0] for r in conexao.execute(f"DELETE FROM Review WHERE {condicao} RETURNING id", rowids).fetchall()]
+        for review_id in ids:
+            remover_atividade(conexao, "review", review_id)
+        return len(ids)
+    return conexao.execute(f"DELETE FROM {tabela} WHERE {condicao}", rowids).rowcount
+
+def purgar_orfaos(tabela: str, lote: int = MANUTENCAO_LOTE_ORFAOS, pausa_ms: float = MANUTENCAO_PAUSA_MS) -> dict:
+    """
+    Percorre `tabela` por rowid em janelas de `lote` linhas na conexão de
+    leitura e manda ao escritor só os rowids órfãos de cada janela.
+    """
+    condicao = _ORFAOS[tabela]
+    ultimo, verificadas, removidas, lotes = 0, 0, 0, 0
+    with get_read_connection() as leitura:
+        while True:
+            janela = leitura.execute(
+                f"""
+                SELECT t.rowid, ({condicao}) FROM {tabela} t
+                WHERE t.rowid > ? ORDER BY t.rowid LIMIT ?
+                """,
+                (ultimo, lote)
+            ).fetchall()
+            if not janela:
+                break
+            ultimo = janela[-1][0]
+            verificadas += len(janela)
+            orfaos = [rowid for rowid, orfao in janela if orfao]
+            if orfaos:
+                removidas += executar_escrita(_apagar_orfaos, tabela, orfaos)
+                lotes += 1
+                _pausa(pausa_ms)
+    return {"verificadas": verificadas, "removidas": removidas, "lotes": lotes}
+
+def _tamanho_wal() -> int:
+    try:
+        return os.path.getsize(f"{DB_PATH}-wal")
+    except OSError:
+        return 0
+
+def _checkpoint(conexao, modo: str, espera_ms: int):
+    # Espera curta por leitores: o escritor fica parado enquanto isto roda
+    anterior = conexao.execute("PRAGMA busy_timeout").fetchone()[0]
+    conexao.execute(f"PRAGMA busy_timeout = {int(espera_ms)}")
+    try:
+        return conexao.execute(f"PRAGMA wal_checkpoint({modo})").fetchone()
+    finally:
+        conexao.execute(f"PRAGMA busy_timeout = {anterior}")
+
+def checkpoint_wal(limite_mb: float = MANUTENCAO_WAL_MAX_MB,
+                   espera_ms: int = MANUTENCAO_ESPERA_CHECKPOINT_MS) -> dict:
+    """Checkpoint do WAL; trunca o arquivo quando ele passou de `limite_mb`."""
+    antes = _tamanho_wal()
+    modo = "TRUNCATE" if antes > limite_mb * 1024 * 1024 else "PASSIVE"
+    ocupado, paginas_log, paginas_copiadas = executar_escrita(_checkpoint, modo, espera_ms)
+    return {
+        "modo": modo,
+        "wal_bytes_antes": antes,
+        "wal_bytes_depois": _tamanho_wal(),
+        # ocupado = 1: algum leitor impediu o checkpoint completo; fica para a próxima rodada
+        "ocupado": bool(ocupado),
+        "paginas_log": paginas_log,
+        "paginas_copiadas": paginas_copiadas,
+    }
+
+def _vacuum_passo(conexao, paginas: int) -> int:
+    # incremental_vacuum libera uma página por passo do comando; execute() dá um
+    # passo só (o pragma não tem colunas), executescript() roda até o fim
+    conexao.executescript(f"PRAGMA incremental_vacuum({int(paginas)})")
+    return conexao.execute("PRAGMA freelist_count").fetchone()[0]
+
+def vacuum_incremental(paginas: int = MANUTENCAO_VACUUM_PAGINAS, pausa_ms: float = MANUTENCAO_PAUSA_MS,
+                       max_passos: int = _VACUUM_MAX_PASSOS) -> dict:
+    """Devolve páginas livres ao sistema de arquivos em passos curtos no escritor."""
+    with get_read_connection() as leitura:
+        auto_vacuum = leitura.execute("PRAGMA auto_vacuum").fetchone()[0]
+        livres = leitura.execute("PRAGMA freelist_count").fetchone()[0]
+    if auto_vacuum != 2:
+        return {"ativo": False, "paginas_livres": livres, "passos": 0}
+    antes, passos = livres, 0
+    while livres > 0 and passos < max_passos:
+        livres = executar_escrita(_vacuum_passo, paginas)
+        passos += 1
+        _pausa(pausa_ms)
+    return {"ativo": True, "paginas_livres": livres, "paginas_liberadas": antes - livres, "passos": passos}
+
+def ativar_auto_vacuum(conexao) -> int:
+    """
+    Converte um banco antigo para auto_vacuum incremental. Exige um VACUUM
+    completo, que reescreve o arquivo inteiro e bloqueia as escritas até
+    terminar: rodar fora do horário de uso (manage.py). Retorna o modo final.
+    """
+    conexao.execute("PRAGMA auto_vacuum = INCREMENTAL")
+    conexao.execute("VACUUM")
+    return conexao.execute("PRAGMA auto_vacuum").fetchone()[0]
+
+def executar_manutencao() -> dict:
+    """Roda todos os passos e devolve o relatório de cada um, com a duração."""
+    relatorio = {"inicio": time.time()}
+    inicio = time.perf_counter()
+
+    def _medir(nome, funcao, *args):
+        comeco = time.perf_counter()
+        relatorio[nome] = {**funcao(*args), "duracao_s": round(time.perf_counter() - comeco, 3)}
+
+    _medir("estatisticas", executar_escrita, atualizar_estatisticas)
+    relatorio["orfaos"] = {}
+    for tabela in _ORFAOS:
+        comeco = time.perf_counter()
+        relatorio["orfaos"][tabela] = {**purgar_orfaos(tabela), "duracao_s": round(time.perf_counter() - comeco, 3)}
+    # Depois da limpeza: as páginas liberadas por ela já entram no vacuum
+    _medir("vacuum", vacuum_incremental)
+    _medir("checkpoint", checkpoint_wal)
+    relatorio["duracao_s"] = round(time.perf_counter() - inicio, 3)
+    return relatorio
+
+# ------------------ Agendador ------------------
+
+class AgendadorManutencao:
+    """
+    Thread que roda a manutenção a cada `intervalo_min` minutos. Todo worker
+    roda uma; o lock de arquivo deixa uma manutenção por vez e o mtime dele
+    marca a última rodada, então sai uma por intervalo. Também atende os
+    disparos manuais da rota de admin.
+    """
+
+    def __init__(self, intervalo_min: float):
+        self._intervalo = intervalo_min * 60
+        self._trava = f"{DB_PATH}.manutencao.lock"
+        self._thread = None
+        self._lock = threading.Lock()
+        self.em_andamento = False
+        self.ultimo_relatorio = None
+        self.ultimo_erro = None
+
+    def iniciar(self):
+        with self._lock:
+            if self._intervalo <= 0 or (self._thread is not None and self._thread.is_alive()):
+                return
+            self._thread = threading.Thread(target=self._loop, name="agendador-manutencao", daemon=True)
+            self._thread.start()
+
+    def _ultima_rodada(self) -> float | None:
+        try:
+            return os.path.getmtime(self._trava)
+        except OSError:
+            return None
+
+    def _vencido(self) -> bool:
+        ultima = self._ultima_rodada()
+        return ultima is None or time.time() - ultima >= self._intervalo
+
+    def executar(self) -> dict:
+        with self._lock:
+            if self.em_andamento:
+                raise ManutencaoEmAndamento("Já existe uma manutenção em andamento")
+            self.em_andamento = True
+        try:
+            with open(self._trava, "a") as trava:
+                try:
+                    fcntl.flock(trava, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                except BlockingIOError:
+                    raise ManutencaoEmAndamento("Já existe uma manutenção em andamento")
+                try:
+                    relatorio = executar_manutencao()
+                    os.utime(self._trava)
+                finally:
+                    fcntl.flock(trava, fcntl.LOCK_UN)
+            self.ultimo_relatorio, self.ultimo_erro = relatorio, None
+            removidas = sum(o["removidas"] for o in relatorio["orfaos"].values())
+            print(
+                f"Manutenção: {relatorio['estatisticas']['modo']}, {removidas} órfãos removidos, "
+                f"checkpoint {relatorio['checkpoint']['modo']}, em {relatorio['duracao_s']}s"
+            )
+            return relatorio
+        except ManutencaoEmAndamento:
+            raise
+        except Exception as e:
+            self.ultimo_erro = str(e)
+            raise
+        finally:
+            with self._lock:
+                self.em_andamento = False
+
+    def disparar(self):
+        """Manutenção manual em segundo plano (rota de admin)."""
+        if self.em_andamento:
+            raise ManutencaoEmAndamento("Já existe uma manutenção em andamento")
+
+        def _rodar():
+            try:
+                self.executar()
+            except Exception as e:
+                print(f"Erro na manutenção manual: {e}")
+
+        threading.Thread(target=_rodar, name="manutencao-manual", daemon=True).start()
+
+    def _loop(self):
+        while True:
+            # Confere a cada minuto (ou menos, para intervalos curtos)
+            time.sleep(min(60.0, self._intervalo))
+            try:
+                if self._vencido():
+                    self.executar()
+            except ManutencaoEmAndamento:
+                pass
+            except Exception as e:
+                print(f"Erro na manutenção agendada: {e}")
+
+    def estado(self) -> dict:
+        with get_read_connection() as leitura:
+            auto_vacuum = leitura.execute("PRAGMA auto_vacuum").fetchone()[0]
+            livres = leitura.execute("PRAGMA freelist_count").fetchone()[0]
+            paginas = leitura.execute("PRAGMA page_count").fetchone()[0]
+        return {
+            "intervalo_min": self._intervalo / 60,
+            "em_andamento": self.em_andamento,
+            "ultima_rodada": self._ultima_rodada(),
+            "ultimo_relatorio": self.ultimo_relatorio,
+            "ultimo_erro": self.ultimo_erro,
+            "auto_vacuum_incremental": auto_vacuum == 2,
+            "paginas": paginas,
+            "paginas_livres": livres,
+            "wal_bytes": _tamanho_wal(),
+        }
+
+agendador_manutencao = AgendadorManutencao(MANUTENCAO_INTERVALO_MIN)
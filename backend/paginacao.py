@@ -0,0 +1,29 @@
+import base64
+import json
+
+def codificar_cursor(*valores) -> str:
+    """Transforma a chave da última linha de uma página num cursor opaco."""
+    bruto = json.dumps(list(valores), separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(bruto).decode().rstrip("=")
+
+# O que pode voltar de um cursor e ir direto como parâmetro do SQLite
+_ESCALARES = (int, float, str, type(None))
+
+def decodificar_cursor(cursor: str, quantidade: int, tipos: tuple | None = None) -> list:
+    """
+    Desfaz `codificar_cursor`. Lança ValueError se o cursor for inválido,
+    não tiver `quantidade` valores, algum deles não for escalar ou, com
+    `tipos`, não for do tipo (ou tupla de tipos) esperado na posição.
+    """
+    try:
+        preenchido = cursor + "=" * (-len(cursor) % 4)
+        valores = json.loads(base64.urlsafe_b64decode(preenchido.encode()))
+    except Exception:
+        raise ValueError("Cursor inválido")
+    if not isinstance(valores, list) or len(valores) != quantidade:
+        raise ValueError("Cursor inválido")
+    if not all(isinstance(v, _ESCALARES) for v in valores):
+        raise ValueError("Cursor inválido")
+    if tipos is not None and not all(isinstance(v, t) for v, t in zip(valores, tipos)):
+        raise ValueError("Cursor inválido")
+    return valores
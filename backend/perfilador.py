@@ -0,0 +1,284 @@
+"""
+Perfilador sob demanda de uma requisição.
+
+Com PERFIL_ATIVO, um admin pede o perfil de uma requisição com o header
+`X-Perfil: 1` (ou `?_perfil=1`) junto do X-Admin-Token; com PERFIL_AMOSTRA
+> 0 uma fração aleatória das requisições também é perfilada. A resposta
+sai normalmente, com o header X-Perfil-Id, e o perfil fica num anel com
+os PERFIL_ANEL mais recentes (rotas /admin/perfis).
+
+O perfil tem:
+- amostras de pilha a cada PERFIL_INTERVALO_MS, só das threads que
+  estão atendendo esta requisição (o event loop enquanto a pilha passa
+  por este middleware e a thread do AnyIO que roda a rota síncrona), no
+  formato "folded" (`a;b;c N`) que flamegraph.pl e speedscope leem;
+- cada comando SQL das conexões de get_connection/get_read_connection,
+  com a duração, e cada escrita enviada ao escritor único.
+
+Desligado, o middleware nem é instalado; ligado, os ganchos de bd.py só
+são preenchidos enquanto há requisição sendo perfilada.
+"""
+import contextvars
+import hmac
+import itertools
+import os
+import random
+import sqlite3 as lite
+import sys
+import threading
+import time
+from collections import Counter, deque
+
+import bd
+from config import ADMIN_TOKEN, PERFIL_AMOSTRA, PERFIL_ANEL, PERFIL_INTERVALO_MS
+
+_atual = contextvars.ContextVar("perfil_atual", default=None)
+_ids = itertools.count(1)
+_RAIZ = os.path.dirname(os.path.abspath(__file__))
+_MAX_SQL = 500
+_MAX_PROFUNDIDADE = 200
+
+class Perfil:
+    def __init__(self, metodo: str, caminho: str, motivo: str):
+        self.id = next(_ids)
+        self.metodo = metodo
+        self.caminho = caminho
+        self.motivo = motivo
+        self.rota = None
+        self.status = None
+        self.inicio = time.time()
+        self.duracao_ms = None
+        self.amostras = Counter()
+        self.n_amostras = 0
+        self.sql = []
+        self._lock = threading.Lock()
+
+    def registrar_sql(self, comando: str, ms: float, linhas: int | None = None):
+        with self._lock:
+            if len(self.sql) < _MAX_SQL:
+                self.sql.append({"sql": " ".join(comando.split()), "ms": round(ms, 3), "linhas": linhas})
+
+    def folded(self) -> str:
+        return "".join(f"{pilha} {n}\n" for pilha, n in self.amostras.most_common())
+
+    def resumo(self) -> dict:
+        return {
+            "id": self.id,
+            "metodo": self.metodo,
+            "caminho": self.caminho,
+            "rota": self.rota,
+            "motivo": self.motivo,
+            "status": self.status,
+            "inicio": self.inicio,
+            "duracao_ms": self.duracao_ms,
+            "amostras": self.n_amostras,
+            "sql_total": len(self.sql),
+            "sql_ms": round(sum(c["ms"] for c in self.sql), 3),
+        }
+
+    def detalhe(self) -> dict:
+        mais_quentes = Counter()
+        for pilha, n in self.amostras.items():
+            mais_quentes[pilha.rsplit(";", 1)[-1]] += n
+        return {
+            **self.resumo(),
+            "intervalo_ms": PERFIL_INTERVALO_MS,
+            "sql": self.sql,
+            # Funções onde a thread estava (self time) nas amostras
+            "topo": [{"funcao": f, "amostras": n} for f, n in mais_quentes.most_common(20)],
+        }
+
+# ------------------ SQL medido ------------------
+
+class _CursorMedido(lite.Cursor):
+    def execute(self, comando, parametros=()):
+        inicio = time.perf_counter()
+        try:
+            return super().execute(comando, parametros)
+        finally:
+            self._registrar(comando, inicio)
+
+    def executemany(self, comando, sequencia):
+        inicio = time.perf_counter()
+        try:
+            return super().executemany(comando, sequencia)
+        finally:
+            self._registrar(comando, inicio)
+
+    def _registrar(self, comando, inicio):
+        perfil = _atual.get()
+        if perfil is not None:
+            # rowcount só vale para INSERT/UPDATE/DELETE
+            linhas = self.rowcount if self.rowcount >= 0 else None
+            perfil.registrar_sql(comando, (time.perf_counter() - inicio) * 1000, linhas)
+
+class _ConexaoMedida(lite.Connection):
+    # Connection.execute também passa por aqui (cria o cursor com self.cursor())
+    def cursor(self, factory=_CursorMedido):
+        return super().cursor(factory)
+
+def _gancho_conexao():
+    return _ConexaoMedida if _atual.get() is not None else None
+
+def _gancho_escrita(executar, funcao, args, agrupar):
+    perfil = _atual.get()
+    if perfil is None:
+        return executar(funcao, *args, agrupar=agrupar)
+    inicio = time.perf_counter()
+    try:
+        return executar(funcao, *args, agrupar=agrupar)
+    finally:
+        nome = getattr(funcao, "__qualname__", repr(funcao))
+        perfil.registrar_sql(f"[escritor] {nome}", (time.perf_counter() - inicio) * 1000)
+
+_ativos = 0
+_lock_ganchos = threading.Lock()
+
+def _instalar_ganchos():
+    global _ativos
+    with _lock_ganchos:
+        _ativos += 1
+        bd.gancho_conexao, bd.gancho_escrita = _gancho_conexao, _gancho_escrita
+
+def _remover_ganchos():
+    global _ativos
+    with _lock_ganchos:
+        _ativos -= 1
+        if _ativos == 0:
+            bd.gancho_conexao = bd.gancho_escrita = None
+
+# ------------------ Amostragem de pilhas ------------------
+
+def _nome_quadro(quadro) -> str:
+    codigo = quadro.f_code
+    arquivo = codigo.co_filename
+    if arquivo.startswith(_RAIZ):
+        arquivo = os.path.relpath(arquivo, _RAIZ)
+    else:
+        arquivo = os.path.basename(arquivo)
+    return f"{codigo.co_name} ({arquivo}:{codigo.co_firstlineno})"
+
+def _pilha(quadro, ate=None) -> list:
+    """Quadros do mais externo ao mais interno, parando em `ate` (exclusive)."""
+    quadros = []
+    while quadro is not None and quadro is not ate and len(quadros) < _MAX_PROFUNDIDADE:
+        quadros.append(quadro)
+        quadro = quadro.f_back
+    return quadros[::-1]
+
+def _contexto_da_thread(quadro):
+    """
+    Na thread de trabalho do AnyIO, o quadro do laço guarda o Context
+    copiado da requisição (`context.run(func, *args)`); é por ele que se
+    sabe a que requisição a thread está servindo agora.
+    """
+    while quadro is not None:
+        if quadro.f_code.co_name == "run" and "anyio" in quadro.f_code.co_filename:
+            contexto = quadro.f_locals.get("context")
+            return contexto, quadro
+        quadro = quadro.f_back
+    return None, None
+
+class _Amostrador(threading.Thread):
+    def __init__(self, perfil: Perfil, thread_loop: int, quadro_middleware):
+        super().__init__(name=f"perfilador-{perfil.id}", daemon=True)
+        self.perfil = perfil
+        self.thread_loop = thread_loop
+        self.quadro_middleware = quadro_middleware
+        self.parar = threading.Event()
+
+    def run(self):
+        intervalo = PERFIL_INTERVALO_MS / 1000
+        proprio = threading.get_ident()
+        while not self.parar.wait(intervalo):
+            for ident, quadro in sys._current_frames().items():
+                if ident == proprio:
+                    continue
+                if ident == self.thread_loop:
+                    pilha = _pilha(quadro)
+                    if self.quadro_middleware not in pilha:
+                        continue
+                    pilha = pilha[pilha.index(self.quadro_middleware):]
+                else:
+                    contexto, quadro_run = _contexto_da_thread(quadro)
+                    if contexto is None or contexto.get(_atual) is not self.perfil:
+                        continue
+                    pilha = _pilha(quadro, ate=quadro_run)
+                if pilha:
+                    self.perfil.amostras[";".join(_nome_quadro(q) for q in pilha)] += 1
+                    self.perfil.n_amostras += 1
+
+# ------------------ Anel e middleware ------------------
+
+class AnelPerfis:
+    def __init__(self, tamanho: int):
+        self._perfis = deque(maxlen=tamanho)
+        self._lock = threading.Lock()
+
+    def guardar(self, perfil: Perfil):
+        with self._lock:
+            self._perfis.append(perfil)
+
+    def listar(self) -> list:
+        with self._lock:
+            return [p.resumo() for p in reversed(self._perfis)]
+
+    def obter(self, perfil_id: int) -> Perfil | None:
+        with self._lock:
+            return next((p for p in self._perfis if p.id == perfil_id), None)
+
+anel = AnelPerfis(PERFIL_ANEL)
+
+def _pedido_admin(scope) -> bool:
+    cabecalhos = dict(scope["headers"])
+    pedido = cabecalhos.get(b"x-perfil") == b"1" or b"_perfil=1" in scope.get("query_string", b"")
+    if not pedido or not ADMIN_TOKEN:
+        return False
+    token = cabecalhos.get(b"x-admin-token", b"").decode("latin-1")
+    return hmac.compare_digest(token, ADMIN_TOKEN)
+
+class PerfilMiddleware:
+    """Middleware ASGI: perfila as requisições pedidas pelo admin ou sorteadas."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"].startswith("/admin/perfis"):
+            await self.app(scope, receive, send)
+            return
+        if _pedido_admin(scope):
+            motivo = "admin"
+        elif PERFIL_AMOSTRA > 0 and random.random() < PERFIL_AMOSTRA:
+            motivo = "amostra"
+        else:
+            await self.app(scope, receive, send)
+            return
+
+        perfil = Perfil(scope["method"], scope["path"], motivo)
+
+        async def _send(mensagem):
+            if mensagem["type"] == "http.response.start":
+                perfil.status = mensagem["status"]
+                mensagem = {
+                    **mensagem,
+                    "headers": [*mensagem.get("headers", []), (b"x-perfil-id", str(perfil.id).encode())],
+                }
+            await send(mensagem)
+
+        token = _atual.set(perfil)
+        _instalar_ganchos()
+        amostrador = _Amostrador(perfil, threading.get_ident(), sys._getframe())
+        amostrador.start()
+        inicio = time.perf_counter()
+        try:
+            await self.app(scope, receive, _send)
+        finally:
+            perfil.duracao_ms = round((time.perf_counter() - inicio) * 1000, 3)
+            amostrador.parar.set()
+            amostrador.join(timeout=0.05)
+            _remover_ganchos()
+            _atual.reset(token)
+            rota = scope.get("route")
+            perfil.rota = getattr(rota, "path", None)
+            anel.guardar(perfil)
@@ -0,0 +1,35 @@
+"""
+Projeção de campos (`?fields=id,nome,artista`) resolvida no SQL.
+
+Cada consulta declara um dicionário {campo público: expressão SQL} com as
+colunas que aceita; `escolher_campos` valida o pedido contra ele e
+devolve só as expressões escolhidas, que a consulta coloca no SELECT.
+Nenhum texto do cliente chega ao SQL.
+"""
+
+def escolher_campos(fields: str | None, disponiveis: dict, obrigatorios=("id",), extras=()) -> tuple | None:
+    """
+    Retorna (colunas, extras_pedidos):
+      colunas  -> {campo: expressão SQL}, na ordem de `disponiveis`, sempre
+                  com os `obrigatorios` (necessários para cursores/lotes);
+      extras   -> conjunto dos campos calculados fora do SELECT (ex.:
+                  is_liked, media) que foram pedidos.
+    Retorna None quando `fields` não foi informado (resposta completa).
+    Lança ValueError com campos desconhecidos.
+    """
+    if fields is None:
+        return None
+    pedidos = {f.strip() for f in fields.split(",") if f.strip()}
+    desconhecidos = pedidos - set(disponiveis) - set(extras)
+    if desconhecidos:
+        validos = ", ".join([*disponiveis, *extras])
+        raise ValueError(f"Campos desconhecidos: {', '.join(sorted(desconhecidos))}. Válidos: {validos}")
+    colunas = {
+        campo: expressao for campo, expressao in disponiveis.items()
+        if campo in pedidos or campo in obrigatorios
+    }
+    return colunas, pedidos & set(extras)
+
+def linhas_para_dicts(colunas: dict, linhas) -> list:
+    nomes = list(colunas)
+    return [dict(zip(nomes, linha)) for linha in linhas]
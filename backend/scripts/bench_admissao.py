@@ -0,0 +1,125 @@
+"""
+Latência de rotas baratas sob sobrecarga, com e sem controle de admissão.
+
+Uso (a partir de backend/):
+    python -m scripts.bench_admissao --musicas 200000 --segundos 10
+
+Roda a aplicação (pela interface ASGI, no mesmo threadpool do AnyIO que
+o uvicorn usaria) num banco temporário duas vezes, em processos
+separados: ADMISSAO_ATIVA=1 e 0.
+Em cada rodada, muitos clientes fazem buscas LIKE lentas e logins
+(bcrypt) em paralelo. Enquanto isso, um cliente mede GET /musicas/{id}.
+Mostra o p50/p99 da rota barata e quantas requisições pesadas foram
+recusadas.
+"""
+import argparse
+import asyncio
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+import httpx
+
+BACKEND = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def _preparar_banco(pasta: str, musicas: int):
+    codigo = (
+        "from esquema import garantir_esquema; garantir_esquema()\n"
+        "from bd import get_connection\n"
+        "with get_connection() as con:\n"
+        f"    con.executemany('INSERT INTO Musica(nome, artista, album, data_lancamento, url_imagem) VALUES(?,?,?,?,?)',"
+        f" ((f'musica {{i}}', f'artista {{i % 500}}', f'album {{i % 2000}}', '2020', '') for i in range({musicas})))\n"
+    )
+    subprocess.run([sys.executable, "-c", codigo], cwd=pasta, env={**os.environ, "PYTHONPATH": BACKEND}, check=True)
+
+
+def _percentil(valores, q):
+    valores = sorted(valores)
+    return valores[min(len(valores) - 1, int(len(valores) * q))] * 1000 if valores else float("nan")
+
+
+async def _rodada(segundos: float, clientes: int, musicas: int) -> dict:
+    import main as aplicacao
+
+    status = {}
+    latencias = []
+    transporte = httpx.ASGITransport(app=aplicacao.app)
+    async with aplicacao.app.router.lifespan_context(aplicacao.app), \
+            httpx.AsyncClient(transport=transporte, base_url="http://bench", timeout=60) as cliente:
+        fim = time.monotonic() + segundos
+        await cliente.post("/usuarios", json={"nome": "Bench", "username": "bench", "email": "b@b", "senha": "123"})
+
+        async def _pesado(n):
+            i = 0
+            while time.monotonic() < fim:
+                if n % 4 == 0:
+                    r = await cliente.post("/login", json={"email": "b@b", "senha": "123"})
+                else:
+                    r = await cliente.get("/musicas", params={"q": f"z{n}{i}", "page_size": 10})
+                status[r.status_code] = status.get(r.status_code, 0) + 1
+                i += 1
+
+        async def _barato():
+            i = 0
+            while time.monotonic() < fim:
+                inicio = time.perf_counter()
+                r = await cliente.get(f"/musicas/{i % musicas + 1}")
+                if r.status_code == 200:
+                    latencias.append(time.perf_counter() - inicio)
+                i += 1
+                await asyncio.sleep(0.01)
+
+        await asyncio.gather(_barato(), *(_pesado(n) for n in range(clientes)))
+        admissao = (await cliente.get("/health/admissao")).json()
+    return {"p50": _percentil(latencias, 0.5), "p99": _percentil(latencias, 0.99),
+            "status_pesadas": status, "admissao": admissao}
+
+
+def _executar_rodada(args):
+    """Processo filho: uma rodada com a configuração do ambiente."""
+    os.chdir(args.pasta)
+    sys.path.insert(0, BACKEND)
+    resultado = asyncio.run(_rodada(args.segundos, args.clientes, args.musicas))
+    ativa = resultado["admissao"]["ativa"]
+    print(f"admissão {'ligada' if ativa else 'desligada'}: GET /musicas/{{id}} "
+          f"p50 {resultado['p50']:.1f} ms | p99 {resultado['p99']:.1f} ms | pesadas por status {resultado['status_pesadas']}")
+    if ativa:
+        for nome in ("auth", "busca", "leitura"):
+            c = resultado["admissao"]["classes"][nome]
+            print(f"    {nome}: admitidos {c['admitidos']}, recusados fila {c['rejeitados_fila']} / "
+                  f"espera {c['rejeitados_espera']}, espera média {c['espera_media_ms']:.0f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--musicas", type=int, default=200000)
+    parser.add_argument("--segundos", type=float, default=10)
+    parser.add_argument("--clientes", type=int, default=64)
+    parser.add_argument("--pasta", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.pasta:
+        _executar_rodada(args)
+        return
+
+    base = tempfile.mkdtemp(prefix="bench_admissao_")
+    _preparar_banco(base, args.musicas)
+
+    for ativa in ("1", "0"):
+        pasta = tempfile.mkdtemp(prefix="rodada_")
+        shutil.copy(os.path.join(base, "bd_hitnote.db"), pasta)
+        env = {**os.environ, "ADMISSAO_ATIVA": ativa, "JWT_CLIENT_SECRET": "bench",
+               "TAXA_AUTH_RAJADA": "1000000", "TAXA_AUTH_POR_S": "1000000"}
+        subprocess.run(
+            [sys.executable, "-m", "scripts.bench_admissao", "--pasta", pasta, "--segundos", str(args.segundos),
+             "--clientes", str(args.clientes), "--musicas", str(args.musicas)],
+            cwd=BACKEND, env=env, check=True,
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,80 @@
+"""
+Backup online sob carga de escrita.
+
+Uso (a partir de backend/):
+    python -m scripts.bench_backup --musicas 50000 --segundos 5
+
+Popula um banco temporário, mantém threads escrevendo pelo escritor único
+e, no meio da carga, faz um backup. Mostra o relatório do backup e a
+latência das escritas antes e durante a cópia: o snapshot deve ficar
+íntegro e as escritas não devem travar.
+"""
+import argparse
+import os
+import tempfile
+import threading
+import time
+
+
+def _percentis(valores):
+    if not valores:
+        return "sem amostras"
+    valores = sorted(valores)
+    p = lambda q: valores[min(len(valores) - 1, int(len(valores) * q))] * 1000
+    return f"n={len(valores)} p50 {p(0.5):.2f} ms | p99 {p(0.99):.2f} ms | máx {valores[-1] * 1000:.2f} ms"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--musicas", type=int, default=50000)
+    parser.add_argument("--segundos", type=float, default=5)
+    parser.add_argument("--escritores", type=int, default=4)
+    args = parser.parse_args()
+
+    os.chdir(tempfile.mkdtemp(prefix="bench_backup_"))
+    from bd import escritor, executar_escrita
+    from esquema import garantir_esquema
+    import backup
+
+    garantir_esquema()
+    escritor.iniciar()
+    executar_escrita(lambda con: con.executemany(
+        "INSERT INTO Musica(nome, artista, album, data_lancamento, url_imagem) VALUES(?,?,?,?,?)",
+        [(f"musica {i}", f"artista {i % 500}", f"album {i % 2000}", "2020", "x" * 80) for i in range(args.musicas)],
+    ))
+
+    latencias = []
+    durante_backup = threading.Event()
+    latencias_backup = []
+    parar = threading.Event()
+
+    def _escrever(n):
+        i = 0
+        while not parar.is_set():
+            inicio = time.perf_counter()
+            executar_escrita(lambda con, i=i: con.execute(
+                "UPDATE Musica SET url_imagem = ? WHERE id = ?", (f"u{n}-{i}", (i * 7919) % args.musicas + 1)
+            ))
+            (latencias_backup if durante_backup.is_set() else latencias).append(time.perf_counter() - inicio)
+            i += 1
+
+    threads = [threading.Thread(target=_escrever, args=(n,)) for n in range(args.escritores)]
+    for t in threads:
+        t.start()
+    time.sleep(args.segundos / 2)
+
+    durante_backup.set()
+    relatorio = backup.fazer_backup(pasta="backups")
+    durante_backup.clear()
+    time.sleep(args.segundos / 2)
+    parar.set()
+    for t in threads:
+        t.join()
+
+    print(f"backup: {relatorio}")
+    print(f"escritas sem backup:  {_percentis(latencias)}")
+    print(f"escritas com backup:  {_percentis(latencias_backup)}")
+
+
+if __name__ == "__main__":
+    main()
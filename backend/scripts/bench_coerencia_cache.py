@@ -0,0 +1,80 @@
+"""
+Mede a defasagem do cache entre processos (workers) no mesmo banco.
+
+Uso (a partir de backend/):
+    python -m scripts.bench_coerencia_cache --atualizacoes 50
+
+Um processo "leitor" consulta `verLinha` (com cache) em loop; o processo
+principal faz de escritor, renomeando a mesma música. Para cada
+atualização mede o tempo entre o commit e o leitor enxergar o novo nome.
+A defasagem máxima deve ficar perto de CACHE_POLL_MS.
+"""
+import argparse
+import multiprocessing as mp
+import os
+import statistics
+import tempfile
+import time
+
+
+def _leitor(pasta, esperados, vistos, parar):
+    os.chdir(pasta)
+    from crud.crud_musica import verLinha
+
+    while not parar.is_set():
+        try:
+            alvo = esperados.get(timeout=0.5)
+        except Exception:
+            continue
+        while verLinha((1,))[0][1] != alvo:
+            time.sleep(0.0005)
+        vistos.put((alvo, time.time()))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--atualizacoes", type=int, default=50)
+    args = parser.parse_args()
+
+    pasta = tempfile.mkdtemp(prefix="bench_cache_")
+    os.chdir(pasta)
+    from esquema import garantir_esquema
+    from crud.crud_musica import inserirDados, atualizarDados
+    from config import CACHE_POLL_MS
+
+    garantir_esquema()
+    inserirDados(["v0", "artista", "album", "", ""])
+
+    ctx = mp.get_context("spawn")
+    esperados, vistos, parar = ctx.Queue(), ctx.Queue(), ctx.Event()
+    proc = ctx.Process(target=_leitor, args=(pasta, esperados, vistos, parar))
+    proc.start()
+
+    # Aquece o cache do leitor com o valor inicial
+    esperados.put("v0")
+    vistos.get()
+
+    defasagens = []
+    for i in range(1, args.atualizacoes + 1):
+        nome = f"v{i}"
+        esperados.put(nome)
+        time.sleep(0.02)  # o leitor já está servindo o valor antigo do cache
+        atualizarDados([nome, "artista", "album", "", "", 1])
+        commit = time.time()
+        _, visto = vistos.get()
+        defasagens.append((visto - commit) * 1000)
+
+    parar.set()
+    proc.join()
+
+    defasagens.sort()
+    p99 = defasagens[min(len(defasagens) - 1, int(len(defasagens) * 0.99))]
+    print(f"intervalo de polling: {CACHE_POLL_MS:.0f} ms")
+    print(
+        f"defasagem entre processos: mediana {statistics.median(defasagens):.1f} ms | "
+        f"p99 {p99:.1f} ms | máx {defasagens[-1]:.1f} ms"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,56 @@
+"""
+Memória e vazão da exportação do catálogo em streaming.
+
+Uso (a partir de backend/):
+    python -m scripts.bench_exportacao --musicas 1000000 --formato csv --gzip
+
+Popula um banco temporário e consome o gerador de exportação (o mesmo
+da rota) sem guardar nada. O pico de memória deve ficar praticamente
+igual com 100 mil ou 10 milhões de linhas.
+"""
+import argparse
+import os
+import resource
+import tempfile
+import time
+
+
+def _pico_mb() -> float:
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--musicas", type=int, default=1000000)
+    parser.add_argument("--formato", choices=("ndjson", "csv"), default="ndjson")
+    parser.add_argument("--gzip", action="store_true")
+    args = parser.parse_args()
+
+    os.chdir(tempfile.mkdtemp(prefix="bench_exportacao_"))
+    from bd import get_connection
+    from esquema import garantir_esquema
+    import exportacao
+
+    garantir_esquema()
+    with get_connection() as con:
+        for inicio in range(0, args.musicas, 100000):
+            con.executemany(
+                "INSERT INTO Musica(nome, artista, album, data_lancamento, url_imagem) VALUES(?,?,?,?,?)",
+                ((f"musica {i}", f"artista {i % 500}", f"album {i % 2000}", "2020-01-01", f"https://img/{i}.jpg")
+                 for i in range(inicio, min(args.musicas, inicio + 100000))),
+            )
+    base = _pico_mb()
+
+    inicio = time.perf_counter()
+    total = 0
+    for pedaco in exportacao.gerar(exportacao.lotes_catalogo(), args.formato, exportacao.COLUNAS_CATALOGO, args.gzip):
+        total += len(pedaco)
+    duracao = time.perf_counter() - inicio
+
+    print(f"{args.musicas} linhas, {args.formato}{' + gzip' if args.gzip else ''}: {total / 1e6:.1f} MB em {duracao:.1f}s "
+          f"({args.musicas / duracao:,.0f} linhas/s)")
+    print(f"pico de memória: {base:.0f} MB antes, {_pico_mb():.0f} MB depois")
+
+
+if __name__ == "__main__":
+    main()
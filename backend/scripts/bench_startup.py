@@ -0,0 +1,76 @@
+"""
+Benchmark de cold start de um worker.
+
+Uso (a partir de backend/):
+    python -m scripts.bench_startup --rodadas 5
+
+Para cada rodada sobe um processo Python novo e mede:
+  - import de `main` (e se jose/passlib/httpx foram carregados);
+  - startup da aplicação (bootstrap do esquema) + primeira requisição.
+A primeira rodada usa um banco vazio (cria o esquema); as demais mostram
+o caminho comum, em que o bootstrap é só a checagem de versão.
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+BACKEND = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+_PROCESSO_FILHO = r"""
+import json, sys, time
+sys.path.insert(0, sys.argv[1])
+t0 = time.perf_counter()
+import main
+t1 = time.perf_counter()
+carregados = {m: m in sys.modules for m in ("jose", "passlib", "httpx")}
+from fastapi.testclient import TestClient
+t2 = time.perf_counter()
+with TestClient(main.app) as cliente:
+    t3 = time.perf_counter()
+    cliente.get("/musicas")
+    t4 = time.perf_counter()
+print(json.dumps({
+    "import_ms": (t1 - t0) * 1000,
+    "startup_ms": (t3 - t2) * 1000,
+    "primeira_req_ms": (t4 - t3) * 1000,
+    "carregados": carregados,
+}))
+"""
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rodadas", type=int, default=5)
+    args = parser.parse_args()
+
+    pasta = tempfile.mkdtemp(prefix="bench_startup_")
+    resultados = []
+    for i in range(args.rodadas):
+        saida = subprocess.run(
+            [sys.executable, "-c", _PROCESSO_FILHO, BACKEND],
+            cwd=pasta, capture_output=True, text=True, check=True,
+        )
+        r = json.loads(saida.stdout.strip().splitlines()[-1])
+        resultados.append(r)
+        rotulo = "banco vazio" if i == 0 else "esquema ok "
+        print(
+            f"rodada {i + 1} ({rotulo}): import {r['import_ms']:7.1f} ms | "
+            f"startup {r['startup_ms']:6.1f} ms | 1ª req {r['primeira_req_ms']:6.1f} ms | "
+            f"carregados no import: {', '.join(m for m, v in r['carregados'].items() if v) or 'nenhum'}"
+        )
+
+    if len(resultados) > 1:
+        quentes = resultados[1:]
+        print(
+            f"mediana (esquema ok): import {statistics.median(r['import_ms'] for r in quentes):.1f} ms | "
+            f"startup {statistics.median(r['startup_ms'] for r in quentes):.1f} ms | "
+            f"1ª req {statistics.median(r['primeira_req_ms'] for r in quentes):.1f} ms"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+"""
+Benchmark de toggles de curtida com e sem group commit.
+
+Uso (a partir de backend/):
+    python -m scripts.bench_toggles --threads 32 --segundos 5
+
+Cria um banco temporário, dispara `alternar_curtida` de várias threads e
+mostra toggles/segundo com o escritor em modo individual (um commit por
+toggle) e em modo agrupado (janela de DB_GROUP_COMMIT_MS).
+"""
+import argparse
+import os
+import tempfile
+import threading
+import time
+
+import bd
+from config import DB_GROUP_COMMIT_MS, DB_GROUP_COMMIT_MAX
+from crud.crud_musica import criarTabelaMusica
+from crud.crud_usuario import criarTabelaUsuario, alternar_curtida
+
+
+def _rodar(threads: int, segundos: float, escritor) -> tuple:
+    bd.escritor = escritor
+    escritor.iniciar()
+    contador = [0]
+    lock = threading.Lock()
+    parar = time.perf_counter() + segundos
+
+    def trabalhador(usuario_id):
+        feitos = 0
+        i = 0
+        while time.perf_counter() < parar:
+            alternar_curtida(usuario_id, f"musica {i % 50}")
+            feitos += 1
+            i += 1
+        with lock:
+            contador[0] += feitos
+
+    ts = [threading.Thread(target=trabalhador, args=(u,)) for u in range(1, threads + 1)]
+    inicio = time.perf_counter()
+    for t in ts:
+        t.start()
+    for t in ts:
+        t.join()
+    duracao = time.perf_counter() - inicio
+    return contador[0] / duracao, escritor.estatisticas()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--threads", type=int, default=32)
+    parser.add_argument("--segundos", type=float, default=5.0)
+    parser.add_argument("--janela-ms", type=float, default=DB_GROUP_COMMIT_MS)
+    parser.add_argument("--lote-max", type=int, default=DB_GROUP_COMMIT_MAX)
+    args = parser.parse_args()
+
+    os.chdir(tempfile.mkdtemp(prefix="bench_toggles_"))
+    criarTabelaMusica()
+    criarTabelaUsuario()
+
+    modos = [
+        ("individual", bd.EscritorSerial(1024)),
+        ("agrupado", bd.EscritorSerial(1024, args.janela_ms, args.lote_max)),
+    ]
+    for nome, escritor in modos:
+        taxa, stats = _rodar(args.threads, args.segundos, escritor)
+        print(
+            f"{nome:>10}: {taxa:10.0f} toggles/s | "
+            f"espera média {stats['espera_media_ms']:.2f} ms | "
+            f"média por lote {stats['media_por_lote']:.1f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,96 @@
+"""
+Servidor falso da API do Genius, para testar o proxy sem rede nem cota.
+
+Uso (a partir de backend/):
+    python -m scripts.mock_genius --porta 8765 --taxa-429 0.1 --taxa-500 0.1 --latencia-ms 50
+
+e subir a API apontando para ele:
+    GENIUS_API_URL=http://127.0.0.1:8765 GENIUS_ACCESS_TOKEN=teste uvicorn main:app
+
+Responde GET /search?q=... com hits no formato do Genius. Uma fração das
+requisições recebe 429 (com Retry-After) ou 500, para exercitar as
+retentativas e o disjuntor. --fora-do-ar responde 503 a tudo.
+"""
+import argparse
+import json
+import random
+import time
+import zlib
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+
+def _hits(q: str) -> dict:
+    base = zlib.crc32(q.encode())
+    hits = []
+    for i in range(3):
+        hits.append({
+            "result": {
+                "id": base + i,
+                "title": f"{q} ({i + 1})",
+                "primary_artist": {"name": f"Artista {base % 97}"},
+                "album": {"name": f"Álbum {base % 13}"} if i else None,
+                "release_date": "2020-01-01" if i != 2 else None,
+                "release_date_for_display": "January 1, 2020",
+                "song_art_image_thumbnail_url": f"https://images.example/{base + i}.jpg",
+            }
+        })
+    return {"meta": {"status": 200}, "response": {"hits": hits}}
+
+
+def criar_handler(args):
+    class Handler(BaseHTTPRequestHandler):
+        def _responder(self, status, corpo, headers=None):
+            dados = json.dumps(corpo).encode()
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(dados)))
+            for nome, valor in (headers or {}).items():
+                self.send_header(nome, valor)
+            self.end_headers()
+            self.wfile.write(dados)
+
+        def do_GET(self):
+            url = urlparse(self.path)
+            if url.path != "/search":
+                return self._responder(404, {"meta": {"status": 404}})
+            if args.latencia_ms:
+                time.sleep(args.latencia_ms / 1000)
+            if args.fora_do_ar:
+                return self._responder(503, {"meta": {"status": 503}})
+            sorteio = random.random()
+            if sorteio < args.taxa_429:
+                return self._responder(429, {"meta": {"status": 429}}, {"Retry-After": str(args.retry_after)})
+            if sorteio < args.taxa_429 + args.taxa_500:
+                return self._responder(500, {"meta": {"status": 500}})
+            q = parse_qs(url.query).get("q", [""])[0]
+            self._responder(200, _hits(q))
+
+        def log_message(self, formato, *valores):
+            if not args.silencioso:
+                super().log_message(formato, *valores)
+
+    return Handler
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--porta", type=int, default=8765)
+    parser.add_argument("--latencia-ms", type=float, default=0)
+    parser.add_argument("--taxa-429", type=float, default=0)
+    parser.add_argument("--taxa-500", type=float, default=0)
+    parser.add_argument("--retry-after", type=int, default=1)
+    parser.add_argument("--fora-do-ar", action="store_true")
+    parser.add_argument("--silencioso", action="store_true")
+    args = parser.parse_args()
+
+    servidor = ThreadingHTTPServer(("127.0.0.1", args.porta), criar_handler(args))
+    print(f"Genius falso em http://127.0.0.1:{args.porta}")
+    try:
+        servidor.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,137 @@
+"""
+Reproduz um log do gravador de tráfego (gravacao.py) contra uma instância.
+
+Uso (a partir de backend/):
+    python -m scripts.replay trafego.jsonl --base-url http://localhost:8000 --velocidade 2 --concorrencia 32
+
+Cada linha é reenviada no mesmo instante relativo do log, dividido por
+`--velocidade` (0 = o mais rápido possível), com no máximo
+`--concorrencia` requisições em voo. Tokens não são gravados: requisições
+que tinham um sujeito autenticado usam `--token` (ou o token mapeado para
+aquele hash em `--tokens`, um JSON {"t:hash": "jwt"}).
+
+No fim, por rota (método + template), mostra p50/p95/p99 do replay, os
+mesmos percentis da gravação original e a diferença, além de quantas
+respostas vieram com status diferente do gravado.
+"""
+import argparse
+import asyncio
+import json
+import time
+
+import httpx
+
+
+def _percentil(valores, q):
+    valores = sorted(valores)
+    return valores[min(len(valores) - 1, int(len(valores) * q))] if valores else float("nan")
+
+
+def _carregar(caminho: str, limite: int | None) -> list:
+    registros = []
+    with open(caminho, encoding="utf-8") as f:
+        for linha in f:
+            if linha.strip():
+                registros.append(json.loads(linha))
+                if limite and len(registros) >= limite:
+                    break
+    registros.sort(key=lambda r: r["t"])
+    return registros
+
+
+async def _reproduzir(registros, base_url, velocidade, concorrencia, token, tokens, timeout):
+    resultados = []
+    semaforo = asyncio.Semaphore(concorrencia)
+
+    async with httpx.AsyncClient(base_url=base_url, timeout=timeout) as cliente:
+        inicio_log = registros[0]["t"]
+        inicio = time.monotonic()
+
+        async def _uma(registro):
+            async with semaforo:
+                headers = {}
+                sujeito = registro.get("sujeito", "")
+                jwt = tokens.get(sujeito) or (token if sujeito.startswith("t:") else None)
+                if jwt:
+                    headers["Authorization"] = f"Bearer {jwt}"
+                url = registro["caminho"] + (f"?{registro['query']}" if registro.get("query") else "")
+                comeco = time.perf_counter()
+                try:
+                    r = await cliente.request(
+                        registro["metodo"], url, headers=headers,
+                        json=registro["corpo"] if registro.get("corpo") is not None else None,
+                    )
+                    status = r.status_code
+                except httpx.HTTPError:
+                    status = 0
+                resultados.append((registro, status, (time.perf_counter() - comeco) * 1000))
+
+        tarefas = []
+        for registro in registros:
+            if velocidade > 0:
+                espera = (registro["t"] - inicio_log) / velocidade - (time.monotonic() - inicio)
+                if espera > 0:
+                    await asyncio.sleep(espera)
+            tarefas.append(asyncio.create_task(_uma(registro)))
+        await asyncio.gather(*tarefas)
+        duracao = time.monotonic() - inicio
+    return resultados, duracao
+
+
+def _relatorio(resultados, duracao):
+    por_rota = {}
+    for registro, status, ms in resultados:
+        chave = f"{registro['metodo']} {registro.get('rota') or registro['caminho']}"
+        rota = por_rota.setdefault(chave, {"replay": [], "original": [], "divergentes": 0, "erros": 0})
+        rota["replay"].append(ms)
+        rota["original"].append(registro["ms"])
+        rota["divergentes"] += status != registro["status"]
+        rota["erros"] += status == 0 or status >= 500
+
+    print(f"{len(resultados)} requisições em {duracao:.1f}s ({len(resultados) / max(duracao, 1e-9):.1f}/s)\n")
+    cabecalho = f"{'rota':<45} {'n':>6}  {'p50':>8} {'p95':>8} {'p99':>8}  {'orig p50':>8} {'orig p99':>8}  {'Δp50':>7} {'Δp99':>7}  {'≠status':>7}"
+    print(cabecalho)
+    print("-" * len(cabecalho))
+    for chave, rota in sorted(por_rota.items(), key=lambda item: -len(item[1]["replay"])):
+        replay, original = rota["replay"], rota["original"]
+        p50, p95, p99 = (_percentil(replay, q) for q in (0.5, 0.95, 0.99))
+        o50, o99 = _percentil(original, 0.5), _percentil(original, 0.99)
+        print(
+            f"{chave[:45]:<45} {len(replay):>6}  {p50:>8.1f} {p95:>8.1f} {p99:>8.1f}  {o50:>8.1f} {o99:>8.1f}  "
+            f"{(p50 - o50) / o50 * 100 if o50 else 0:>+6.0f}% {(p99 - o99) / o99 * 100 if o99 else 0:>+6.0f}%  "
+            f"{rota['divergentes']:>7}"
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("log", help="Arquivo JSONL gravado (GRAVACAO_ARQUIVO)")
+    parser.add_argument("--base-url", default="http://localhost:8000")
+    parser.add_argument("--velocidade", type=float, default=1.0, help="Multiplicador do ritmo original; 0 = sem pausas")
+    parser.add_argument("--concorrencia", type=int, default=16)
+    parser.add_argument("--token", help="JWT usado nas requisições que eram autenticadas")
+    parser.add_argument("--tokens", help="JSON {sujeito: jwt} para preservar usuários distintos")
+    parser.add_argument("--limite", type=int, help="Reproduz só as primeiras N linhas")
+    parser.add_argument("--apenas-leitura", action="store_true", help="Ignora POST/PUT/PATCH/DELETE")
+    parser.add_argument("--timeout", type=float, default=30)
+    args = parser.parse_args()
+
+    registros = _carregar(args.log, args.limite)
+    if args.apenas_leitura:
+        registros = [r for r in registros if r["metodo"] in ("GET", "HEAD")]
+    if not registros:
+        print("Nada para reproduzir.")
+        return
+    tokens = {}
+    if args.tokens:
+        with open(args.tokens, encoding="utf-8") as f:
+            tokens = json.load(f)
+
+    resultados, duracao = asyncio.run(_reproduzir(
+        registros, args.base_url, args.velocidade, args.concorrencia, args.token, tokens, args.timeout
+    ))
+    _relatorio(resultados, duracao)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,301 @@
+"""
+Fila de tarefas em segundo plano, persistida na tabela Tarefa.
+
+O efeito colateral de uma escrita (fan-out da timeline, pré-busca de
+capa...) é enfileirado com `enfileirar(conexao, ...)` DENTRO da transação
+da escrita principal: ou os dois são gravados, ou nenhum. A rota responde
+logo após o commit e threads trabalhadoras executam as tarefas depois.
+
+Entrega é "pelo menos uma vez": uma tarefa pode rodar de novo se o
+processo cair no meio (a reserva expira após TAREFAS_RESERVA_S), então os
+manipuladores devem ser idempotentes. Falhas são repetidas com backoff
+exponencial com jitter; esgotadas as tentativas (ou com FalhaPermanente)
+a tarefa fica "morta" para inspeção e reenfileiramento manual.
+
+A `chave` opcional deduplica: enquanto a tarefa com a mesma chave existir
+(pendente, em execução ou concluída dentro da retenção) outra igual é
+ignorada.
+"""
+import json
+import random
+import threading
+import time
+from collections import deque
+
+from bd import get_connection, get_read_connection, executar_escrita, leitura
+from config import (
+    TAREFAS_THREADS,
+    TAREFAS_MAX_TENTATIVAS,
+    TAREFAS_BACKOFF_BASE,
+    TAREFAS_BACKOFF_MAX,
+    TAREFAS_RESERVA_S,
+    TAREFAS_RETENCAO_H,
+)
+
+_INTERVALO_OCIOSO = 1.0
+
+class FalhaPermanente(Exception):
+    """Erro que não adianta repetir: a tarefa vai direto para mortas."""
+
+# tipo -> função(payload: dict)
+_manipuladores = {}
+
+def tarefa(tipo: str):
+    """Decorador que registra o manipulador de um tipo de tarefa."""
+    def _registrar(funcao):
+        _manipuladores[tipo] = funcao
+        return funcao
+    return _registrar
+
+def criarTabelaTarefa():
+    with get_connection() as conexao:
+        cur = conexao.cursor()
+        cur.execute("""
+            CREATE TABLE IF NOT EXISTS Tarefa(
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                tipo TEXT NOT NULL,
+                payload TEXT NOT NULL,
+                chave TEXT UNIQUE,
+                estado TEXT NOT NULL DEFAULT 'pendente',
+                tentativas INTEGER NOT NULL DEFAULT 0,
+                max_tentativas INTEGER NOT NULL,
+                disponivel_em REAL NOT NULL,
+                criada_em REAL NOT NULL,
+                reservada_ate REAL,
+                concluida_em REAL,
+                erro TEXT
+            )
+        """)
+        # Próxima tarefa a reservar: range scan por estado e horário
+        cur.execute("CREATE INDEX IF NOT EXISTS idx_tarefa_estado ON Tarefa(estado, disponivel_em)")
+
+def enfileirar(conexao, tipo: str, payload: dict, chave: str | None = None,
+               atraso_s: float = 0.0, max_tentativas: int = TAREFAS_MAX_TENTATIVAS):
+    """
+    Enfileira na transação de escrita corrente (chamar dentro do escritor).
+    Retorna o id, ou None se já existe tarefa com a mesma `chave`.
+    """
+    agora = time.time()
+    cur = conexao.execute(
+        """
+        INSERT OR IGNORE INTO Tarefa(tipo, payload, chave, max_tentativas, disponivel_em, criada_em)
+        VALUES(?,?,?,?,?,?)
+        """,
+        (tipo, json.dumps(payload), chave, max_tentativas, agora + atraso_s, agora)
+    )
+    if cur.rowcount == 0:
+        return None
+    processador.acordar()
+    return cur.lastrowid
+
+def _ha_disponivel(agora: float) -> bool:
+    """
+    Confere numa conexão de leitura se há o que reservar. Com a fila vazia
+    as threads ociosas não mandam nada ao escritor (nem commit, nem fsync,
+    nem mudança de data_version acordando os leitores do cache).
+    """
+    with leitura() as conexao:
+        return conexao.execute(
+            """
+            SELECT 1 FROM Tarefa
+            WHERE (estado = 'pendente' AND disponivel_em <= ?)
+               OR (estado = 'executando' AND reservada_ate < ?)
+            LIMIT 1
+            """,
+            (agora, agora)
+        ).fetchone() is not None
+
+def _reservar(conexao, agora: float):
+    """Marca a próxima tarefa disponível como em execução e a devolve."""
+    return conexao.execute(
+        """
+        UPDATE Tarefa
+        SET estado = 'executando', tentativas = tentativas + 1, reservada_ate = ?
+        WHERE id = (
+            SELECT id FROM Tarefa
+            WHERE (estado = 'pendente' AND disponivel_em <= ?)
+               OR (estado = 'executando' AND reservada_ate < ?)
+            ORDER BY disponivel_em
+            LIMIT 1
+        )
+        RETURNING id, tipo, payload, tentativas, max_tentativas, disponivel_em
+        """,
+        (agora + TAREFAS_RESERVA_S, agora, agora)
+    ).fetchone()
+
+def _concluir(conexao, tarefa_id: int):
+    conexao.execute(
+        "UPDATE Tarefa SET estado = 'concluida', concluida_em = ?, erro = NULL WHERE id = ?",
+        (time.time(), tarefa_id)
+    )
+
+def _falhar(conexao, tarefa_id: int, erro: str, tentar_de_novo_em: float | None):
+    if tentar_de_novo_em is None:
+        conexao.execute(
+            "UPDATE Tarefa SET estado = 'morta', concluida_em = ?, erro = ? WHERE id = ?",
+            (time.time(), erro, tarefa_id)
+        )
+    else:
+        conexao.execute(
+            "UPDATE Tarefa SET estado = 'pendente', disponivel_em = ?, reservada_ate = NULL, erro = ? WHERE id = ?",
+            (tentar_de_novo_em, erro, tarefa_id)
+        )
+
+def _limpar(conexao, antes_de: float) -> int:
+    """Apaga tarefas concluídas antigas (as mortas ficam até alguém olhar)."""
+    return conexao.execute(
+        "DELETE FROM Tarefa WHERE estado = 'concluida' AND concluida_em < ?", (antes_de,)
+    ).rowcount
+
+def _backoff(tentativas: int) -> float:
+    espera = min(TAREFAS_BACKOFF_MAX, TAREFAS_BACKOFF_BASE * 2 ** (tentativas - 1))
+    return espera * random.uniform(0.5, 1.0)
+
+class ProcessadorTarefas:
+    """Threads que reservam (pelo escritor) e executam tarefas, medidas."""
+
+    def __init__(self, threads: int):
+        self._n_threads = threads
+        self._threads = []
+        self._lock = threading.Lock()
+        self._evento = threading.Event()
+        self._ultima_limpeza = 0.0
+        self.executadas = 0
+        self.falhas = 0
+        self.mortas = 0
+        self._atraso_total = 0.0
+        self._atraso_max = 0.0
+        self._duracao_total = 0.0
+        self._concluidas_recentes = deque(maxlen=10000)
+        self._por_tipo = {}
+
+    def iniciar(self):
+        with self._lock:
+            self._threads = [t for t in self._threads if t.is_alive()]
+            for n in range(len(self._threads), self._n_threads):
+                thread = threading.Thread(target=self._loop, name=f"tarefas-{n}", daemon=True)
+                thread.start()
+                self._threads.append(thread)
+
+    def acordar(self):
+        self._evento.set()
+
+    def _loop(self):
+        while True:
+            try:
+                if not self.executar_uma():
+                    self._evento.wait(_INTERVALO_OCIOSO)
+                    self._evento.clear()
+                    self._talvez_limpar()
+            except Exception as e:
+                print(f"Erro no processador de tarefas: {e}")
+                time.sleep(_INTERVALO_OCIOSO)
+
+    def executar_uma(self) -> bool:
+        """Reserva e executa uma tarefa. False se não havia nenhuma disponível."""
+        agora = time.time()
+        if not _ha_disponivel(agora):
+            return False
+        reservada = executar_escrita(_reservar, agora)
+        if reservada is None:
+            return False
+        tarefa_id, tipo, payload, tentativas, max_tentativas, disponivel_em = reservada
+        atraso = max(0.0, agora - disponivel_em)
+
+        inicio = time.perf_counter()
+        erro = None
+        permanente = False
+        try:
+            manipulador = _manipuladores.get(tipo)
+            if manipulador is None:
+                raise FalhaPermanente(f"Tipo de tarefa desconhecido: {tipo}")
+            manipulador(json.loads(payload))
+        except FalhaPermanente as e:
+            erro, permanente = str(e) or type(e).__name__, True
+        except Exception as e:
+            erro = f"{type(e).__name__}: {e}"
+        duracao = time.perf_counter() - inicio
+
+        if erro is None:
+            executar_escrita(_concluir, tarefa_id)
+        else:
+            morreu = permanente or tentativas >= max_tentativas
+            executar_escrita(_falhar, tarefa_id, erro, None if morreu else time.time() + _backoff(tentativas))
+            print(f"Tarefa {tarefa_id} ({tipo}) falhou na tentativa {tentativas}: {erro}")
+
+        with self._lock:
+            self.executadas += 1
+            self._atraso_total += atraso
+            self._atraso_max = max(self._atraso_max, atraso)
+            self._duracao_total += duracao
+            self._concluidas_recentes.append(time.monotonic())
+            contagem = self._por_tipo.setdefault(tipo, {"executadas": 0, "falhas": 0})
+            contagem["executadas"] += 1
+            if erro is not None:
+                self.falhas += 1
+                contagem["falhas"] += 1
+                self.mortas += morreu
+        return True
+
+    def _talvez_limpar(self):
+        agora = time.time()
+        if agora - self._ultima_limpeza < 3600:
+            return
+        self._ultima_limpeza = agora
+        executar_escrita(_limpar, agora - TAREFAS_RETENCAO_H * 3600)
+
+    def estatisticas(self) -> dict:
+        agora = time.time()
+        with get_read_connection() as conexao:
+            por_estado = dict(conexao.execute("SELECT estado, COUNT(*) FROM Tarefa GROUP BY estado").fetchall())
+            mais_antiga = conexao.execute(
+                "SELECT MIN(disponivel_em) FROM Tarefa WHERE estado = 'pendente' AND disponivel_em <= ?", (agora,)
+            ).fetchone()[0]
+        with self._lock:
+            limite = time.monotonic() - 60
+            ultimo_minuto = sum(1 for t in self._concluidas_recentes if t >= limite)
+            executadas = self.executadas
+            return {
+                "threads": sum(t.is_alive() for t in self._threads),
+                "por_estado": por_estado,
+                # Atraso da fila agora: há quanto tempo a pendente mais antiga poderia ter rodado
+                "atraso_atual_s": round(agora - mais_antiga, 3) if mais_antiga else 0.0,
+                "executadas": executadas,
+                "falhas": self.falhas,
+                "mortas": self.mortas,
+                "por_minuto": ultimo_minuto,
+                "atraso_medio_ms": self._atraso_total / executadas * 1000 if executadas else 0.0,
+                "atraso_max_ms": self._atraso_max * 1000,
+                "duracao_media_ms": self._duracao_total / executadas * 1000 if executadas else 0.0,
+                "por_tipo": {tipo: dict(c) for tipo, c in self._por_tipo.items()},
+            }
+
+processador = ProcessadorTarefas(TAREFAS_THREADS)
+
+def listar_mortas(limite: int = 100) -> list:
+    with get_read_connection() as conexao:
+        cur = conexao.execute(
+            """
+            SELECT id, tipo, payload, chave, tentativas, criada_em, concluida_em, erro
+            FROM Tarefa WHERE estado = 'morta' ORDER BY id DESC LIMIT ?
+            """,
+            (limite,)
+        )
+        colunas = [c[0] for c in cur.description]
+        return [dict(zip(colunas, linha)) for linha in cur.fetchall()]
+
+def reenfileirar(tarefa_id: int) -> bool:
+    """Devolve uma tarefa morta para a fila, com as tentativas zeradas."""
+    def _reenfileirar(conexao):
+        return conexao.execute(
+            """
+            UPDATE Tarefa SET estado = 'pendente', tentativas = 0, disponivel_em = ?,
+                              reservada_ate = NULL, concluida_em = NULL
+            WHERE id = ? AND estado = 'morta'
+            """,
+            (time.time(), tarefa_id)
+        ).rowcount > 0
+    reenfileirada = executar_escrita(_reenfileirar)
+    if reenfileirada:
+        processador.acordar()
+    return reenfileirada